@@ -15,7 +15,7 @@ sys.path.insert(0, str(backend_dir))
 from app.config import DATABASE_URL
 
 # Import all models so Alembic can detect them
-from app.models.model import Base, User, Stock, Portfolio, Transaction
+from app.models.model import Base, User, Stock, Portfolio, Transaction, Position, Lot, PriceBar
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,41 @@
+"""add price_bars
+
+Revision ID: 5b7e2c91d4a3
+Revises: 39c2032f8332
+Create Date: 2026-10-16 09:12:31.408217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e2c91d4a3'
+down_revision: Union[str, None] = '39c2032f8332'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('price_bars',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ticker_symbol', sa.String(length=10), nullable=False),
+    sa.Column('trade_date', sa.Date(), nullable=False),
+    sa.Column('open', sa.Float(), nullable=False),
+    sa.Column('high', sa.Float(), nullable=False),
+    sa.Column('low', sa.Float(), nullable=False),
+    sa.Column('close', sa.Float(), nullable=False),
+    sa.Column('volume', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('ticker_symbol', 'trade_date', name='uq_price_bars_ticker_date')
+    )
+    op.create_index(op.f('ix_price_bars_id'), 'price_bars', ['id'], unique=False)
+    op.create_index(op.f('ix_price_bars_ticker_symbol'), 'price_bars', ['ticker_symbol'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_price_bars_ticker_symbol'), table_name='price_bars')
+    op.drop_index(op.f('ix_price_bars_id'), table_name='price_bars')
+    op.drop_table('price_bars')
@@ -0,0 +1,93 @@
+"""add positions
+
+Revision ID: 8d41f0a6c2b7
+Revises: 5b7e2c91d4a3
+Create Date: 2026-10-16 21:40:12.583104
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41f0a6c2b7'
+down_revision: Union[str, None] = '5b7e2c91d4a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('positions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('portfolio_id', sa.Integer(), nullable=False),
+    sa.Column('ticker_symbol', sa.String(length=10), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.Column('total_cost', sa.Float(), nullable=False),
+    sa.Column('average_cost', sa.Float(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['portfolio_id'], ['portfolios.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('portfolio_id', 'ticker_symbol', name='uq_positions_portfolio_ticker')
+    )
+    op.create_index(op.f('ix_positions_id'), 'positions', ['id'], unique=False)
+    op.create_index(op.f('ix_positions_portfolio_id'), 'positions', ['portfolio_id'], unique=False)
+    _backfill_positions()
+
+
+def _backfill_positions() -> None:
+    """Replay existing transactions into positions (average cost, as app.services.position_service does)."""
+    bind = op.get_bind()
+    transactions = sa.table(
+        'transactions',
+        sa.column('id', sa.Integer),
+        sa.column('portfolio_id', sa.Integer),
+        sa.column('ticker_symbol', sa.String),
+        sa.column('transaction_type', sa.String),
+        sa.column('quantity', sa.Float),
+        sa.column('price', sa.Float),
+    )
+    positions = {}
+    rows = bind.execute(sa.select(
+        transactions.c.portfolio_id,
+        transactions.c.ticker_symbol,
+        transactions.c.transaction_type,
+        transactions.c.quantity,
+        transactions.c.price,
+    ).order_by(transactions.c.id))
+    for portfolio_id, ticker, transaction_type, quantity, price in rows:
+        key = (portfolio_id, ticker.upper())
+        position = positions.setdefault(key, {'quantity': 0.0, 'total_cost': 0.0, 'average_cost': 0.0})
+        kind = transaction_type.lower()
+        if kind == 'buy':
+            position['quantity'] += quantity
+            position['total_cost'] += quantity * price
+            if position['quantity'] > 0:
+                position['average_cost'] = position['total_cost'] / position['quantity']
+        elif kind == 'sell':
+            position['quantity'] -= quantity
+            if position['quantity'] > 0:
+                position['total_cost'] = position['quantity'] * position['average_cost']
+            else:
+                position['total_cost'] = position['average_cost'] = 0.0
+    if positions:
+        positions_table = sa.table(
+            'positions',
+            sa.column('portfolio_id', sa.Integer),
+            sa.column('ticker_symbol', sa.String),
+            sa.column('quantity', sa.Float),
+            sa.column('total_cost', sa.Float),
+            sa.column('average_cost', sa.Float),
+            sa.column('version', sa.Integer),
+        )
+        op.bulk_insert(positions_table, [
+            {'portfolio_id': portfolio_id, 'ticker_symbol': ticker, 'version': 1, **position}
+            for (portfolio_id, ticker), position in positions.items()
+        ])
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_positions_portfolio_id'), table_name='positions')
+    op.drop_index(op.f('ix_positions_id'), table_name='positions')
+    op.drop_table('positions')
@@ -0,0 +1,102 @@
+"""add lots and cost basis method
+
+Revision ID: c3a9e57d1f24
+Revises: 8d41f0a6c2b7
+Create Date: 2026-10-16 23:05:47.219381
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a9e57d1f24'
+down_revision: Union[str, None] = '8d41f0a6c2b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('portfolios', sa.Column('cost_basis_method', sa.String(length=10), server_default='average', nullable=False))
+    # Use batch operations for SQLite compatibility
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('lot_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_transactions_lot_id', 'transactions', ['lot_id'], ['id'], ondelete='SET NULL')
+    op.add_column('positions', sa.Column('realized_gain', sa.Float(), server_default='0', nullable=False))
+    op.create_table('lots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('portfolio_id', sa.Integer(), nullable=False),
+    sa.Column('ticker_symbol', sa.String(length=10), nullable=False),
+    sa.Column('transaction_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.Column('price', sa.Float(), nullable=False),
+    sa.Column('acquired_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['portfolio_id'], ['portfolios.id'], ),
+    sa.ForeignKeyConstraint(['transaction_id'], ['transactions.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('transaction_id')
+    )
+    op.create_index(op.f('ix_lots_id'), 'lots', ['id'], unique=False)
+    op.create_index('ix_lots_portfolio_ticker', 'lots', ['portfolio_id', 'ticker_symbol'], unique=False)
+    # Every portfolio starts on average cost, which needs no lots
+    _backfill_realized_gains()
+
+
+def _backfill_realized_gains() -> None:
+    """Replay existing transactions with average cost and store each position's realized gain."""
+    bind = op.get_bind()
+    transactions = sa.table(
+        'transactions',
+        sa.column('id', sa.Integer),
+        sa.column('portfolio_id', sa.Integer),
+        sa.column('ticker_symbol', sa.String),
+        sa.column('transaction_type', sa.String),
+        sa.column('quantity', sa.Float),
+        sa.column('price', sa.Float),
+    )
+    held = {}
+    realized = {}
+    rows = bind.execute(sa.select(
+        transactions.c.portfolio_id,
+        transactions.c.ticker_symbol,
+        transactions.c.transaction_type,
+        transactions.c.quantity,
+        transactions.c.price,
+    ).order_by(transactions.c.id))
+    for portfolio_id, ticker, transaction_type, quantity, price in rows:
+        key = (portfolio_id, ticker.upper())
+        held_quantity, total_cost = held.get(key, (0.0, 0.0))
+        kind = transaction_type.lower()
+        if kind == 'buy':
+            held[key] = (held_quantity + quantity, total_cost + quantity * price)
+        elif kind == 'sell':
+            if held_quantity > 0:
+                average_cost = total_cost / held_quantity
+                realized[key] = realized.get(key, 0.0) + min(quantity, held_quantity) * (price - average_cost)
+            remaining = held_quantity - quantity
+            held[key] = (remaining, remaining * total_cost / held_quantity) if remaining > 0 else (remaining, 0.0)
+    positions = sa.table(
+        'positions',
+        sa.column('portfolio_id', sa.Integer),
+        sa.column('ticker_symbol', sa.String),
+        sa.column('realized_gain', sa.Float),
+    )
+    for (portfolio_id, ticker), gain in realized.items():
+        bind.execute(
+            positions.update()
+            .where(positions.c.portfolio_id == portfolio_id, positions.c.ticker_symbol == ticker)
+            .values(realized_gain=gain)
+        )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_lots_portfolio_ticker', table_name='lots')
+    op.drop_index(op.f('ix_lots_id'), table_name='lots')
+    op.drop_table('lots')
+    op.drop_column('positions', 'realized_gain')
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_transactions_lot_id', type_='foreignkey')
+        batch_op.drop_column('lot_id')
+    op.drop_column('portfolios', 'cost_basis_method')
@@ -1,43 +1,346 @@
-import os
-from typing import Any, Dict, List
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
 import logging
 
-import requests
+import httpx
 from dotenv import load_dotenv
 from fastapi import HTTPException
 
+from app.api_client.circuit_breaker import CircuitBreaker
+from app.api_client.negative_cache import NegativeCache
+from app.api_client.providers import AlphaVantageProvider, MarketDataProvider, create_provider
+from app.api_client.quote_cache import QuoteCache, FRESH, STALE
+from app.api_client.rate_scheduler import Priority, QuotaScheduler
+from app.api_client.single_flight import SingleFlight
+from app.config import settings
 from app.exceptions import ExternalServiceError
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Errors for which an expired cached price beats no price at all
+LAST_KNOWN_PRICE_ERROR_CODES = frozenset({"RATE_LIMIT", "CIRCUIT_OPEN", "TIMEOUT", "CONNECTION_ERROR"})
+
 
 class StockAPIClient:
-    """Client for interacting with the Alpha Vantage stock API."""
+    """Client for stock market data, served by a pluggable ``MarketDataProvider``.
+
+    The provider is Alpha Vantage by default (one pooled, keep-alive HTTP
+    client for sync callers and one for async callers) or the offline replay
+    provider, selected with the MARKET_DATA_PROVIDER setting. Use
+    ``get_stock_api_client()`` rather than constructing new instances so
+    connections are reused.
+
+    Latest prices go through a shared ``QuoteCache``: fresh entries are served
+    without an upstream call, and stale entries are served immediately while a
+    single background refresh updates them. Identical concurrent upstream
+    requests (same function and symbol/keywords) are coalesced into one, and
+    every request to a metered provider first takes a slot from the
+    ``QuotaScheduler`` so quota is never spent on calls bound to fail.
+
+    Tickers that fail for ticker-specific reasons (unknown symbol, malformed
+    data) are remembered in a ``NegativeCache`` and not retried until their
+    backoff expires, and a ``CircuitBreaker`` fails requests fast while the
+    provider keeps timing out or refusing connections. When over quota or
+    while the provider is unreachable, a price lookup falls back to the last
+    cached price.
+    """
+
+    def __init__(
+        self,
+        http_client: Optional[httpx.Client] = None,
+        async_http_client: Optional[httpx.AsyncClient] = None,
+        quote_cache: Optional[QuoteCache] = None,
+        scheduler: Optional[QuotaScheduler] = None,
+        provider: Optional[MarketDataProvider] = None,
+        negative_cache: Optional[NegativeCache] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        if provider is None:
+            if http_client is not None or async_http_client is not None:
+                provider = AlphaVantageProvider(http_client, async_http_client)
+            else:
+                provider = create_provider()
+        self.provider = provider
+        self.quote_cache = quote_cache or QuoteCache()
+        self.single_flight = SingleFlight()
+        self.scheduler = scheduler or QuotaScheduler(provider_name=self.provider.name)
+        self.negative_cache = negative_cache or NegativeCache()
+        self.breaker = breaker or CircuitBreaker(self.provider.name)
+        # Background stale-while-revalidate refreshes (thread for sync, task for async)
+        self._refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="quote-refresh")
+        self._refresh_tasks: Set["asyncio.Task[None]"] = set()
+        # Callbacks that receive each daily series downloaded (e.g. to store the bars)
+        self._series_listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        self._listener_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="series-listener")
+
+    def fetch_stock_data(
+        self,
+        ticker: str,
+        priority: Priority = Priority.INTERACTIVE,
+        outputsize: str = "compact",
+        notify: bool = True,
+    ) -> Dict[str, Any]:
+        """Fetch time series stock data from Alpha Vantage.
+
+        ``outputsize`` is "compact" (latest 100 bars) or "full" (entire history).
+        The payload is handed to the series listeners unless ``notify`` is False,
+        for callers that store it themselves.
+        """
+        payload = self._fetch_for_ticker(ticker, self._daily_params(ticker, outputsize), priority)
+        if notify:
+            self._notify_series(ticker, payload)
+        return payload
+
+    async def fetch_stock_data_async(
+        self,
+        ticker: str,
+        priority: Priority = Priority.INTERACTIVE,
+        outputsize: str = "compact",
+        notify: bool = True,
+    ) -> Dict[str, Any]:
+        """Async counterpart of ``fetch_stock_data``."""
+        payload = await self._fetch_for_ticker_async(ticker, self._daily_params(ticker, outputsize), priority)
+        if notify:
+            self._notify_series(ticker, payload)
+        return payload
+
+    def get_current_price(self, ticker: str, priority: Priority = Priority.INTERACTIVE) -> float:
+        """Get the latest closing price for a stock ticker (served from cache when possible)."""
+        state, cached_price = self.quote_cache.lookup(ticker)
+        if state == FRESH and cached_price is not None:
+            return cached_price
+        if state == STALE and cached_price is not None:
+            if self.quote_cache.begin_refresh(ticker):
+                self._refresh_executor.submit(self._refresh_price, ticker)
+            return cached_price
+        try:
+            price = self._fetch_current_price(ticker, priority)
+        except ExternalServiceError as exc:
+            return self._last_known_price(ticker, exc)
+        self.quote_cache.set(ticker, price)
+        return price
+
+    async def get_current_price_async(self, ticker: str, priority: Priority = Priority.INTERACTIVE) -> float:
+        """Async counterpart of ``get_current_price``."""
+        state, cached_price = self.quote_cache.lookup(ticker)
+        return await self._resolve_price_async(ticker, state, cached_price, priority)
+
+    async def _resolve_price_async(
+        self, ticker: str, state: str, cached_price: Optional[float], priority: Priority
+    ) -> float:
+        """Turn a cache lookup into a price: serve, serve-and-refresh, or fetch."""
+        if state == FRESH and cached_price is not None:
+            return cached_price
+        if state == STALE and cached_price is not None:
+            if self.quote_cache.begin_refresh(ticker):
+                task = asyncio.get_running_loop().create_task(self._refresh_price_async(ticker))
+                self._refresh_tasks.add(task)
+                task.add_done_callback(self._refresh_tasks.discard)
+            return cached_price
+        try:
+            price = await self._fetch_current_price_async(ticker, priority)
+        except ExternalServiceError as exc:
+            return self._last_known_price(ticker, exc)
+        self.quote_cache.set(ticker, price)
+        return price
+
+    async def get_current_prices_async(
+        self,
+        tickers: Iterable[str],
+        priority: Priority = Priority.INTERACTIVE,
+        concurrency: int = settings.batch_quote_concurrency,
+    ) -> Dict[str, Union[float, ExternalServiceError]]:
+        """Look up many tickers at once, with at most ``concurrency`` upstream fetches in flight.
+
+        Tickers are normalized and deduplicated. Fresh cached prices are answered
+        without waiting on the concurrency limit. Each ticker maps to either its
+        price or the ExternalServiceError that fetching it raised.
+        """
+        unique_tickers = list(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+        results: Dict[str, Union[float, ExternalServiceError]] = {}
+        pending: List[Tuple[str, str, Optional[float]]] = []
+        for ticker in unique_tickers:
+            state, cached_price = self.quote_cache.lookup(ticker)
+            if state == FRESH and cached_price is not None:
+                results[ticker] = cached_price
+            else:
+                pending.append((ticker, state, cached_price))
+
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+        async def fetch(ticker: str, state: str, cached_price: Optional[float]) -> None:
+            async with semaphore:
+                try:
+                    results[ticker] = await self._resolve_price_async(ticker, state, cached_price, priority)
+                except ExternalServiceError as exc:
+                    results[ticker] = exc
+                except Exception as exc:
+                    logger.error(f"Unexpected error fetching price for {ticker}: {exc}", exc_info=True)
+                    results[ticker] = ExternalServiceError(self.provider.name, str(exc))
+
+        await asyncio.gather(*(fetch(*entry) for entry in pending))
+        return {ticker: results[ticker] for ticker in unique_tickers}
+
+    def search_stocks(self, query: str, priority: Priority = Priority.INTERACTIVE) -> List[Dict[str, Any]]:
+        """Search for stocks by keyword."""
+        return self._extract_matches(self._perform_request(self._search_params(query), priority))
+
+    async def search_stocks_async(
+        self, query: str, priority: Priority = Priority.INTERACTIVE
+    ) -> List[Dict[str, Any]]:
+        """Async counterpart of ``search_stocks``."""
+        return self._extract_matches(
+            await self._perform_request_async(self._search_params(query), priority)
+        )
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return cache, request-coalescing, quota and provider counters for monitoring."""
+        return {
+            "provider": self.provider.stats(),
+            "quote_cache": self.quote_cache.stats(),
+            "single_flight": self.single_flight.stats(),
+            "quota": self.scheduler.stats(),
+            "negative_cache": self.negative_cache.stats(),
+            "circuit_breaker": self.breaker.stats(),
+        }
+
+    def background_capacity(self) -> Optional[float]:
+        """Upstream requests per second left for background refreshes; None if the provider is unmetered."""
+        if not self.provider.metered:
+            return None
+        return self.scheduler.sustainable_rate(Priority.BACKGROUND)
+
+    def add_series_listener(self, listener: Callable[[str, Dict[str, Any]], None]) -> None:
+        """Register a callback run off the request path with each daily series downloaded."""
+        self._series_listeners.append(listener)
+
+    def close(self) -> None:
+        """Close the provider's sync resources."""
+        self._refresh_executor.shutdown(wait=False, cancel_futures=True)
+        self._listener_executor.shutdown(wait=False)
+        self.provider.close()
 
-    DEFAULT_TIMEOUT_SECONDS = 10
-    BASE_URL = "https://www.alphavantage.co/query"
+    async def aclose(self) -> None:
+        """Close the provider and cancel pending background refreshes."""
+        for task in list(self._refresh_tasks):
+            task.cancel()
+        self._refresh_executor.shutdown(wait=False, cancel_futures=True)
+        self._listener_executor.shutdown(wait=False)
+        await self.provider.aclose()
 
-    def __init__(self) -> None:
-        self.api_key = os.getenv("API_KEY")
-        if not self.api_key:
-            raise RuntimeError("API_KEY environment variable is not set.")
+    def _fetch_for_ticker(self, ticker: str, params: Dict[str, Any], priority: Priority) -> Dict[str, Any]:
+        """Request a per-ticker payload, honouring and updating the negative cache."""
+        self._check_negative_cache(ticker)
+        try:
+            payload = self._perform_request(params, priority)
+        except ExternalServiceError as exc:
+            self.negative_cache.record_failure(ticker, exc)
+            raise
+        self.negative_cache.record_success(ticker)
+        return payload
+
+    async def _fetch_for_ticker_async(
+        self, ticker: str, params: Dict[str, Any], priority: Priority
+    ) -> Dict[str, Any]:
+        """Async counterpart of ``_fetch_for_ticker``."""
+        self._check_negative_cache(ticker)
+        try:
+            payload = await self._perform_request_async(params, priority)
+        except ExternalServiceError as exc:
+            self.negative_cache.record_failure(ticker, exc)
+            raise
+        self.negative_cache.record_success(ticker)
+        return payload
+
+    def _fetch_current_price(self, ticker: str, priority: Priority) -> float:
+        """Fetch the latest price from upstream, bypassing the cache.
+
+        Providers with a single-quote function answer from that small payload;
+        others fall back to the latest close of the compact daily series.
+        """
+        logger.debug(f"Fetching current price for {ticker}")
+        if self.provider.supports_quote:
+            return self._extract_price(ticker, self._fetch_for_ticker(ticker, self._quote_params(ticker), priority))
+        payload = self.fetch_stock_data(ticker, priority)
+        return self._extract_price(ticker, payload)
+
+    async def _fetch_current_price_async(self, ticker: str, priority: Priority) -> float:
+        """Async counterpart of ``_fetch_current_price``."""
+        logger.debug(f"Fetching current price for {ticker}")
+        if self.provider.supports_quote:
+            payload = await self._fetch_for_ticker_async(ticker, self._quote_params(ticker), priority)
+            return self._extract_price(ticker, payload)
+        payload = await self.fetch_stock_data_async(ticker, priority)
+        return self._extract_price(ticker, payload)
+
+    def _extract_price(self, ticker: str, data: Dict[str, Any]) -> float:
+        """Read the price from a quote or daily payload, remembering tickers whose data is unusable."""
+        try:
+            if "Global Quote" in data:
+                return self._extract_quote_price(ticker, data)
+            return self._extract_latest_close(ticker, data)
+        except ExternalServiceError as exc:
+            self.negative_cache.record_failure(ticker, exc)
+            raise
+
+    def _check_negative_cache(self, ticker: str) -> None:
+        """Fail fast for a ticker that is still backing off after a ticker-specific error."""
+        error = self.negative_cache.check(ticker)
+        if error is not None:
+            raise error
+
+    def _last_known_price(self, ticker: str, exc: ExternalServiceError) -> float:
+        """Serve an expired cached price when over quota or the provider is unreachable; otherwise re-raise."""
+        if exc.error_code in LAST_KNOWN_PRICE_ERROR_CODES:
+            price = self.quote_cache.peek(ticker)
+            if price is not None:
+                logger.warning(f"{exc.error_code} for {ticker}, serving last known price")
+                return price
+        raise exc
+
+    def _refresh_price(self, ticker: str) -> None:
+        """Background refresh of a stale cache entry; failures keep the stale price."""
+        try:
+            self.quote_cache.set(ticker, self._fetch_current_price(ticker, Priority.BACKGROUND))
+        except Exception as exc:
+            logger.warning(f"Background refresh failed for {ticker}: {exc}")
+        finally:
+            self.quote_cache.end_refresh(ticker)
+
+    async def _refresh_price_async(self, ticker: str) -> None:
+        """Async counterpart of ``_refresh_price``."""
+        try:
+            self.quote_cache.set(ticker, await self._fetch_current_price_async(ticker, Priority.BACKGROUND))
+        except Exception as exc:
+            logger.warning(f"Background refresh failed for {ticker}: {exc}")
+        finally:
+            self.quote_cache.end_refresh(ticker)
 
-    def fetch_stock_data(self, ticker: str) -> Dict[str, Any]:
-        """Fetch time series stock data from Alpha Vantage."""
-        params = {
+    def _daily_params(self, ticker: str, outputsize: str = "compact") -> Dict[str, Any]:
+        return {
             "function": "TIME_SERIES_DAILY",
             "symbol": ticker,
-            "apikey": self.api_key,
+            "outputsize": outputsize,
         }
-        return self._perform_request(params)
 
-    def get_current_price(self, ticker: str) -> float:
-        """Get the latest closing price for a stock ticker."""
-        logger.debug(f"Fetching current price for {ticker}")
+    def _quote_params(self, ticker: str) -> Dict[str, Any]:
+        return {
+            "function": "GLOBAL_QUOTE",
+            "symbol": ticker,
+        }
+
+    def _search_params(self, query: str) -> Dict[str, Any]:
+        return {
+            "function": "SYMBOL_SEARCH",
+            "keywords": query,
+        }
+
+    def _extract_latest_close(self, ticker: str, data: Dict[str, Any]) -> float:
+        """Pull the most recent closing price out of a daily time series payload."""
         try:
-            data = self.fetch_stock_data(ticker)
             refreshed_at = data["Meta Data"]["3. Last Refreshed"]
             closing_price = data["Time Series (Daily)"][refreshed_at]["4. close"]
             price = float(closing_price)
@@ -58,14 +361,37 @@ class StockAPIClient:
                 "INVALID_PRICE_VALUE"
             ) from exc
 
-    def search_stocks(self, query: str) -> List[Dict[str, Any]]:
-        """Search for stocks by keyword."""
-        params = {
-            "function": "SYMBOL_SEARCH",
-            "keywords": query,
-            "apikey": self.api_key,
-        }
-        data = self._perform_request(params)
+    def _extract_quote_price(self, ticker: str, data: Dict[str, Any]) -> float:
+        """Pull the latest price out of a GLOBAL_QUOTE payload."""
+        quote = data["Global Quote"]
+        if not quote:
+            # Alpha Vantage answers unknown symbols with an empty quote
+            logger.warning(f"No quote available for {ticker}")
+            raise ExternalServiceError(
+                self.provider.name,
+                f"No quote available for {ticker}",
+                "API_ERROR"
+            )
+        try:
+            price = float(quote["05. price"])
+        except KeyError as exc:
+            logger.error(f"Malformed quote from {self.provider.name} for {ticker}: missing field {exc}")
+            raise ExternalServiceError(
+                self.provider.name,
+                f"Malformed response: missing field {exc}",
+                "MALFORMED_RESPONSE"
+            ) from exc
+        except ValueError as exc:
+            logger.error(f"Invalid price value from {self.provider.name} for {ticker}: {exc}")
+            raise ExternalServiceError(
+                self.provider.name,
+                "Non-numeric price value in response",
+                "INVALID_PRICE_VALUE"
+            ) from exc
+        logger.info(f"Successfully fetched price for {ticker}: ${price}")
+        return price
+
+    def _extract_matches(self, data: Dict[str, Any]) -> List[Dict[str, Any]]:
         try:
             return data["bestMatches"]
         except KeyError as exc:
@@ -74,66 +400,103 @@ class StockAPIClient:
                 detail="Malformed response from stock data provider: search results missing.",
             ) from exc
 
-    def _perform_request(self, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute a GET request against Alpha Vantage with robust error handling."""
-        logger.debug(f"Making request to Alpha Vantage with params: {params.get('function')}")
+    def _request_key(self, params: Dict[str, Any]) -> Tuple[str, str, str]:
+        """Single-flight key: the API function, its symbol or search keywords, and output size."""
+        return (
+            params["function"],
+            str(params.get("symbol", params.get("keywords", ""))).upper(),
+            params.get("outputsize", ""),
+        )
+
+    def _perform_request(self, params: Dict[str, Any], priority: Priority) -> Dict[str, Any]:
+        """Execute a request, sharing it with any identical call already in flight."""
+        return self.single_flight.do(self._request_key(params), lambda: self._send_request(params, priority))
+
+    async def _perform_request_async(self, params: Dict[str, Any], priority: Priority) -> Dict[str, Any]:
+        """Async counterpart of ``_perform_request``."""
+        return await self.single_flight.do_async(
+            self._request_key(params), lambda: self._send_request_async(params, priority)
+        )
+
+    def _send_request(self, params: Dict[str, Any], priority: Priority) -> Dict[str, Any]:
+        """Pass the circuit breaker, take a quota slot (metered providers only) and ask the provider."""
+        self.breaker.before_request()
         try:
-            response = requests.get(
-                self.BASE_URL,
-                params=params,
-                timeout=self.DEFAULT_TIMEOUT_SECONDS,
-            )
-            response.raise_for_status()
-        except requests.Timeout as exc:
-            logger.warning(f"Alpha Vantage request timed out: {params.get('function')}")
-            raise ExternalServiceError(
-                "Alpha Vantage",
-                "Request timed out",
-                "TIMEOUT"
-            ) from exc
-        except requests.HTTPError as exc:
-            status_code = exc.response.status_code if exc.response else 502
-            message = exc.response.text if exc.response else str(exc)
-            logger.error(f"Alpha Vantage HTTP error {status_code}: {message}")
-            raise ExternalServiceError(
-                "Alpha Vantage",
-                f"HTTP {status_code}: {message}",
-                "HTTP_ERROR"
-            ) from exc
-        except requests.RequestException as exc:
-            logger.error(f"Alpha Vantage request failed: {str(exc)}")
-            raise ExternalServiceError(
-                "Alpha Vantage",
-                f"Connection error: {str(exc)}",
-                "CONNECTION_ERROR"
-            ) from exc
+            if self.provider.metered:
+                self.scheduler.acquire(priority)
+        except BaseException:
+            self.breaker.cancel_probe()
+            raise
+        try:
+            payload = self.provider.request(params)
+        except BaseException as exc:
+            self._record_failure(exc)
+            raise
+        self.breaker.record_success()
+        return payload
 
+    async def _send_request_async(self, params: Dict[str, Any], priority: Priority) -> Dict[str, Any]:
+        """Async counterpart of ``_send_request``."""
+        self.breaker.before_request()
         try:
-            payload: Dict[str, Any] = response.json()
-        except ValueError as exc:
-            logger.error(f"Invalid JSON response from Alpha Vantage: {str(exc)}")
-            raise ExternalServiceError(
-                "Alpha Vantage",
-                "Invalid JSON response",
-                "INVALID_JSON"
-            ) from exc
+            if self.provider.metered:
+                await self.scheduler.acquire_async(priority)
+        except BaseException:
+            self.breaker.cancel_probe()
+            raise
+        try:
+            payload = await self.provider.request_async(params)
+        except BaseException as exc:
+            self._record_failure(exc)
+            raise
+        self.breaker.record_success()
+        return payload
 
-        if "Error Message" in payload:
-            error_msg = payload["Error Message"]
-            logger.warning(f"Alpha Vantage error message: {error_msg}")
-            raise ExternalServiceError(
-                "Alpha Vantage",
-                error_msg,
-                "API_ERROR"
-            )
+    def _record_failure(self, exc: BaseException) -> None:
+        """Feed a failed provider request to the circuit breaker and the quota scheduler."""
+        if not isinstance(exc, ExternalServiceError):
+            # Cancelled or crashed before an answer: says nothing about the provider
+            self.breaker.cancel_probe()
+        elif exc.error_code == "RATE_LIMIT":
+            self.breaker.cancel_probe()
+            self._note_rate_limit(exc)
+        else:
+            self.breaker.record_failure(exc)
+
+    def _note_rate_limit(self, exc: ExternalServiceError) -> None:
+        """An upstream rate-limit answer means our local budget is out of sync: empty it."""
+        if exc.error_code == "RATE_LIMIT" and self.provider.metered:
+            self.scheduler.drain()
+
+    def _notify_series(self, ticker: str, payload: Dict[str, Any]) -> None:
+        """Hand a downloaded daily series to the listeners on their own worker thread."""
+        for listener in self._series_listeners:
+            self._listener_executor.submit(self._run_series_listener, listener, ticker, payload)
+
+    def _run_series_listener(
+        self, listener: Callable[[str, Dict[str, Any]], None], ticker: str, payload: Dict[str, Any]
+    ) -> None:
+        try:
+            listener(ticker, payload)
+        except Exception as exc:
+            logger.error(f"Daily series listener failed for {ticker}: {exc}", exc_info=True)
+
+
+# Process-wide client instance, created at app startup (or lazily on first use)
+_shared_client: Optional[StockAPIClient] = None
+
+
+def get_stock_api_client() -> StockAPIClient:
+    """Return the shared StockAPIClient, creating it on first use."""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = StockAPIClient()
+    return _shared_client
 
-        if "Note" in payload:
-            note = payload["Note"]
-            logger.warning(f"Alpha Vantage rate limit note: {note}")
-            raise ExternalServiceError(
-                "Alpha Vantage",
-                note,
-                "RATE_LIMIT"
-            )
 
-        return payload
\ No newline at end of file
+async def close_stock_api_client() -> None:
+    """Close the shared StockAPIClient and release its pooled connections."""
+    global _shared_client
+    if _shared_client is not None:
+        await _shared_client.aclose()
+        _shared_client = None
@@ -0,0 +1,108 @@
+"""Provider-wide circuit breaker for transport failures."""
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from app.config import settings
+from app.exceptions import ExternalServiceError
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Failures that say the provider is unreachable, as opposed to a bad ticker or quota
+TRANSPORT_ERROR_CODES = frozenset({"TIMEOUT", "CONNECTION_ERROR"})
+
+
+class CircuitBreaker:
+    """Stop sending requests to a provider that keeps timing out or refusing connections.
+
+    After ``failure_threshold`` consecutive transport failures the breaker
+    opens and ``before_request`` raises ``CIRCUIT_OPEN`` immediately instead of
+    letting each caller wait out the HTTP timeout. After ``reset_seconds`` one
+    probe request is let through (half-open): success closes the breaker,
+    another transport failure re-opens it. Any other outcome counts as the
+    provider being reachable.
+    """
+
+    def __init__(
+        self,
+        service: str = "Stock data provider",
+        failure_threshold: int = settings.circuit_breaker_failure_threshold,
+        reset_seconds: float = settings.circuit_breaker_reset_seconds,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.service = service
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def before_request(self) -> None:
+        """Raise CIRCUIT_OPEN unless a request may go out now."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return
+            if state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+            retry_in = max(self._opened_at + self.reset_seconds - self._clock(), 0.0)
+        raise ExternalServiceError(
+            self.service,
+            f"Circuit open after repeated connection failures (retry in {retry_in:.0f}s)",
+            "CIRCUIT_OPEN"
+        )
+
+    def cancel_probe(self) -> None:
+        """Give back a half-open probe slot when the request never reached the provider."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, error: ExternalServiceError) -> None:
+        """Count a failed request; only transport failures move the breaker towards open."""
+        if error.error_code not in TRANSPORT_ERROR_CODES:
+            self.record_success()
+            return
+        with self._lock:
+            self._consecutive_failures += 1
+            was_probe = self._probe_in_flight
+            self._probe_in_flight = False
+            if was_probe or self._consecutive_failures >= self.failure_threshold:
+                if self._state != OPEN or was_probe:
+                    self.opened += 1
+                self._state = OPEN
+                self._opened_at = self._clock()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "consecutive_failures": self._consecutive_failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+            }
+
+    def _current_state(self) -> str:
+        """OPEN turns into HALF_OPEN once the reset period has passed (lock held)."""
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_seconds:
+            return HALF_OPEN
+        return self._state
@@ -0,0 +1,17 @@
+"""JSON decoding for provider responses, using orjson when it is installed."""
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # optional dependency: fall back to the standard library
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decode a JSON document from raw response bytes (raises ValueError on bad input)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
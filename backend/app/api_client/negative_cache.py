@@ -0,0 +1,87 @@
+"""Per-ticker negative cache with exponential backoff."""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from app.config import settings
+from app.exceptions import ExternalServiceError
+
+# Errors that describe the ticker itself (delisted, misspelled, bad data), not the provider
+TICKER_ERROR_CODES = frozenset({"API_ERROR", "MALFORMED_RESPONSE", "INVALID_PRICE_VALUE"})
+
+
+@dataclass
+class FailedTicker:
+    """The last error seen for a ticker and when it may be retried."""
+    error: ExternalServiceError
+    failures: int
+    retry_at: float
+
+
+class NegativeCache:
+    """Remember tickers whose lookups fail and refuse to retry them until a backoff expires.
+
+    Only ticker-specific failures (``TICKER_ERROR_CODES``) are recorded. The
+    first failure blocks the ticker for ``base_seconds``; each further failure
+    doubles the wait up to ``max_seconds``. A successful lookup clears the
+    entry. Thread-safe, bounded to ``max_entries`` tickers (oldest dropped).
+    """
+
+    def __init__(
+        self,
+        base_seconds: float = settings.negative_cache_base_seconds,
+        max_seconds: float = settings.negative_cache_max_seconds,
+        max_entries: int = settings.quote_cache_max_entries,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.base_seconds = base_seconds
+        self.max_seconds = max_seconds
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: "OrderedDict[str, FailedTicker]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def check(self, ticker: str) -> Optional[ExternalServiceError]:
+        """Return the cached error while the ticker is backing off, else None."""
+        key = ticker.upper()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            remaining = entry.retry_at - self._clock()
+            if remaining <= 0:
+                return None
+            self.hits += 1
+        error = copy.copy(entry.error)
+        error.detail = f"{entry.error.detail} (retry in {remaining:.0f}s)"
+        return error
+
+    def record_failure(self, ticker: str, error: ExternalServiceError) -> None:
+        """Record a failed lookup; errors that are not about the ticker are ignored."""
+        if error.error_code not in TICKER_ERROR_CODES:
+            return
+        key = ticker.upper()
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            failures = previous.failures + 1 if previous is not None else 1
+            backoff = min(self.base_seconds * 2 ** (failures - 1), self.max_seconds)
+            self._entries[key] = FailedTicker(error, failures, self._clock() + backoff)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record_success(self, ticker: str) -> None:
+        with self._lock:
+            self._entries.pop(ticker.upper(), None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            now = self._clock()
+            return {
+                "size": len(self._entries),
+                "blocked": sum(1 for entry in self._entries.values() if entry.retry_at > now),
+                "hits": self.hits,
+            }
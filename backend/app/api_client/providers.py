@@ -0,0 +1,423 @@
+"""Market data providers behind StockAPIClient.
+
+A provider answers Alpha Vantage-style queries (``function`` plus ``symbol``/
+``outputsize`` or ``keywords``) with Alpha Vantage-shaped payloads, so the
+client's caching, coalescing and parsing work the same whichever provider is
+configured. Failures are raised as ``ExternalServiceError`` with the usual
+error codes.
+"""
+import asyncio
+import csv
+import json
+import logging
+import os
+import random
+import threading
+import time
+import zlib
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+from app.api_client import fast_json
+from app.config import settings
+from app.exceptions import ExternalServiceError
+
+logger = logging.getLogger(__name__)
+
+# (date, open, high, low, close, volume), oldest first
+Bar = Tuple[str, float, float, float, float, int]
+
+COMPACT_BARS = 100
+
+
+class MarketDataProvider:
+    """Interface implemented by every market data provider."""
+
+    #: Display name used in error messages and stats
+    name = "provider"
+    #: Whether requests spend upstream quota (and so go through the QuotaScheduler)
+    metered = True
+    #: Whether GLOBAL_QUOTE is answered (otherwise prices come from the daily series)
+    supports_quote = False
+
+    def request(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer one query synchronously."""
+        raise NotImplementedError
+
+    async def request_async(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer one query without blocking the event loop."""
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name}
+
+    def close(self) -> None:
+        """Release sync resources."""
+
+    async def aclose(self) -> None:
+        """Release all resources."""
+        self.close()
+
+
+class AlphaVantageProvider(MarketDataProvider):
+    """Provider backed by the Alpha Vantage HTTP API over pooled keep-alive clients."""
+
+    name = "Alpha Vantage"
+    metered = True
+    supports_quote = True
+    # GLOBAL_QUOTE fields kept by the client; the rest of the quote is dropped on decode
+    QUOTE_FIELDS = ("01. symbol", "05. price", "07. latest trading day")
+    BASE_URL = "https://www.alphavantage.co/query"
+    DEFAULT_TIMEOUT_SECONDS = settings.stock_api_timeout_seconds
+
+    def __init__(
+        self,
+        http_client: Optional[httpx.Client] = None,
+        async_http_client: Optional[httpx.AsyncClient] = None,
+    ) -> None:
+        self.api_key = os.getenv("API_KEY")
+        if not self.api_key:
+            raise RuntimeError("API_KEY environment variable is not set.")
+
+        limits = httpx.Limits(
+            max_connections=settings.stock_api_pool_size,
+            max_keepalive_connections=settings.stock_api_keepalive_connections,
+            keepalive_expiry=settings.stock_api_keepalive_expiry_seconds,
+        )
+        timeout = httpx.Timeout(
+            self.DEFAULT_TIMEOUT_SECONDS,
+            connect=settings.stock_api_connect_timeout_seconds,
+        )
+        self._http = http_client or httpx.Client(limits=limits, timeout=timeout)
+        self._async_http = async_http_client or httpx.AsyncClient(limits=limits, timeout=timeout)
+
+    def request(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute a GET request against Alpha Vantage with robust error handling."""
+        logger.debug(f"Making request to Alpha Vantage with params: {params.get('function')}")
+        try:
+            response = self._http.get(self.BASE_URL, params={**params, "apikey": self.api_key})
+            response.raise_for_status()
+        except httpx.HTTPError as exc:
+            raise self._translate_http_error(exc, params) from exc
+        return self._parse_payload(response)
+
+    async def request_async(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Async counterpart of ``request`` sharing the same error mapping."""
+        logger.debug(f"Making async request to Alpha Vantage with params: {params.get('function')}")
+        try:
+            response = await self._async_http.get(self.BASE_URL, params={**params, "apikey": self.api_key})
+            response.raise_for_status()
+        except httpx.HTTPError as exc:
+            raise self._translate_http_error(exc, params) from exc
+        return self._parse_payload(response)
+
+    def close(self) -> None:
+        self._http.close()
+
+    async def aclose(self) -> None:
+        self._http.close()
+        await self._async_http.aclose()
+
+    def _translate_http_error(self, exc: httpx.HTTPError, params: Dict[str, Any]) -> ExternalServiceError:
+        """Map a transport-level failure to the matching ExternalServiceError."""
+        if isinstance(exc, httpx.TimeoutException):
+            logger.warning(f"Alpha Vantage request timed out: {params.get('function')}")
+            return ExternalServiceError(
+                "Alpha Vantage",
+                "Request timed out",
+                "TIMEOUT"
+            )
+        if isinstance(exc, httpx.HTTPStatusError):
+            status_code = exc.response.status_code
+            message = exc.response.text
+            logger.error(f"Alpha Vantage HTTP error {status_code}: {message}")
+            return ExternalServiceError(
+                "Alpha Vantage",
+                f"HTTP {status_code}: {message}",
+                "HTTP_ERROR"
+            )
+        logger.error(f"Alpha Vantage request failed: {str(exc)}")
+        return ExternalServiceError(
+            "Alpha Vantage",
+            f"Connection error: {str(exc)}",
+            "CONNECTION_ERROR"
+        )
+
+    def _parse_payload(self, response: httpx.Response) -> Dict[str, Any]:
+        """Decode the JSON body and surface Alpha Vantage's in-band errors."""
+        try:
+            payload: Dict[str, Any] = fast_json.loads(response.content)
+        except ValueError as exc:
+            logger.error(f"Invalid JSON response from Alpha Vantage: {str(exc)}")
+            raise ExternalServiceError(
+                "Alpha Vantage",
+                "Invalid JSON response",
+                "INVALID_JSON"
+            ) from exc
+
+        if "Error Message" in payload:
+            error_msg = payload["Error Message"]
+            logger.warning(f"Alpha Vantage error message: {error_msg}")
+            raise ExternalServiceError(
+                "Alpha Vantage",
+                error_msg,
+                "API_ERROR"
+            )
+
+        if "Note" in payload:
+            note = payload["Note"]
+            logger.warning(f"Alpha Vantage rate limit note: {note}")
+            raise ExternalServiceError(
+                "Alpha Vantage",
+                note,
+                "RATE_LIMIT"
+            )
+
+        quote = payload.get("Global Quote")
+        if quote:
+            payload = {"Global Quote": {field: quote[field] for field in self.QUOTE_FIELDS if field in quote}}
+        return payload
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Offline provider serving recorded or synthetic daily series.
+
+    For each ticker the data directory may hold ``<TICKER>.json`` (a recorded
+    TIME_SERIES_DAILY payload) or ``<TICKER>.csv`` (Alpha Vantage's CSV layout:
+    ``timestamp,open,high,low,close,volume``). An optional ``symbols.json``
+    list of bestMatches entries answers symbol searches. Tickers without a file
+    get a deterministic synthetic random walk when ``synthetic`` is set.
+
+    Every request sleeps ``latency_seconds`` plus up to ``jitter_seconds`` and
+    fails with probability ``error_rate`` using one of ``error_codes``. With
+    ``step_seconds`` set, each series is replayed from its oldest bar, one more
+    bar becoming visible every step, so latest prices move over time.
+    """
+
+    name = "Replay"
+    metered = False
+    supports_quote = True
+    SYNTHETIC_BARS = 1000
+
+    def __init__(
+        self,
+        data_dir: Optional[str] = settings.replay_data_dir,
+        latency_seconds: float = settings.replay_latency_seconds,
+        jitter_seconds: float = settings.replay_jitter_seconds,
+        error_rate: float = settings.replay_error_rate,
+        error_codes: Sequence[str] = settings.replay_error_codes,
+        synthetic: bool = settings.replay_synthetic,
+        step_seconds: float = settings.replay_step_seconds,
+        seed: Optional[int] = settings.replay_seed,
+        clock: Callable[[], float] = time.monotonic,
+        today: Callable[[], date] = date.today,
+    ) -> None:
+        self.data_dir = Path(data_dir) if data_dir else None
+        self.latency_seconds = latency_seconds
+        self.jitter_seconds = jitter_seconds
+        self.error_rate = error_rate
+        self.error_codes = tuple(error_codes) or ("TIMEOUT",)
+        self.synthetic = synthetic
+        self.step_seconds = step_seconds
+        self.seed = seed or 0
+        self._clock = clock
+        self._today = today
+        self._started = clock()
+        self._random = random.Random(seed)
+        self._series: Dict[str, Optional[List[Bar]]] = {}
+        self._symbols: Optional[List[Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.injected_errors = 0
+
+    def request(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        delay = self._begin_request(params)
+        if delay > 0:
+            time.sleep(delay)
+        return self._answer(params)
+
+    async def request_async(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        delay = self._begin_request(params)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return self._answer(params)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "requests": self.requests,
+            "injected_errors": self.injected_errors,
+            "series_loaded": sum(1 for bars in self._series.values() if bars is not None),
+        }
+
+    def _begin_request(self, params: Dict[str, Any]) -> float:
+        """Count the request, roll for an injected error and return the delay to apply."""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency_seconds + self._random.uniform(0, self.jitter_seconds)
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+            code = self._random.choice(self.error_codes) if fail else None
+            if fail:
+                self.injected_errors += 1
+        if code is not None:
+            raise ExternalServiceError(self.name, f"Injected {code} for {params.get('function')}", code)
+        return delay
+
+    def _answer(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        function = params.get("function")
+        if function == "TIME_SERIES_DAILY":
+            ticker = str(params.get("symbol", "")).upper()
+            bars = self._visible_bars(ticker)
+            if params.get("outputsize", "compact") != "full":
+                bars = bars[-COMPACT_BARS:]
+            return self._daily_payload(ticker, bars)
+        if function == "GLOBAL_QUOTE":
+            ticker = str(params.get("symbol", "")).upper()
+            bars = self._visible_bars(ticker)
+            if not bars:
+                return {"Global Quote": {}}
+            day, _, _, _, close, _ = bars[-1]
+            return {"Global Quote": {"01. symbol": ticker, "05. price": str(close), "07. latest trading day": day}}
+        if function == "SYMBOL_SEARCH":
+            return {"bestMatches": self._search(str(params.get("keywords", "")))}
+        raise ExternalServiceError(self.name, f"Unsupported function: {function}", "API_ERROR")
+
+    def _visible_bars(self, ticker: str) -> List[Bar]:
+        bars = self._load_series(ticker)
+        if bars is None:
+            raise ExternalServiceError(self.name, f"No replay data for {ticker}", "API_ERROR")
+        if self.step_seconds > 0:
+            steps = int((self._clock() - self._started) / self.step_seconds)
+            bars = bars[:steps + 1]
+        return bars
+
+    def _load_series(self, ticker: str) -> Optional[List[Bar]]:
+        """Load (once) the series for a ticker from disk, or synthesize it."""
+        with self._lock:
+            if ticker in self._series:
+                return self._series[ticker]
+        bars: Optional[List[Bar]] = None
+        if self.data_dir is not None:
+            json_path = self.data_dir / f"{ticker}.json"
+            csv_path = self.data_dir / f"{ticker}.csv"
+            if json_path.exists():
+                bars = _bars_from_payload(json.loads(json_path.read_text()))
+            elif csv_path.exists():
+                bars = _bars_from_csv(csv_path)
+        if bars is None and self.synthetic:
+            bars = self._synthetic_series(ticker)
+        with self._lock:
+            self._series[ticker] = bars
+        return bars
+
+    def _synthetic_series(self, ticker: str) -> List[Bar]:
+        """Deterministic random walk of weekday bars ending on the latest weekday."""
+        rng = random.Random(zlib.crc32(ticker.encode()) ^ self.seed)
+        day = self._today()
+        days: List[date] = []
+        while len(days) < self.SYNTHETIC_BARS:
+            if day.weekday() < 5:
+                days.append(day)
+            day -= timedelta(days=1)
+        days.reverse()
+
+        close = rng.uniform(20, 500)
+        bars: List[Bar] = []
+        for trade_day in days:
+            open_ = close
+            close = max(1.0, open_ * (1 + rng.gauss(0, 0.02)))
+            high = max(open_, close) * (1 + rng.uniform(0, 0.01))
+            low = min(open_, close) * (1 - rng.uniform(0, 0.01))
+            bars.append((
+                trade_day.isoformat(), round(open_, 4), round(high, 4), round(low, 4), round(close, 4),
+                rng.randint(100_000, 10_000_000),
+            ))
+        return bars
+
+    def _search(self, keywords: str) -> List[Dict[str, Any]]:
+        query = keywords.strip().lower()
+        symbols = self._symbols
+        if symbols is None:
+            symbols_path = self.data_dir / "symbols.json" if self.data_dir is not None else None
+            if symbols_path is not None and symbols_path.exists():
+                symbols = json.loads(symbols_path.read_text())
+            else:
+                tickers = sorted(path.stem.upper() for path in self.data_dir.glob("*.*")) if self.data_dir else []
+                symbols = [
+                    {"1. symbol": ticker, "2. name": ticker, "3. type": "Equity", "4. region": "United States"}
+                    for ticker in tickers if ticker != "SYMBOLS"
+                ]
+            self._symbols = symbols
+        return [
+            match for match in symbols
+            if query and (query in str(match.get("1. symbol", "")).lower() or query in str(match.get("2. name", "")).lower())
+        ]
+
+    @staticmethod
+    def _daily_payload(ticker: str, bars: List[Bar]) -> Dict[str, Any]:
+        return {
+            "Meta Data": {
+                "1. Information": "Daily Prices (open, high, low, close) and Volumes",
+                "2. Symbol": ticker,
+                "3. Last Refreshed": bars[-1][0] if bars else "",
+            },
+            "Time Series (Daily)": {
+                day: {
+                    "1. open": str(open_),
+                    "2. high": str(high),
+                    "3. low": str(low),
+                    "4. close": str(close),
+                    "5. volume": str(volume),
+                }
+                for day, open_, high, low, close, volume in reversed(bars)
+            },
+        }
+
+
+def _bars_from_payload(payload: Dict[str, Any]) -> List[Bar]:
+    series = payload.get("Time Series (Daily)", {})
+    bars = [
+        (
+            day,
+            float(values["1. open"]),
+            float(values["2. high"]),
+            float(values["3. low"]),
+            float(values["4. close"]),
+            int(float(values["5. volume"])),
+        )
+        for day, values in series.items()
+    ]
+    bars.sort()
+    return bars
+
+
+def _bars_from_csv(path: Path) -> List[Bar]:
+    with path.open(newline="") as handle:
+        bars = [
+            (
+                row.get("timestamp") or row["date"],
+                float(row["open"]),
+                float(row["high"]),
+                float(row["low"]),
+                float(row["close"]),
+                int(float(row.get("volume") or 0)),
+            )
+            for row in csv.DictReader(handle)
+        ]
+    bars.sort()
+    return bars
+
+
+def create_provider(name: str = settings.market_data_provider) -> MarketDataProvider:
+    """Build the provider selected by the MARKET_DATA_PROVIDER setting."""
+    key = name.strip().lower()
+    if key in ("alphavantage", "alpha_vantage"):
+        return AlphaVantageProvider()
+    if key == "replay":
+        logger.info(f"Using replay market data provider (data dir: {settings.replay_data_dir or 'synthetic only'})")
+        return ReplayProvider()
+    raise RuntimeError(f"Unknown MARKET_DATA_PROVIDER: {name}")
@@ -0,0 +1,121 @@
+"""Bounded in-memory quote cache with TTL and stale-while-revalidate."""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from app.config import settings
+
+FRESH = "fresh"
+STALE = "stale"
+MISS = "miss"
+
+
+@dataclass
+class CachedQuote:
+    """A cached price and the monotonic time it was stored."""
+    price: float
+    stored_at: float
+
+
+class QuoteCache:
+    """LRU cache of latest prices keyed by ticker.
+
+    Entries younger than ``ttl_seconds`` are fresh. Entries older than that but
+    within ``stale_ttl_seconds`` more are stale: they can still be served while a
+    single background refresh runs (see ``begin_refresh``/``end_refresh``).
+    Anything older is treated as a miss by ``lookup`` but can still be read
+    with ``peek`` as a last-known price. All methods are thread-safe so the
+    cache can be shared by threadpool routes and the event loop.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = settings.quote_cache_max_entries,
+        ttl_seconds: float = settings.quote_cache_ttl_seconds,
+        stale_ttl_seconds: float = settings.quote_cache_stale_ttl_seconds,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stale_ttl_seconds = stale_ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, CachedQuote]" = OrderedDict()
+        self._refreshing: Set[str] = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+
+    def lookup(self, ticker: str) -> Tuple[str, Optional[float]]:
+        """Return ``(state, price)`` where state is FRESH, STALE or MISS."""
+        key = ticker.upper()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISS, None
+            age = self._clock() - entry.stored_at
+            if age <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return FRESH, entry.price
+            if age <= self.ttl_seconds + self.stale_ttl_seconds:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                return STALE, entry.price
+            # Expired entries stay (until evicted) as a last resort for ``peek``
+            self.misses += 1
+            return MISS, None
+
+    def peek(self, ticker: str) -> Optional[float]:
+        """Return the cached price regardless of age, without touching counters."""
+        with self._lock:
+            entry = self._entries.get(ticker.upper())
+            return entry.price if entry is not None else None
+
+    def set(self, ticker: str, price: float) -> None:
+        """Store a price, evicting the least recently used entry when full."""
+        key = ticker.upper()
+        with self._lock:
+            self._entries[key] = CachedQuote(price=price, stored_at=self._clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def begin_refresh(self, ticker: str) -> bool:
+        """Claim the background refresh for a ticker; False if one is running."""
+        key = ticker.upper()
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self.refreshes += 1
+            return True
+
+    def end_refresh(self, ticker: str) -> None:
+        """Release the background refresh claim for a ticker."""
+        with self._lock:
+            self._refreshing.discard(ticker.upper())
+
+    def clear(self) -> None:
+        """Drop all entries (counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return cache counters for monitoring."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "refreshes": self.refreshes,
+            }
@@ -0,0 +1,185 @@
+"""Token-bucket scheduler enforcing the upstream request quota before calls go out."""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from enum import IntEnum
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.exceptions import ExternalServiceError
+
+
+class Priority(IntEnum):
+    """Request priority; lower values are served first."""
+    INTERACTIVE = 0  # REST lookups a user is waiting on
+    VALUATION = 1    # Portfolio value / analytics computations
+    BACKGROUND = 2   # WebSocket broadcast loop and cache refreshes
+
+
+def _utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class QuotaScheduler:
+    """Grant upstream request slots under a per-minute and per-day budget.
+
+    The per-minute budget is a token bucket (capacity ``per_minute``, refilled
+    continuously). The per-day budget is a counter reset at UTC midnight, with
+    the last ``daily_reserve`` requests kept for interactive lookups. Waiting
+    callers are served strictly in priority order, then arrival order; a caller
+    that cannot be served within its priority's maximum wait gets a
+    ``RATE_LIMIT`` error without spending quota. Both threads (``acquire``)
+    and event-loop tasks (``acquire_async``) share the same queue.
+    """
+
+    POLL_INTERVAL_SECONDS = 0.05
+
+    def __init__(
+        self,
+        per_minute: int = settings.quota_requests_per_minute,
+        per_day: int = settings.quota_requests_per_day,
+        daily_reserve: int = settings.quota_daily_reserve,
+        max_wait_seconds: Optional[Dict[Priority, float]] = None,
+        provider_name: str = "Upstream provider",
+        clock: Callable[[], float] = time.monotonic,
+        now: Callable[[], datetime] = _utc_now,
+    ) -> None:
+        self.provider_name = provider_name
+        self.per_minute = per_minute
+        self.per_day = per_day
+        self.daily_reserve = daily_reserve
+        self.max_wait_seconds = max_wait_seconds or {
+            Priority.INTERACTIVE: settings.quota_max_wait_interactive_seconds,
+            Priority.VALUATION: settings.quota_max_wait_valuation_seconds,
+            Priority.BACKGROUND: settings.quota_max_wait_background_seconds,
+        }
+        # Monotonic seconds for the minute bucket; UTC wall time for the daily budget
+        self._clock = clock
+        self._now = now
+        self._rate = per_minute / 60.0
+        self._tokens = float(per_minute)
+        self._last_refill = clock()
+        self._day = now().date()
+        self._used_today = 0
+        self._waiters: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self.granted = 0
+        self.rejected = 0
+
+    def acquire(self, priority: Priority = Priority.INTERACTIVE) -> None:
+        """Block the calling thread until a request slot is granted."""
+        ticket = self._enqueue(priority)
+        deadline = self._clock() + self.max_wait_seconds[priority]
+        try:
+            while True:
+                wait = self._try_acquire(ticket, priority)
+                if wait is None:
+                    return
+                time.sleep(self._next_sleep(wait, deadline, priority))
+        finally:
+            self._dequeue(ticket)
+
+    async def acquire_async(self, priority: Priority = Priority.INTERACTIVE) -> None:
+        """Wait on the event loop until a request slot is granted."""
+        ticket = self._enqueue(priority)
+        deadline = self._clock() + self.max_wait_seconds[priority]
+        try:
+            while True:
+                wait = self._try_acquire(ticket, priority)
+                if wait is None:
+                    return
+                await asyncio.sleep(self._next_sleep(wait, deadline, priority))
+        finally:
+            self._dequeue(ticket)
+
+    def drain(self) -> None:
+        """Empty the minute bucket after upstream reports we are over quota anyway."""
+        with self._lock:
+            self._tokens = 0.0
+            self._last_refill = self._clock()
+
+    def stats(self) -> Dict[str, float]:
+        """Return quota usage and queue counters for monitoring."""
+        with self._lock:
+            self._refill()
+            return {
+                "tokens_available": round(self._tokens, 2),
+                "per_minute": self.per_minute,
+                "used_today": self._used_today,
+                "daily_remaining": max(self.per_day - self._used_today, 0),
+                "queued": len(self._waiters),
+                "granted": self.granted,
+                "rejected": self.rejected,
+            }
+
+    def sustainable_rate(self, priority: Priority = Priority.BACKGROUND) -> float:
+        """Requests per second this priority can keep up until the daily budget resets."""
+        with self._lock:
+            self._refill()
+            daily_limit = self.per_day if priority == Priority.INTERACTIVE else self.per_day - self.daily_reserve
+            remaining = max(daily_limit - self._used_today, 0)
+        now = self._now()
+        midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), now.tzinfo)
+        return min(self._rate, remaining / max((midnight - now).total_seconds(), 1.0))
+
+    def _enqueue(self, priority: Priority) -> Tuple[int, int]:
+        ticket = (int(priority), next(self._sequence))
+        with self._lock:
+            heapq.heappush(self._waiters, ticket)
+        return ticket
+
+    def _dequeue(self, ticket: Tuple[int, int]) -> None:
+        with self._lock:
+            if ticket in self._waiters:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+
+    def _refill(self) -> None:
+        """Top up the minute bucket and roll the daily counter (lock held)."""
+        now = self._clock()
+        self._tokens = min(float(self.per_minute), self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+        today = self._now().date()
+        if today != self._day:
+            self._day = today
+            self._used_today = 0
+
+    def _try_acquire(self, ticket: Tuple[int, int], priority: Priority) -> Optional[float]:
+        """Take a slot if this ticket is first in line; else return seconds to wait."""
+        with self._lock:
+            self._refill()
+            daily_limit = self.per_day if priority == Priority.INTERACTIVE else self.per_day - self.daily_reserve
+            if self._used_today >= daily_limit:
+                self.rejected += 1
+                raise ExternalServiceError(
+                    self.provider_name,
+                    "Daily request budget exhausted",
+                    "RATE_LIMIT"
+                )
+            if self._waiters and self._waiters[0] == ticket and self._tokens >= 1:
+                heapq.heappop(self._waiters)
+                self._tokens -= 1
+                self._used_today += 1
+                self.granted += 1
+                return None
+            if self._tokens >= 1:
+                # A higher-priority waiter is about to take the available token
+                return self.POLL_INTERVAL_SECONDS
+            return (1 - self._tokens) / self._rate if self._rate > 0 else self.POLL_INTERVAL_SECONDS
+
+    def _next_sleep(self, wait: float, deadline: float, priority: Priority) -> float:
+        """Clamp a wait to the caller's deadline, rejecting once it has passed."""
+        remaining = deadline - self._clock()
+        if remaining <= 0:
+            with self._lock:
+                self.rejected += 1
+            raise ExternalServiceError(
+                self.provider_name,
+                f"Request budget exhausted; {priority.name.lower()} request not scheduled",
+                "RATE_LIMIT"
+            )
+        return max(min(wait, remaining), 0.001)
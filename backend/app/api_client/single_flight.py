@@ -0,0 +1,94 @@
+"""Single-flight coalescing of concurrent identical upstream calls."""
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class _SyncCall:
+    """An in-flight call shared by threads waiting on the same key."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Run at most one call per key at a time; concurrent callers share its outcome.
+
+    Sync callers (threads) and async callers (tasks on an event loop) are
+    tracked separately, because a thread cannot await an asyncio future and a
+    task must not block on a thread event. Within each kind, every caller that
+    arrives while a call for the same key is running waits for it and gets its
+    result or re-raises its error.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._sync_calls: Dict[Hashable, _SyncCall] = {}
+        self._async_calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """Run ``fn`` for ``key`` unless an identical sync call is already running."""
+        with self._lock:
+            call = self._sync_calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _SyncCall()
+                self._sync_calls[key] = call
+                self.calls += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._sync_calls.pop(key, None)
+            call.done.set()
+
+    async def do_async(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Await ``fn()`` for ``key`` unless an identical async call is already running."""
+        with self._lock:
+            future = self._async_calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+            else:
+                future = asyncio.ensure_future(fn())
+                self._async_calls[key] = future
+                self.calls += 1
+                future.add_done_callback(lambda _: self._forget(key, future))
+        # Shield so one cancelled waiter does not cancel the call for the others
+        return await asyncio.shield(future)
+
+    def _forget(self, key: Hashable, future: "asyncio.Future[Any]") -> None:
+        with self._lock:
+            if self._async_calls.get(key) is future:
+                del self._async_calls[key]
+        if not future.cancelled():
+            # Mark the exception retrieved when every waiter was cancelled
+            future.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """Return coalescing counters for monitoring."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._sync_calls) + len(self._async_calls),
+            }
@@ -12,6 +12,76 @@ LOG_TO_FILE = os.getenv("LOG_TO_FILE", "true").lower() == "true"
 LOG_TO_CONSOLE = os.getenv("LOG_TO_CONSOLE", "true").lower() == "true"
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")  # development, production
 
+# Stock API HTTP client (one pooled client is shared by the whole process)
+STOCK_API_TIMEOUT_SECONDS = float(os.getenv("STOCK_API_TIMEOUT_SECONDS", "10"))
+STOCK_API_CONNECT_TIMEOUT_SECONDS = float(os.getenv("STOCK_API_CONNECT_TIMEOUT_SECONDS", "5"))
+STOCK_API_POOL_SIZE = int(os.getenv("STOCK_API_POOL_SIZE", "20"))
+STOCK_API_KEEPALIVE_CONNECTIONS = int(os.getenv("STOCK_API_KEEPALIVE_CONNECTIONS", "10"))
+STOCK_API_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("STOCK_API_KEEPALIVE_EXPIRY_SECONDS", "30"))
+
+# Quote cache (daily closes change at most once per trading day)
+QUOTE_CACHE_MAX_ENTRIES = int(os.getenv("QUOTE_CACHE_MAX_ENTRIES", "1024"))
+QUOTE_CACHE_TTL_SECONDS = float(os.getenv("QUOTE_CACHE_TTL_SECONDS", "900"))
+QUOTE_CACHE_STALE_TTL_SECONDS = float(os.getenv("QUOTE_CACHE_STALE_TTL_SECONDS", "86400"))
+
+# Upstream request quota (Alpha Vantage free tier: 5 per minute, 25 per day)
+QUOTA_REQUESTS_PER_MINUTE = int(os.getenv("QUOTA_REQUESTS_PER_MINUTE", "5"))
+QUOTA_REQUESTS_PER_DAY = int(os.getenv("QUOTA_REQUESTS_PER_DAY", "25"))
+QUOTA_DAILY_RESERVE = int(os.getenv("QUOTA_DAILY_RESERVE", "5"))  # kept for interactive lookups
+QUOTA_MAX_WAIT_INTERACTIVE_SECONDS = float(os.getenv("QUOTA_MAX_WAIT_INTERACTIVE_SECONDS", "5"))
+QUOTA_MAX_WAIT_VALUATION_SECONDS = float(os.getenv("QUOTA_MAX_WAIT_VALUATION_SECONDS", "10"))
+QUOTA_MAX_WAIT_BACKGROUND_SECONDS = float(os.getenv("QUOTA_MAX_WAIT_BACKGROUND_SECONDS", "30"))
+
+# Batch quote endpoint
+BATCH_QUOTE_MAX_TICKERS = int(os.getenv("BATCH_QUOTE_MAX_TICKERS", "100"))
+BATCH_QUOTE_CONCURRENCY = int(os.getenv("BATCH_QUOTE_CONCURRENCY", "4"))
+
+# Local symbol search index
+SYMBOL_INDEX_MAX_ENTRIES = int(os.getenv("SYMBOL_INDEX_MAX_ENTRIES", "50000"))
+SYMBOL_SEARCH_MIN_LOCAL_MATCHES = int(os.getenv("SYMBOL_SEARCH_MIN_LOCAL_MATCHES", "3"))
+SYMBOL_SEARCH_MAX_RESULTS = int(os.getenv("SYMBOL_SEARCH_MAX_RESULTS", "10"))
+
+# WebSocket price broadcast cycle
+BROADCAST_INTERVAL_SECONDS = float(os.getenv("BROADCAST_INTERVAL_SECONDS", "5"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "8"))
+BROADCAST_CYCLE_BUDGET_SECONDS = float(os.getenv("BROADCAST_CYCLE_BUDGET_SECONDS", "4"))
+# Per-ticker refresh interval bounds (BROADCAST_INTERVAL_SECONDS is the one-subscriber default)
+BROADCAST_MIN_INTERVAL_SECONDS = float(os.getenv("BROADCAST_MIN_INTERVAL_SECONDS", "1"))
+BROADCAST_MAX_INTERVAL_SECONDS = float(os.getenv("BROADCAST_MAX_INTERVAL_SECONDS", "60"))
+BROADCAST_CLOSED_INTERVAL_SECONDS = float(os.getenv("BROADCAST_CLOSED_INTERVAL_SECONDS", "300"))
+BROADCAST_FOLLOW_MARKET_HOURS = os.getenv("BROADCAST_FOLLOW_MARKET_HOURS", "true").lower() == "true"
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))  # frames per connection
+WS_SLOW_CONSUMER_SECONDS = float(os.getenv("WS_SLOW_CONSUMER_SECONDS", "10"))
+# Server heartbeats; a client silent for longer than the timeout is disconnected (0 disables)
+WS_HEARTBEAT_INTERVAL_SECONDS = float(os.getenv("WS_HEARTBEAT_INTERVAL_SECONDS", "20"))
+WS_HEARTBEAT_TIMEOUT_SECONDS = float(os.getenv("WS_HEARTBEAT_TIMEOUT_SECONDS", "60"))
+
+# Price bus between workers: "inprocess" (one worker) or "unix" (several workers on one host)
+PRICE_BUS = os.getenv("PRICE_BUS", "inprocess")
+PRICE_BUS_SOCKET_PATH = os.getenv("PRICE_BUS_SOCKET_PATH", "/tmp/stock-tracker-prices.sock")
+PRICE_BUS_RETRY_SECONDS = float(os.getenv("PRICE_BUS_RETRY_SECONDS", "1"))
+
+# Failure handling: per-ticker negative cache and provider-wide circuit breaker
+NEGATIVE_CACHE_BASE_SECONDS = float(os.getenv("NEGATIVE_CACHE_BASE_SECONDS", "60"))
+NEGATIVE_CACHE_MAX_SECONDS = float(os.getenv("NEGATIVE_CACHE_MAX_SECONDS", "3600"))
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_BREAKER_FAILURE_THRESHOLD", "3"))
+CIRCUIT_BREAKER_RESET_SECONDS = float(os.getenv("CIRCUIT_BREAKER_RESET_SECONDS", "30"))
+
+# Where portfolio analytics read positions: "table" (the maintained positions table)
+# or "aggregate" (computed from the transactions with one GROUP BY per request)
+POSITIONS_SOURCE = os.getenv("POSITIONS_SOURCE", "table")
+
+# Market data provider: "alphavantage" (live API) or "replay" (local/synthetic series)
+MARKET_DATA_PROVIDER = os.getenv("MARKET_DATA_PROVIDER", "alphavantage")
+REPLAY_DATA_DIR = os.getenv("REPLAY_DATA_DIR", "")  # <TICKER>.json / <TICKER>.csv files
+REPLAY_LATENCY_MS = float(os.getenv("REPLAY_LATENCY_MS", "0"))
+REPLAY_JITTER_MS = float(os.getenv("REPLAY_JITTER_MS", "0"))
+REPLAY_ERROR_RATE = float(os.getenv("REPLAY_ERROR_RATE", "0"))  # 0.0 - 1.0
+REPLAY_ERROR_CODES = os.getenv("REPLAY_ERROR_CODES", "TIMEOUT")  # comma-separated
+REPLAY_SYNTHETIC = os.getenv("REPLAY_SYNTHETIC", "true").lower() == "true"
+REPLAY_STEP_SECONDS = float(os.getenv("REPLAY_STEP_SECONDS", "0"))  # 0 = serve whole series
+REPLAY_SEED = int(os.getenv("REPLAY_SEED", "0"))
+
 class Settings:
     secret_key: str = SECRET_KEY
     algorithm: str = "HS256"
@@ -21,5 +91,52 @@ class Settings:
     log_to_console: bool = LOG_TO_CONSOLE
     environment: str = ENVIRONMENT
     is_production: bool = ENVIRONMENT.lower() == "production"
+    stock_api_timeout_seconds: float = STOCK_API_TIMEOUT_SECONDS
+    stock_api_connect_timeout_seconds: float = STOCK_API_CONNECT_TIMEOUT_SECONDS
+    stock_api_pool_size: int = STOCK_API_POOL_SIZE
+    stock_api_keepalive_connections: int = STOCK_API_KEEPALIVE_CONNECTIONS
+    stock_api_keepalive_expiry_seconds: float = STOCK_API_KEEPALIVE_EXPIRY_SECONDS
+    quote_cache_max_entries: int = QUOTE_CACHE_MAX_ENTRIES
+    quote_cache_ttl_seconds: float = QUOTE_CACHE_TTL_SECONDS
+    quote_cache_stale_ttl_seconds: float = QUOTE_CACHE_STALE_TTL_SECONDS
+    quota_requests_per_minute: int = QUOTA_REQUESTS_PER_MINUTE
+    quota_requests_per_day: int = QUOTA_REQUESTS_PER_DAY
+    quota_daily_reserve: int = QUOTA_DAILY_RESERVE
+    quota_max_wait_interactive_seconds: float = QUOTA_MAX_WAIT_INTERACTIVE_SECONDS
+    quota_max_wait_valuation_seconds: float = QUOTA_MAX_WAIT_VALUATION_SECONDS
+    quota_max_wait_background_seconds: float = QUOTA_MAX_WAIT_BACKGROUND_SECONDS
+    batch_quote_max_tickers: int = BATCH_QUOTE_MAX_TICKERS
+    batch_quote_concurrency: int = BATCH_QUOTE_CONCURRENCY
+    symbol_index_max_entries: int = SYMBOL_INDEX_MAX_ENTRIES
+    symbol_search_min_local_matches: int = SYMBOL_SEARCH_MIN_LOCAL_MATCHES
+    symbol_search_max_results: int = SYMBOL_SEARCH_MAX_RESULTS
+    broadcast_interval_seconds: float = BROADCAST_INTERVAL_SECONDS
+    broadcast_concurrency: int = BROADCAST_CONCURRENCY
+    broadcast_cycle_budget_seconds: float = BROADCAST_CYCLE_BUDGET_SECONDS
+    broadcast_min_interval_seconds: float = BROADCAST_MIN_INTERVAL_SECONDS
+    broadcast_max_interval_seconds: float = BROADCAST_MAX_INTERVAL_SECONDS
+    broadcast_closed_interval_seconds: float = BROADCAST_CLOSED_INTERVAL_SECONDS
+    broadcast_follow_market_hours: bool = BROADCAST_FOLLOW_MARKET_HOURS
+    ws_send_queue_size: int = WS_SEND_QUEUE_SIZE
+    ws_slow_consumer_seconds: float = WS_SLOW_CONSUMER_SECONDS
+    ws_heartbeat_interval_seconds: float = WS_HEARTBEAT_INTERVAL_SECONDS
+    ws_heartbeat_timeout_seconds: float = WS_HEARTBEAT_TIMEOUT_SECONDS
+    price_bus: str = PRICE_BUS
+    price_bus_socket_path: str = PRICE_BUS_SOCKET_PATH
+    price_bus_retry_seconds: float = PRICE_BUS_RETRY_SECONDS
+    negative_cache_base_seconds: float = NEGATIVE_CACHE_BASE_SECONDS
+    negative_cache_max_seconds: float = NEGATIVE_CACHE_MAX_SECONDS
+    circuit_breaker_failure_threshold: int = CIRCUIT_BREAKER_FAILURE_THRESHOLD
+    circuit_breaker_reset_seconds: float = CIRCUIT_BREAKER_RESET_SECONDS
+    positions_source: str = POSITIONS_SOURCE
+    market_data_provider: str = MARKET_DATA_PROVIDER
+    replay_data_dir: str = REPLAY_DATA_DIR
+    replay_latency_seconds: float = REPLAY_LATENCY_MS / 1000
+    replay_jitter_seconds: float = REPLAY_JITTER_MS / 1000
+    replay_error_rate: float = REPLAY_ERROR_RATE
+    replay_error_codes: tuple = tuple(code.strip().upper() for code in REPLAY_ERROR_CODES.split(",") if code.strip())
+    replay_synthetic: bool = REPLAY_SYNTHETIC
+    replay_step_seconds: float = REPLAY_STEP_SECONDS
+    replay_seed: int = REPLAY_SEED
 
 settings = Settings()
\ No newline at end of file
@@ -4,11 +4,13 @@ from collections.abc import Iterable
 from typing import Optional, List
 import logging
 
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
-from app.models import User, Stock, Portfolio, Transaction
+from app.models import User, Stock, Portfolio, Transaction, Lot
 from app.schemas import StockCreate, StockUpdate, PortfolioCreate, PortfolioUpdate, TransactionCreate, TransactionUpdate, UserCreate, UserUpdate
 from app.security import hash_password
+from app.services.position_service import record_transaction, rebuild_position, rebuild_positions
 from app.exceptions import NotFoundError, ConflictError, DatabaseError, ValidationError
 
 logger = logging.getLogger(__name__)
@@ -79,7 +81,7 @@ def delete_stock(db: Session, stock_id: int) -> None:
 
 def create_portfolio(db: Session, portfolio: PortfolioCreate, user_id: int) -> Portfolio:
     """Create a new portfolio record."""
-    db_portfolio = Portfolio(name=portfolio.name, user_id=user_id)
+    db_portfolio = Portfolio(name=portfolio.name, user_id=user_id, cost_basis_method=portfolio.cost_basis_method)
     try:
         db.add(db_portfolio)
         db.commit()
@@ -123,9 +125,14 @@ def update_portfolio(
     update_data = portfolio.model_dump(exclude_unset=True, exclude_none=True)
     # Don't allow changing user_id
     update_data.pop('user_id', None)
+    method_changed = update_data.get('cost_basis_method', db_portfolio.cost_basis_method) != db_portfolio.cost_basis_method
     for field, value in update_data.items():
         setattr(db_portfolio, field, value)
     try:
+        if method_changed:
+            # Cost basis and realized gains depend on the method all the way back
+            db.flush()
+            rebuild_positions(db, portfolio_id)
         db.commit()
         db.refresh(db_portfolio)
         return db_portfolio
@@ -150,6 +157,36 @@ def delete_portfolio(db: Session, portfolio_id: int, user_id: int) -> None:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+def _check_lot_id(db: Session, transaction: Transaction, method: str) -> None:
+    """A ``lot_id`` is only accepted on a sell under specific identification, naming an earlier buy of the same holding.
+
+    New sells must name a lot that is still open; an edited sell may keep
+    naming a lot it has itself used up.
+    """
+    if transaction.lot_id is None:
+        return
+    if method != "specific" or transaction.transaction_type.lower() != "sell":
+        raise HTTPException(status_code=400, detail="lot_id is only accepted on sells under the specific cost basis method")
+    ticker = transaction.ticker_symbol.upper()
+    if transaction.id is None:
+        found = db.query(Lot.id).filter(
+            Lot.transaction_id == transaction.lot_id,
+            Lot.portfolio_id == transaction.portfolio_id,
+            Lot.ticker_symbol == ticker,
+            Lot.quantity > 0
+        ).first()
+    else:
+        found = db.query(Transaction.id).filter(
+            Transaction.id == transaction.lot_id,
+            Transaction.id < transaction.id,
+            Transaction.portfolio_id == transaction.portfolio_id,
+            func.upper(Transaction.ticker_symbol) == ticker,
+            func.lower(Transaction.transaction_type) == "buy"
+        ).first()
+    if found is None:
+        raise HTTPException(status_code=400, detail=f"lot_id {transaction.lot_id} is not an open {ticker} lot of this portfolio")
+
+
 def create_transaction(
     db: Session,
     transaction: TransactionCreate,
@@ -164,9 +201,11 @@ def create_transaction(
     if not portfolio:
         raise HTTPException(status_code=404, detail="Portfolio not found")
     
-    db_transaction = Transaction(portfolio_id=transaction.portfolio_id, ticker_symbol=transaction.ticker_symbol, transaction_type=transaction.transaction_type, quantity=transaction.quantity, price=transaction.price)
+    db_transaction = Transaction(portfolio_id=transaction.portfolio_id, ticker_symbol=transaction.ticker_symbol, transaction_type=transaction.transaction_type, quantity=transaction.quantity, price=transaction.price, lot_id=transaction.lot_id)
+    _check_lot_id(db, db_transaction, portfolio.cost_basis_method)
     try:
         db.add(db_transaction)
+        record_transaction(db, db_transaction)
         db.commit()
         db.refresh(db_transaction)
         return db_transaction
@@ -209,7 +248,12 @@ def update_transaction(
         raise HTTPException(status_code=404, detail="Transaction not found")
     
     # If portfolio_id is being updated, verify new portfolio belongs to user
-    update_data = transaction.model_dump(exclude_unset=True, exclude_none=True)
+    # An explicit null only means something for lot_id (back to the default lot order)
+    update_data = {
+        field: value
+        for field, value in transaction.model_dump(exclude_unset=True).items()
+        if value is not None or field == 'lot_id'
+    }
     if 'portfolio_id' in update_data:
         portfolio = db.query(Portfolio).filter(
             Portfolio.id == update_data['portfolio_id'],
@@ -218,9 +262,24 @@ def update_transaction(
         if not portfolio:
             raise HTTPException(status_code=404, detail="Portfolio not found")
     
+    previous_position = (db_transaction.portfolio_id, db_transaction.ticker_symbol.upper())
     for field, value in update_data.items():
         setattr(db_transaction, field, value)
+    method = db.query(Portfolio.cost_basis_method).filter(Portfolio.id == db_transaction.portfolio_id).scalar()
+    if 'lot_id' not in update_data and (method != "specific" or db_transaction.transaction_type.lower() != "sell"):
+        # No longer a specific-identification sell: the lot it named no longer applies
+        db_transaction.lot_id = None
+    try:
+        _check_lot_id(db, db_transaction, method)
+    except HTTPException:
+        db.rollback()
+        raise
     try:
+        db.flush()
+        # An edit can land anywhere in the history, so replay the affected position(s);
+        # the previous one first, so a moved buy's lot is dropped before it is re-added
+        for portfolio_id, ticker in dict.fromkeys([previous_position, (db_transaction.portfolio_id, db_transaction.ticker_symbol.upper())]):
+            rebuild_position(db, portfolio_id, ticker)
         db.commit()
         db.refresh(db_transaction)
         return db_transaction
@@ -237,8 +296,13 @@ def delete_transaction(db: Session, transaction_id: int, user_id: int) -> None:
     ).first()
     if not db_transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
+    portfolio_id, ticker = db_transaction.portfolio_id, db_transaction.ticker_symbol
     try:
+        # Sells that named this buy's lot fall back to the method's default order
+        db.query(Transaction).filter(Transaction.lot_id == transaction_id).update({Transaction.lot_id: None})
         db.delete(db_transaction)
+        db.flush()
+        rebuild_position(db, portfolio_id, ticker)
         db.commit()
     except Exception as e:
         db.rollback()
@@ -7,3 +7,8 @@ def get_db():
     finally:
         db.close()
 
+
+
+def get_session_factory():
+    """For handlers that open their own short-lived sessions, e.g. one per WebSocket message."""
+    return SessionLocal
@@ -7,6 +7,10 @@ from app.config import settings
 from app.security import oauth2_scheme
 
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+    return user_from_token(token, db)
+
+def user_from_token(token: str, db: Session) -> User:
+    """Resolve a bearer token to its user (also used where no Authorization header exists, e.g. WebSockets)."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -23,4 +27,4 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     user = db.query(User).filter(User.id == int(user_id)).first()
     if user is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    return user
\ No newline at end of file
+    return user
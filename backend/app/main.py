@@ -1,4 +1,8 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Callable, Dict, List, Optional
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect, Request, Depends
+from starlette.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
@@ -7,8 +11,11 @@ import json
 import logging
 
 # Database imports
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
+from app.database import get_db, get_session_factory
 from app.database.database import engine, SessionLocal
-from app.models.model import Base
+from app.models.model import Base, Stock, User
 
 # Config imports
 from app.config import settings
@@ -24,16 +31,28 @@ from app.error_handlers import (
     general_exception_handler,
     rate_limit_exception_handler,
 )
-from app.exceptions import AppException
+from app.exceptions import AppException, ExternalServiceError, ValidationError
+from app.schemas import BatchPriceRequest, BatchPriceResult, BatchPriceResponse, PriceBar
 
 # Router imports
 from app.routers import users, portfolios, transactions, stocks, auth
 
 # API Client import
-from app.api_client.api_client import StockAPIClient
+from app.api_client.api_client import get_stock_api_client, close_stock_api_client
+
+# Price history
+from app.services.price_history_service import PriceHistoryService, persist_daily_series
+from app.services.position_service import backfill_positions
+
+# Symbol search
+from app.services.symbol_search_service import symbol_search
 
 # WebSocket manager
 from app.websocket_manager import manager
+from app.crud import get_portfolio
+from app.dependencies import get_current_user, user_from_token
+from app.services.portfolio_service import PortfolioAnalytics
+from app import wire_format
 
 # Rate limiting
 from slowapi import Limiter  # type: ignore
@@ -55,16 +74,46 @@ except Exception as e:
     logger = std_logging.getLogger(__name__)
     logger.warning(f"Failed to setup custom logging: {e}. Using basic logging.")
 
-# Create all tables in the database
-Base.metadata.create_all(bind=engine)
+# Create all tables in the database, unless Alembic manages it: there the
+# migrations create the positions and lots tables together with their backfills
+if not inspect(engine).has_table("alembic_version"):
+    Base.metadata.create_all(bind=engine)
 
 # Initialize rate limiter
 limiter = Limiter(key_func=get_remote_address)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared resources on startup and release them on shutdown."""
+    logger.info("Starting application...")
+    logger.info(f"Environment: {settings.environment}")
+    logger.info(f"Log level: {settings.log_level}")
+    # One pooled stock API client per process, shared by routes and WebSockets
+    app.state.stock_api_client = get_stock_api_client()
+    # Keep every daily series the client downloads in the local price_bars table
+    app.state.stock_api_client.add_series_listener(persist_daily_series)
+    # Seed the in-memory symbol search index from the stocks table
+    with SessionLocal() as db:
+        symbol_search.load_stocks(db.query(Stock).all())
+        # Fill positions and lots left empty by create_all on an older database
+        if backfill_positions(db):
+            db.commit()
+    logger.info(f"Symbol search index loaded with {len(symbol_search.index)} entries")
+    manager.start_broadcast_task()
+    logger.info("WebSocket broadcast task started")
+    logger.info("Application started successfully")
+    yield
+    logger.info("Shutting down application...")
+    await manager.stop_broadcast_task()
+    await close_stock_api_client()
+
+
 app = FastAPI(
     title="Stock Portfolio API",
     description="A stock tracking and portfolio management API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Add rate limiter to app state
@@ -104,44 +153,84 @@ app.include_router(portfolios.router)
 app.include_router(transactions.router)
 app.include_router(stocks.router)
 
-# Start WebSocket broadcast task
-@app.on_event("startup")
-async def startup_event():
-    """Start the WebSocket price broadcast task on application startup."""
-    logger.info("Starting application...")
-    logger.info(f"Environment: {settings.environment}")
-    logger.info(f"Log level: {settings.log_level}")
-    manager.start_broadcast_task()
-    logger.info("WebSocket broadcast task started")
-    logger.info("Application started successfully")
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Cleanup on application shutdown."""
-    logger.info("Shutting down application...")
-
 # Stock API endpoints using StockAPIClient
 @app.get("/api/stocks/{ticker}/price")
-def get_stock_price(ticker: str):
+async def get_stock_price(ticker: str):
     """Get current price for a stock ticker (public endpoint)."""
     logger.info(f"Fetching price for ticker: {ticker}")
     try:
-        client = StockAPIClient()
-        price = client.get_current_price(ticker)
+        price = await get_stock_api_client().get_current_price_async(ticker)
         logger.info(f"Successfully fetched price for {ticker}: ${price}")
         return {"ticker": ticker, "price": price}
     except Exception as e:
         logger.error(f"Error fetching price for {ticker}: {str(e)}", exc_info=True)
         raise
 
+async def _get_batch_prices(tickers: list[str]) -> BatchPriceResponse:
+    """Resolve a batch of tickers into per-ticker price or error results."""
+    if len(tickers) > settings.batch_quote_max_tickers:
+        raise ValidationError(
+            f"At most {settings.batch_quote_max_tickers} tickers can be requested at once",
+            "TOO_MANY_TICKERS"
+        )
+    results = await get_stock_api_client().get_current_prices_async(tickers)
+    prices = {
+        ticker: (
+            BatchPriceResult(error=result.detail, error_code=result.error_code)
+            if isinstance(result, ExternalServiceError)
+            else BatchPriceResult(price=result)
+        )
+        for ticker, result in results.items()
+    }
+    logger.info(f"Batch price lookup for {len(prices)} tickers")
+    return BatchPriceResponse(prices=prices)
+
+@app.get("/api/stocks/prices", response_model=BatchPriceResponse)
+async def get_stock_prices(tickers: str):
+    """Get current prices for a comma-separated list of tickers (public endpoint)."""
+    return await _get_batch_prices(tickers.split(","))
+
+@app.post("/api/stocks/prices", response_model=BatchPriceResponse)
+async def post_stock_prices(request: BatchPriceRequest):
+    """Get current prices for a long list of tickers sent in the body (public endpoint)."""
+    return await _get_batch_prices(request.tickers)
+
+@app.get("/api/stocks/{ticker}/history", response_model=List[PriceBar])
+def get_stock_history(
+    ticker: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db),
+):
+    """Get daily price history from the local store, refreshing it incrementally (public endpoint)."""
+    logger.info(f"Fetching price history for {ticker}")
+    return PriceHistoryService(db).get_history(ticker, start=start, end=end)
+
+@app.get("/api/stocks/client/stats")
+def get_stock_client_stats(current_user: User = Depends(get_current_user)):
+    """Get stock API client counters: quote cache, coalescing, quota, search and price bus (requires authentication)."""
+    return {
+        **get_stock_api_client().stats(),
+        "symbol_search": symbol_search.stats(),
+        "price_bus": manager.bus.stats(),
+    }
+
+@app.get("/api/stocks/refresh-schedule")
+def get_refresh_schedule(current_user: User = Depends(get_current_user)):
+    """Get the live price poller's per-ticker refresh intervals (requires authentication)."""
+    return {"leader": manager.bus.is_leader, **manager.schedule.snapshot()}
+
+@app.get("/api/websocket/stats")
+def get_websocket_stats(limit: int = 10, current_user: User = Depends(get_current_user)):
+    """Get this worker's WebSocket connection counters and heaviest tickers and connections (requires authentication)."""
+    return manager.stats(limit=max(1, min(limit, 100)))
+
 @app.get("/api/stocks/search")
-def search_stocks(query: str):
+async def search_stocks(query: str):
     """Search for stocks by keyword (public endpoint)."""
     logger.info(f"Searching stocks with query: {query}")
     try:
-        client = StockAPIClient()
-        results = client.search_stocks(query)
+        results = await symbol_search.search_async(query)
         logger.info(f"Found {len(results)} results for query: {query}")
         return {"query": query, "results": results}
     except Exception as e:
@@ -155,15 +244,40 @@ def read_root():
     return {"message": "Stock Tracker API", "version": "1.0.0"}
 
 
+def _portfolio_positions(make_session: Callable[[], Session], token: str, portfolio_id: int) -> Dict[str, Dict]:
+    """A portfolio's positions, after checking the token's user owns it (in a session of its own)."""
+    with make_session() as db:
+        user = user_from_token(token, db)
+        get_portfolio(db, portfolio_id, user.id)
+        return PortfolioAnalytics(db).get_portfolio_positions(portfolio_id)
+
+
 @app.websocket("/ws/prices")
-async def websocket_prices(websocket: WebSocket):
-    """WebSocket endpoint for live stock price updates."""
+async def websocket_prices(
+    websocket: WebSocket, make_session: Callable[[], Session] = Depends(get_session_factory)
+):
+    """WebSocket endpoint for live stock price updates.
+
+    Connect with ``?encoding=binary`` to receive price frames in the compact
+    binary layout described in app/wire_format.py; JSON is the default.
+    ``subscribe_portfolio`` needs an access token, sent in the message or as
+    ``?token=`` when connecting; the portfolio's total is then pushed as a
+    ``portfolio_value`` frame whenever a held ticker's price changes.
+    The server sends a ``heartbeat`` frame every few seconds; a client that
+    sends nothing (a ``heartbeat`` reply will do) within the timeout is closed.
+    """
     logger.info("WebSocket connection established")
-    await manager.connect(websocket)
+    encoding = websocket.query_params.get("encoding", wire_format.JSON).lower()
+    if encoding not in wire_format.ENCODINGS:
+        await websocket.close(code=1003)  # unsupported data
+        logger.warning(f"WebSocket rejected: unsupported encoding '{encoding}'")
+        return
+    await manager.connect(websocket, encoding)
     try:
         while True:
             # Receive messages from client (subscribe/unsubscribe requests)
             data = await websocket.receive_text()
+            manager.record_received(websocket, data)
             try:
                 message = json.loads(data)
                 msg_type = message.get("type")
@@ -174,16 +288,42 @@ async def websocket_prices(websocket: WebSocket):
                         logger.debug(f"WebSocket subscribe request for {ticker}")
                         manager.subscribe(websocket, ticker)
                         # Send cached price if available
-                        if ticker in manager.price_cache:
-                            await manager.send_personal_message(
-                                json.dumps({
-                                    "type": "price_update",
-                                    "ticker": ticker,
-                                    "price": manager.price_cache[ticker],
-                                    "cached": True
-                                }),
-                                websocket
-                            )
+                        manager.send_cached_price(websocket, ticker)
+
+                elif msg_type == "subscribe_many":
+                    tickers = manager.subscribe_many(websocket, message.get("tickers") or [])
+                    logger.debug(f"WebSocket subscribe request for {len(tickers)} tickers")
+                    manager.send_personal_message(
+                        json.dumps({
+                            "type": "subscribed",
+                            "tickers": tickers,
+                            "prices": manager.cached_prices(tickers)
+                        }),
+                        websocket
+                    )
+
+                elif msg_type == "subscribe_portfolio":
+                    portfolio_id = int(message.get("portfolio_id"))
+                    token = message.get("token") or websocket.query_params.get("token", "")
+                    try:
+                        positions = await run_in_threadpool(_portfolio_positions, make_session, token, portfolio_id)
+                    except HTTPException as e:
+                        manager.send_personal_message(
+                            json.dumps({"type": "error", "portfolio_id": portfolio_id, "message": e.detail}),
+                            websocket
+                        )
+                        continue
+                    tickers = manager.follow_portfolio(websocket, portfolio_id, positions)
+                    manager.send_personal_message(
+                        json.dumps({
+                            "type": "portfolio_subscribed",
+                            "portfolio_id": portfolio_id,
+                            "tickers": tickers,
+                            "prices": manager.cached_prices(tickers),
+                            "value": manager.valuations.value(portfolio_id)
+                        }),
+                        websocket
+                    )
                 
                 elif msg_type == "unsubscribe":
                     ticker = message.get("ticker", "").upper()
@@ -191,21 +331,38 @@ async def websocket_prices(websocket: WebSocket):
                         logger.debug(f"WebSocket unsubscribe request for {ticker}")
                         manager.unsubscribe(websocket, ticker)
                 
+                elif msg_type == "resync":
+                    # Current price and sequence for the client's subscriptions
+                    manager.send_snapshot(websocket, message.get("tickers"))
+
+                elif msg_type == "configure":
+                    # Opt in to (or out of) one price_batch frame per refresh cycle
+                    batch = bool(message.get("batch", False))
+                    manager.set_batch_mode(websocket, batch)
+                    manager.send_personal_message(
+                        json.dumps({"type": "configured", "batch": batch}),
+                        websocket
+                    )
+
+                elif msg_type == "heartbeat":
+                    # Answer to a server heartbeat; receiving it already marked the client alive
+                    pass
+
                 elif msg_type == "ping":
                     # Respond to ping with pong
-                    await manager.send_personal_message(
+                    manager.send_personal_message(
                         json.dumps({"type": "pong"}),
                         websocket
                     )
             except json.JSONDecodeError as e:
                 logger.warning(f"Invalid JSON received in WebSocket: {str(e)}")
-                await manager.send_personal_message(
+                manager.send_personal_message(
                     json.dumps({"type": "error", "message": "Invalid JSON"}),
                     websocket
                 )
             except Exception as e:
                 logger.error(f"Error processing WebSocket message: {str(e)}", exc_info=True)
-                await manager.send_personal_message(
+                manager.send_personal_message(
                     json.dumps({"type": "error", "message": str(e)}),
                     websocket
                 )
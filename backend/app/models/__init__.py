@@ -1,4 +1,3 @@
-from app.models.model import Base, User, Stock, Portfolio, Transaction
-
-__all__ = ["Base", "User", "Stock", "Portfolio", "Transaction"]
+from app.models.model import Base, User, Stock, Portfolio, Transaction, Position, Lot, PriceBar
 
+__all__ = ["Base", "User", "Stock", "Portfolio", "Transaction", "Position", "Lot", "PriceBar"]
\ No newline at end of file
@@ -1,6 +1,6 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from datetime import datetime
-from sqlalchemy import ForeignKey, String
+from datetime import date, datetime
+from sqlalchemy import BigInteger, ForeignKey, Index, String, UniqueConstraint
 
 
 class Base(DeclarativeBase):
@@ -46,6 +46,8 @@ class Portfolio(Base):
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     name: Mapped[str] = mapped_column(String(255), default="My Portfolio")
     created_at: Mapped[datetime] = mapped_column(default=datetime.now, nullable=False)
+    # How sells pick their cost basis: "average", "fifo", "lifo", "hifo" or "specific"
+    cost_basis_method: Mapped[str] = mapped_column(String(10), default="average", server_default="average", nullable=False)
     
     # Relationships
     user: Mapped["User"] = relationship(back_populates="portfolios")
@@ -64,8 +66,60 @@ class Transaction(Base):
     quantity: Mapped[float] = mapped_column(default=0.0, nullable=False)
     price: Mapped[float] = mapped_column(default=0.0, nullable=False)
     executed_at: Mapped[datetime] = mapped_column(default=datetime.now, nullable=False)
+    # For a sell under specific identification: id of the buy whose lot it draws from first
+    lot_id: Mapped[int | None] = mapped_column(ForeignKey("transactions.id", ondelete="SET NULL"), nullable=True)
 
     # Relationships
     portfolio: Mapped["Portfolio"] = relationship(back_populates="transactions")
     stock: Mapped["Stock"] = relationship(back_populates="transactions")  # Fixed: back_populates should be "transactions" not "portfolio"
 
+
+
+class Position(Base):
+    """Represents a portfolio's current holding of one ticker, kept in step with its transactions."""
+
+    __tablename__ = "positions"
+    __table_args__ = (UniqueConstraint("portfolio_id", "ticker_symbol", name="uq_positions_portfolio_ticker"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    portfolio_id: Mapped[int] = mapped_column(ForeignKey("portfolios.id"), index=True)
+    ticker_symbol: Mapped[str] = mapped_column(String(10))  # upper-case
+    quantity: Mapped[float] = mapped_column(default=0.0, nullable=False)
+    total_cost: Mapped[float] = mapped_column(default=0.0, nullable=False)
+    average_cost: Mapped[float] = mapped_column(default=0.0, nullable=False)
+    realized_gain: Mapped[float] = mapped_column(default=0.0, server_default="0", nullable=False)
+    # Bumped on every write; a concurrent writer to the same row fails instead of losing an update
+    version: Mapped[int] = mapped_column(default=1, nullable=False)
+
+    __mapper_args__ = {"version_id_col": version}
+
+
+class Lot(Base):
+    """Represents the unsold part of one buy, for portfolios using a lot-based cost basis method."""
+
+    __tablename__ = "lots"
+    __table_args__ = (Index("ix_lots_portfolio_ticker", "portfolio_id", "ticker_symbol"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    portfolio_id: Mapped[int] = mapped_column(ForeignKey("portfolios.id"))
+    ticker_symbol: Mapped[str] = mapped_column(String(10))  # upper-case
+    transaction_id: Mapped[int] = mapped_column(ForeignKey("transactions.id", ondelete="CASCADE"), unique=True)
+    quantity: Mapped[float] = mapped_column(nullable=False)  # remaining
+    price: Mapped[float] = mapped_column(nullable=False)
+    acquired_at: Mapped[datetime] = mapped_column(nullable=False)
+
+
+class PriceBar(Base):
+    """Represents one daily OHLCV bar for a ticker, stored from market data downloads."""
+
+    __tablename__ = "price_bars"
+    __table_args__ = (UniqueConstraint("ticker_symbol", "trade_date", name="uq_price_bars_ticker_date"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    ticker_symbol: Mapped[str] = mapped_column(String(10), index=True)
+    trade_date: Mapped[date] = mapped_column(nullable=False)
+    open: Mapped[float] = mapped_column(nullable=False)
+    high: Mapped[float] = mapped_column(nullable=False)
+    low: Mapped[float] = mapped_column(nullable=False)
+    close: Mapped[float] = mapped_column(nullable=False)
+    volume: Mapped[int] = mapped_column(BigInteger, default=0, nullable=False)
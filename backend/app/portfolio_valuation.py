@@ -0,0 +1,111 @@
+"""Running portfolio valuations for WebSocket connections following a portfolio."""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set
+
+
+def value_summary(
+    total_value: float, total_cost: float, realized_gain_loss: Optional[float] = None
+) -> Dict[str, float]:
+    """Totals in the shape of the PortfolioValue schema (also how PortfolioAnalytics rounds them)."""
+    total_gain_loss = total_value - total_cost
+    gain_loss_percentage = (total_gain_loss / total_cost * 100) if total_cost > 0 else 0.0
+    summary = {
+        "total_value": round(total_value, 2),
+        "total_cost": round(total_cost, 2),
+        "total_gain_loss": round(total_gain_loss, 2),
+        "gain_loss_percentage": round(gain_loss_percentage, 2),
+    }
+    if realized_gain_loss is not None:
+        summary["realized_gain_loss"] = round(realized_gain_loss, 2)
+    return summary
+
+
+@dataclass
+class HeldPosition:
+    """One holding of a tracked portfolio."""
+    quantity: float
+    # Price the portfolio's running total currently reflects
+    price: float
+
+
+@dataclass
+class Valuation:
+    """A tracked portfolio: its holdings and running totals."""
+    positions: Dict[str, HeldPosition]
+    total_value: float
+    total_cost: float
+
+
+class PortfolioValuations:
+    """Portfolio totals kept current one price tick at a time.
+
+    ``track`` takes a portfolio's positions (as returned by
+    ``PortfolioAnalytics.get_portfolio_positions``) and values them once.
+    After that ``apply_price`` moves each affected total by
+    ``quantity * (new price - old price)``; transactions are never re-read.
+    An index from ticker to the portfolios holding it means a tick only
+    touches the portfolios that hold that ticker.
+    """
+
+    def __init__(self) -> None:
+        self._valuations: Dict[int, Valuation] = {}
+        self._holders: Dict[str, Set[int]] = {}
+
+    def __contains__(self, portfolio_id: int) -> bool:
+        return portfolio_id in self._valuations
+
+    def __len__(self) -> int:
+        return len(self._valuations)
+
+    def track(self, portfolio_id: int, positions: Dict[str, Dict], prices: Dict[str, float]) -> Dict[str, float]:
+        """Start (or restart) tracking a portfolio and return its current value.
+
+        Holdings without a price in ``prices`` are valued at their average
+        cost until their first tick, as ``get_portfolio_value`` does when a
+        price cannot be fetched.
+        """
+        self.untrack(portfolio_id)
+        held: Dict[str, HeldPosition] = {}
+        total_value = total_cost = 0.0
+        for ticker, position in positions.items():
+            ticker = ticker.upper()
+            price = prices.get(ticker)
+            if price is None:
+                price = float(position["average_cost"])
+            held[ticker] = HeldPosition(position["quantity"], price)
+            total_value += position["quantity"] * price
+            total_cost += position["total_cost"]
+            self._holders.setdefault(ticker, set()).add(portfolio_id)
+        self._valuations[portfolio_id] = Valuation(held, total_value, total_cost)
+        return value_summary(total_value, total_cost)
+
+    def untrack(self, portfolio_id: int) -> None:
+        valuation = self._valuations.pop(portfolio_id, None)
+        if valuation is None:
+            return
+        for ticker in valuation.positions:
+            holders = self._holders.get(ticker)
+            if holders is not None:
+                holders.discard(portfolio_id)
+                if not holders:
+                    del self._holders[ticker]
+
+    def apply_price(self, ticker: str, price: float) -> List[int]:
+        """Move every portfolio holding ``ticker`` to the new price; returns the ones whose total changed."""
+        changed: List[int] = []
+        for portfolio_id in self._holders.get(ticker.upper(), ()):
+            valuation = self._valuations[portfolio_id]
+            position = valuation.positions[ticker.upper()]
+            if position.price == price:
+                continue
+            valuation.total_value += position.quantity * (price - position.price)
+            position.price = price
+            changed.append(portfolio_id)
+        return changed
+
+    def value(self, portfolio_id: int) -> Optional[Dict[str, float]]:
+        """Current totals of a tracked portfolio (None if it is not tracked)."""
+        valuation = self._valuations.get(portfolio_id)
+        if valuation is None:
+            return None
+        return value_summary(valuation.total_value, valuation.total_cost)
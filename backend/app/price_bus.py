@@ -0,0 +1,287 @@
+"""Price bus: carries price updates from the one polling worker to every worker.
+
+Exactly one worker (the leader) polls the market data provider; it publishes
+each update on the bus and every worker, the leader included, fans it out to
+its own WebSocket connections. Workers report how many of their sockets are
+subscribed to each ticker, and the leader polls the union of those tickers.
+
+Messages are JSON-serializable dicts with a ``type`` key:
+
+* ``{"type": "price", "ticker": ..., "price": ..., "seq": ...}``
+* ``{"type": "error", "ticker": ..., "message": ...}``
+* ``{"type": "cycle_end"}`` - the leader finished a refresh cycle
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+Message = Dict[str, Any]
+
+# Unsent bytes allowed to pile up for one follower before the leader drops it
+MAX_FOLLOWER_BUFFER_BYTES = 1024 * 1024
+
+
+class PriceBus:
+    """Interface between ConnectionManagers and whatever connects the workers.
+
+    An implementation for an external broker (Redis, NATS, ...) needs to:
+
+    * hold a leadership lease so that ``is_leader`` is True on one worker at a
+      time, and hand it over when that worker goes away;
+    * deliver every ``publish``-ed message to the listeners of all workers,
+      including the publisher, in publish order;
+    * share each worker's ``update_interest`` counts so that ``interest`` on
+      the leader returns their sum across live workers.
+
+    ``publish`` and ``update_interest`` are called from the event loop and must
+    not block; implementations buffer and send in the background.
+    """
+
+    name = "base"
+
+    def __init__(self) -> None:
+        self._listeners: List[Callable[[Message], None]] = []
+        self._local_interest: Dict[str, int] = {}
+        self.published = 0
+        self.delivered = 0
+
+    @property
+    def is_leader(self) -> bool:
+        raise NotImplementedError
+
+    def add_listener(self, listener: Callable[[Message], None]) -> None:
+        """Call ``listener(message)`` for every message published by the leader."""
+        self._listeners.append(listener)
+
+    def update_interest(self, tickers: Dict[str, int]) -> None:
+        """Replace this worker's subscriptions (ticker -> number of subscribed connections)."""
+        self._local_interest = dict(tickers)
+
+    def interest(self) -> Dict[str, int]:
+        """Subscriber count per ticker over all workers (meaningful on the leader)."""
+        return dict(self._local_interest)
+
+    def publish(self, message: Message) -> None:
+        raise NotImplementedError
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "leader": self.is_leader,
+            "interest": len(self.interest()),
+            "published": self.published,
+            "delivered": self.delivered,
+        }
+
+    def _deliver(self, message: Message) -> None:
+        self.delivered += 1
+        for listener in list(self._listeners):
+            try:
+                listener(message)
+            except Exception as e:
+                logger.error(f"Price bus listener failed: {str(e)}", exc_info=True)
+
+
+class InProcessPriceBus(PriceBus):
+    """Single-worker bus: this worker is always the leader and messages are delivered directly."""
+
+    name = "inprocess"
+
+    @property
+    def is_leader(self) -> bool:
+        return True
+
+    def publish(self, message: Message) -> None:
+        self.published += 1
+        self._deliver(message)
+
+
+class UnixSocketPriceBus(PriceBus):
+    """Bus for several workers on one host, connected through a Unix domain socket.
+
+    The worker that holds an exclusive ``flock`` on ``<socket_path>.lock`` is
+    the leader and listens on ``socket_path``; the others connect to it, send
+    their interest sets and receive published messages as newline-delimited
+    JSON. The lock is released by the kernel when the leader exits, at which
+    point a follower's connection drops and it races for the lock.
+    """
+
+    name = "unix"
+
+    def __init__(
+        self,
+        socket_path: str = settings.price_bus_socket_path,
+        lock_path: Optional[str] = None,
+        retry_seconds: float = settings.price_bus_retry_seconds,
+    ) -> None:
+        super().__init__()
+        self.socket_path = socket_path
+        self.lock_path = lock_path or f"{socket_path}.lock"
+        self.retry_seconds = retry_seconds
+        self._lock_fd: Optional[int] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        # Leader side: follower stream -> the interest it last reported
+        self._followers: Dict[asyncio.StreamWriter, Dict[str, int]] = {}
+        # Follower side: the stream to the leader
+        self._upstream: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self.elections_won = 0
+
+    @property
+    def is_leader(self) -> bool:
+        return self._server is not None
+
+    def update_interest(self, tickers: Dict[str, int]) -> None:
+        super().update_interest(tickers)
+        if self._upstream is not None:
+            self._send(self._upstream, {"type": "interest", "tickers": self._local_interest})
+
+    def interest(self) -> Dict[str, int]:
+        tickers = dict(self._local_interest)
+        for follower_interest in self._followers.values():
+            for ticker, subscribers in follower_interest.items():
+                tickers[ticker] = tickers.get(ticker, 0) + subscribers
+        return tickers
+
+    def publish(self, message: Message) -> None:
+        if not self.is_leader:
+            logger.warning("Price bus publish ignored: this worker is not the leader")
+            return
+        self.published += 1
+        self._deliver(message)
+        line = _encode(message)
+        for writer in list(self._followers):
+            if writer.transport.get_write_buffer_size() > MAX_FOLLOWER_BUFFER_BYTES:
+                # A stuck worker must not make the leader buffer without bound
+                logger.warning("Price bus: dropping a follower that stopped reading")
+                self._followers.pop(writer, None)
+                writer.close()
+                continue
+            writer.write(line)
+
+    async def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "followers": len(self._followers), "elections_won": self.elections_won}
+
+    async def _run(self) -> None:
+        try:
+            while True:
+                try:
+                    if self._try_lock():
+                        await self._lead()
+                    else:
+                        await self._follow()
+                except OSError as e:
+                    # Includes a leader that is not listening yet or just exited
+                    logger.debug(f"Price bus connection failed: {str(e)}")
+                    await self._shutdown()
+                await asyncio.sleep(self.retry_seconds)
+        finally:
+            await self._shutdown()
+
+    def _try_lock(self) -> bool:
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    async def _lead(self) -> None:
+        # A previous leader that died leaves its socket file behind
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle_follower, path=self.socket_path)
+        self.elections_won += 1
+        logger.info(f"Price bus: this worker (pid {os.getpid()}) is now the price poller")
+        await asyncio.Event().wait()  # lead until stopped
+
+    async def _handle_follower(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._followers[writer] = {}
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if message.get("type") == "interest":
+                    self._followers[writer] = dict(message.get("tickers", {}))
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Price bus follower dropped: {str(e)}")
+        finally:
+            self._followers.pop(writer, None)
+            writer.close()
+
+    async def _follow(self) -> None:
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        self._upstream = writer
+        try:
+            self._send(writer, {"type": "interest", "tickers": self._local_interest})
+            while True:
+                line = await reader.readline()
+                if not line:
+                    logger.info("Price bus: leader went away")
+                    return
+                self._deliver(json.loads(line))
+        finally:
+            self._upstream = None
+            writer.close()
+
+    async def _shutdown(self) -> None:
+        if self._server is not None:
+            server, self._server = self._server, None
+            for writer in list(self._followers):
+                writer.close()
+            self._followers.clear()
+            server.close()
+            await server.wait_closed()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # releases the flock
+            self._lock_fd = None
+
+    @staticmethod
+    def _send(writer: asyncio.StreamWriter, message: Message) -> None:
+        writer.write(_encode(message))
+
+
+def _encode(message: Message) -> bytes:
+    return json.dumps(message).encode() + b"\n"
+
+
+def create_price_bus(name: str = settings.price_bus) -> PriceBus:
+    """Build the configured price bus."""
+    key = name.lower()
+    if key == "inprocess":
+        return InProcessPriceBus()
+    if key == "unix":
+        return UnixSocketPriceBus()
+    raise RuntimeError(f"Unknown PRICE_BUS '{name}' (expected 'inprocess' or 'unix')")
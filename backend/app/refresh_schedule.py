@@ -0,0 +1,192 @@
+"""Per-ticker refresh intervals for the WebSocket price poller."""
+import heapq
+import math
+import time
+from dataclasses import dataclass
+from datetime import datetime, time as dt_time, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from app.config import settings
+
+MARKET_TIMEZONE = ZoneInfo("America/New_York")
+MARKET_OPEN = dt_time(9, 30)
+MARKET_CLOSE = dt_time(16, 0)
+
+# Quiet tickers slow down by doubling, at most this many times
+MAX_QUIET_DOUBLINGS = 6
+
+
+def us_market_open(now: Optional[datetime] = None) -> bool:
+    """Whether US equity markets are in regular trading hours (holidays not included)."""
+    local = (now or datetime.now(timezone.utc)).astimezone(MARKET_TIMEZONE)
+    return local.weekday() < 5 and MARKET_OPEN <= local.time() < MARKET_CLOSE
+
+
+def always_open() -> bool:
+    return True
+
+
+@dataclass
+class TickerSchedule:
+    """Refresh state of one ticker."""
+    ticker: str
+    subscribers: int
+    interval: float
+    due: float
+    last_refresh: Optional[float] = None
+    last_change: Optional[float] = None
+    # Refreshes in a row that returned the same price
+    unchanged_streak: int = 0
+
+
+class RefreshSchedule:
+    """Due-time queue deciding which tickers the poller refreshes next.
+
+    Each ticker's interval starts at ``base_interval`` and
+
+    * shrinks with the number of subscribers (divided by ``1 + log2(n)``),
+    * doubles for every refresh in a row that found the price unchanged,
+    * is ``closed_interval`` outside US market hours,
+
+    clamped to ``[min_interval, max_interval]``. When the upstream quota
+    (``set_capacity``, in requests per second) cannot sustain the resulting
+    rate, every interval is stretched by the same factor. Polls more frequent
+    than ``cache_ttl`` are answered by the quote cache and cost no quota, so
+    only the rate above that counts against it.
+
+    Entries live in a heap keyed by due time; rescheduled tickers leave a
+    stale heap entry behind that is skipped when it surfaces.
+    """
+
+    def __init__(
+        self,
+        base_interval: float = settings.broadcast_interval_seconds,
+        min_interval: float = settings.broadcast_min_interval_seconds,
+        max_interval: float = settings.broadcast_max_interval_seconds,
+        closed_interval: float = settings.broadcast_closed_interval_seconds,
+        cache_ttl: float = settings.quote_cache_ttl_seconds,
+        market_open: Optional[Callable[[], bool]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.base_interval = base_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.closed_interval = closed_interval
+        self.cache_ttl = cache_ttl
+        if market_open is None:
+            market_open = us_market_open if settings.broadcast_follow_market_hours else always_open
+        self._market_open = market_open
+        self._clock = clock
+        self._entries: Dict[str, TickerSchedule] = {}
+        self._heap: List[Tuple[float, str]] = []
+        self.quota_factor = 1.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def sync(self, interest: Dict[str, int]) -> None:
+        """Track exactly the subscribed tickers; new ones are due immediately."""
+        now = self._clock()
+        for ticker in list(self._entries):
+            if ticker not in interest:
+                del self._entries[ticker]
+        market_open = self._market_open()
+        for ticker, subscribers in interest.items():
+            entry = self._entries.get(ticker)
+            if entry is None:
+                entry = TickerSchedule(ticker, subscribers, self.base_interval, now)
+                entry.interval = self._interval(entry, market_open)
+                self._entries[ticker] = entry
+                heapq.heappush(self._heap, (now, ticker))
+            elif entry.subscribers != subscribers:
+                entry.subscribers = subscribers
+                entry.interval = self._interval(entry, market_open)
+                # More watchers can pull the next refresh forward
+                if entry.last_refresh is not None and entry.last_refresh + entry.interval < entry.due:
+                    self._push(entry, entry.last_refresh + entry.interval)
+
+    def set_capacity(self, requests_per_second: Optional[float]) -> None:
+        """Stretch intervals so upstream requests stay within the quota (None = unmetered)."""
+        if requests_per_second is None or not self._entries:
+            self.quota_factor = 1.0
+            return
+        market_open = self._market_open()
+        demand = sum(
+            1 / max(self._unscaled_interval(entry, market_open), self.cache_ttl)
+            for entry in self._entries.values()
+        )
+        capacity = max(requests_per_second, 1e-9)
+        self.quota_factor = max(demand / capacity, 1.0)
+
+    def pop_due(self) -> List[str]:
+        """Remove and return the tickers whose refresh is due, earliest first."""
+        now = self._clock()
+        due: List[str] = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, ticker = heapq.heappop(self._heap)
+            entry = self._entries.get(ticker)
+            if entry is not None and entry.due == due_at:
+                due.append(ticker)
+        return due
+
+    def record(self, ticker: str, changed: Optional[bool]) -> None:
+        """Reschedule a refreshed ticker; ``changed`` is None when the refresh failed or was abandoned."""
+        entry = self._entries.get(ticker)
+        if entry is None:
+            return
+        now = self._clock()
+        entry.last_refresh = now
+        if changed:
+            entry.last_change = now
+            entry.unchanged_streak = 0
+        elif changed is not None:
+            entry.unchanged_streak += 1
+        entry.interval = self._interval(entry, self._market_open())
+        self._push(entry, now + entry.interval)
+
+    def seconds_until_due(self) -> Optional[float]:
+        """Time until the earliest scheduled refresh (None when nothing is scheduled)."""
+        while self._heap:
+            due_at, ticker = self._heap[0]
+            entry = self._entries.get(ticker)
+            if entry is not None and entry.due == due_at:
+                return max(due_at - self._clock(), 0.0)
+            heapq.heappop(self._heap)
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The schedule as plain data, earliest refresh first."""
+        now = self._clock()
+        tickers = [
+            {
+                "ticker": entry.ticker,
+                "subscribers": entry.subscribers,
+                "interval": round(entry.interval, 3),
+                "due_in": round(max(entry.due - now, 0.0), 3),
+                "unchanged_streak": entry.unchanged_streak,
+                "seconds_since_change": (
+                    None if entry.last_change is None else round(now - entry.last_change, 3)
+                ),
+            }
+            for entry in sorted(self._entries.values(), key=lambda entry: entry.due)
+        ]
+        return {"market_open": self._market_open(), "quota_factor": round(self.quota_factor, 3), "tickers": tickers}
+
+    def _push(self, entry: TickerSchedule, due: float) -> None:
+        entry.due = due
+        heapq.heappush(self._heap, (due, entry.ticker))
+
+    def _unscaled_interval(self, entry: TickerSchedule, market_open: bool) -> float:
+        if not market_open:
+            return self.closed_interval
+        interval = self.base_interval / (1 + math.log2(max(entry.subscribers, 1)))
+        interval *= 2 ** min(entry.unchanged_streak, MAX_QUIET_DOUBLINGS)
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def _interval(self, entry: TickerSchedule, market_open: bool) -> float:
+        interval = self._unscaled_interval(entry, market_open)
+        if self.quota_factor > 1.0:
+            # Only the polls that get past the quote cache use quota
+            interval = max(interval, self.cache_ttl) * self.quota_factor
+        return interval
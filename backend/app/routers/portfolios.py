@@ -99,22 +99,14 @@ def get_portfolio_analytics_route(
         # Verify portfolio belongs to user
         portfolio = get_portfolio(db, portfolio_id, current_user.id)
         
-        # Calculate analytics
-        analytics_service = PortfolioAnalyticsService(db)
-        
-        # Get portfolio value
-        value_data = analytics_service.get_portfolio_value(portfolio_id)
-        portfolio_value = PortfolioValue(**value_data)
-        
-        # Get stock positions
-        stock_positions_data = analytics_service.get_stock_positions(portfolio_id)
-        stock_positions = [StockPosition(**pos) for pos in stock_positions_data]
+        # Value and positions from one positions read and one price lookup
+        analytics = PortfolioAnalyticsService(db).get_portfolio_analytics(portfolio_id)
         
         return PortfolioAnalytics(
             portfolio_id=portfolio_id,
             portfolio_name=portfolio.name,
-            value=portfolio_value,
-            positions=stock_positions,
+            value=PortfolioValue(**analytics["value"]),
+            positions=[StockPosition(**position) for position in analytics["positions"]],
         )
     except HTTPException as e:
         raise e
@@ -133,10 +125,7 @@ def get_portfolio_value_route(
         # Verify portfolio belongs to user
         get_portfolio(db, portfolio_id, current_user.id)
         
-        # Calculate value
-        analytics_service = PortfolioAnalyticsService(db)
-        value_data = analytics_service.get_portfolio_value(portfolio_id)
-        
+        value_data = PortfolioAnalyticsService(db).get_portfolio_value(portfolio_id)
         return PortfolioValue(**value_data)
     except HTTPException as e:
         raise e
@@ -6,6 +6,7 @@ from app.dependencies import get_current_user
 from app.models.model import User
 from app.schemas import StockBase, Stock, StockUpdate
 from app.crud import create_stock, get_stock, update_stock, delete_stock, list_stocks
+from app.services.symbol_search_service import symbol_search
 from typing import List, cast
 router = APIRouter(prefix="/stocks", tags=["stocks"])
 
@@ -18,6 +19,7 @@ def create_stock_route(
     """Create a new stock (requires authentication)."""
     try:
         new_stock = create_stock(db, StockCreate(**stock.model_dump()))
+        symbol_search.load_stocks([new_stock])
         return cast(Stock, new_stock)
     except HTTPException as e:
         raise e
@@ -51,6 +53,7 @@ def update_stock_route(stock_id: int, stock: StockUpdate, db: Session = Depends(
     """Update a stock by its primary identifier."""
     try:
         updated_stock = update_stock(db, stock_id, stock)
+        symbol_search.load_stocks([updated_stock])
         return cast(Stock, updated_stock)
     except HTTPException as e:
         raise e
@@ -7,6 +7,8 @@ from app.models.model import User
 from app.schemas import TransactionBase, Transaction, TransactionUpdate, TransactionCreate
 from app.crud import create_transaction, get_transaction, update_transaction, delete_transaction, list_transactions
 from app.services.transaction_service import get_current_position
+from app.services.portfolio_service import PortfolioAnalytics as PortfolioAnalyticsService  # type: ignore
+from app.websocket_manager import manager
 from app.exceptions import BusinessLogicError
 from typing import List, cast
 
@@ -14,6 +16,20 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/transactions", tags=["transactions"])
 
+def _notify_portfolio_followers(db: Session, *portfolio_ids: int) -> None:
+    """Push changed holdings to WebSocket connections following these portfolios.
+
+    Runs after the change is committed, so a failure here is logged rather
+    than reported to the client as a failed request.
+    """
+    for portfolio_id in set(portfolio_ids):
+        try:
+            if manager.follows_portfolio(portfolio_id):
+                holdings = PortfolioAnalyticsService(db).get_portfolio_positions(portfolio_id)
+                manager.notify_portfolio_holdings(portfolio_id, holdings)
+        except Exception as e:
+            logger.error(f"Failed to notify followers of portfolio {portfolio_id}: {str(e)}", exc_info=True)
+
 @router.post("/", response_model=Transaction)
 def create_transaction_route(
     transaction: TransactionBase,
@@ -47,11 +63,12 @@ def create_transaction_route(
         
         transaction_create = TransactionCreate(**transaction.model_dump())
         created = create_transaction(db, transaction_create, current_user.id)
-        return cast(Transaction, created)
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    _notify_portfolio_followers(db, created.portfolio_id)
+    return cast(Transaction, created)
 
 @router.get("/{transaction_id}", response_model=Transaction)
 def get_transaction_route(
@@ -116,12 +133,14 @@ def update_transaction_route(
 ) -> Transaction:
     """Update a transaction by its primary identifier (must belong to authenticated user's portfolio)."""
     try:
+        previous_portfolio_id = cast(Transaction, get_transaction(db, transaction_id, current_user.id)).portfolio_id
         updated = update_transaction(db, transaction_id, transaction, current_user.id)
-        return cast(Transaction, updated)
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    _notify_portfolio_followers(db, previous_portfolio_id, updated.portfolio_id)
+    return cast(Transaction, updated)
 
 @router.delete("/{transaction_id}", response_model=Transaction)
 def delete_transaction_route(
@@ -131,10 +150,12 @@ def delete_transaction_route(
 ) -> Transaction:
     """Delete a transaction by its primary identifier (must belong to authenticated user's portfolio)."""
     try:
-        transaction = get_transaction(db, transaction_id, current_user.id)
+        transaction = cast(Transaction, get_transaction(db, transaction_id, current_user.id))
+        portfolio_id = transaction.portfolio_id
         delete_transaction(db, transaction_id, current_user.id)
-        return cast(Transaction, transaction)
     except HTTPException as e:
         raise e
     except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=str(e))
+    _notify_portfolio_followers(db, portfolio_id)
+    return transaction
\ No newline at end of file
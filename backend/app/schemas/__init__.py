@@ -4,6 +4,10 @@ from app.schemas.schemas import (
     StockCreate,
     StockUpdate,
     Stock,
+    BatchPriceRequest,
+    BatchPriceResult,
+    BatchPriceResponse,
+    PriceBar,
     # Portfolio schemas
     PortfolioBase,
     PortfolioCreate,
@@ -31,6 +35,10 @@ __all__ = [
     "StockCreate",
     "StockUpdate",
     "Stock",
+    "BatchPriceRequest",
+    "BatchPriceResult",
+    "BatchPriceResponse",
+    "PriceBar",
     # Portfolio schemas
     "PortfolioBase",
     "PortfolioCreate",
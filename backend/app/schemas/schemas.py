@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional
 from pydantic import BaseModel, Field
 
@@ -31,10 +31,45 @@ class Stock(StockBase):
         from_attributes = True
 
 
+class BatchPriceRequest(BaseModel):
+    """Request body for looking up many ticker prices at once."""
+    tickers: list[str] = Field(..., min_length=1)
+
+
+class BatchPriceResult(BaseModel):
+    """Price lookup outcome for one ticker - either a price or an error."""
+    price: Optional[float] = None
+    error: Optional[str] = None
+    error_code: Optional[str] = None
+
+
+class BatchPriceResponse(BaseModel):
+    """API response - per-ticker price results keyed by normalized ticker."""
+    prices: dict[str, BatchPriceResult]
+
+
+class PriceBar(BaseModel):
+    """API response - one stored daily OHLCV bar."""
+    ticker_symbol: str
+    trade_date: date
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: int
+
+    class Config:
+        from_attributes = True
+
+
 # ============== PORTFOLIO SCHEMAS ==============
+COST_BASIS_METHOD_PATTERN = "^(average|fifo|lifo|hifo|specific)$"
+
+
 class PortfolioBase(BaseModel):
     """Shared fields for all portfolio operations."""
     name: str = Field(..., min_length=1, max_length=100)
+    cost_basis_method: str = Field("average", pattern=COST_BASIS_METHOD_PATTERN)
 
 
 class PortfolioCreate(PortfolioBase):
@@ -46,6 +81,7 @@ class PortfolioUpdate(BaseModel):
     """For partial updates - all optional, doesn't inherit from Base."""
     name: Optional[str] = Field(None, min_length=1, max_length=100)
     user_id: Optional[int] = Field(None, gt=0)
+    cost_basis_method: Optional[str] = Field(None, pattern=COST_BASIS_METHOD_PATTERN)
 
 
 class Portfolio(PortfolioBase):
@@ -66,6 +102,8 @@ class TransactionBase(BaseModel):
     transaction_type: str = Field(..., pattern="^(buy|sell)$")
     quantity: float = Field(..., gt=0)
     price: float = Field(..., gt=0)
+    # Sells under the "specific" cost basis method: the buy transaction to sell from first
+    lot_id: Optional[int] = Field(None, gt=0)
 
 
 class TransactionCreate(TransactionBase):
@@ -80,6 +118,7 @@ class TransactionUpdate(BaseModel):
     transaction_type: Optional[str] = Field(None, pattern="^(buy|sell)$")
     quantity: Optional[float] = Field(None, gt=0)
     price: Optional[float] = Field(None, gt=0)
+    lot_id: Optional[int] = Field(None, gt=0)
 
 
 class Transaction(TransactionBase):
@@ -153,8 +192,9 @@ class PortfolioValue(BaseModel):
     """Portfolio value and performance metrics."""
     total_value: float
     total_cost: float
-    total_gain_loss: float
+    total_gain_loss: float  # unrealized, on the positions still held
     gain_loss_percentage: float
+    realized_gain_loss: float = 0.0  # from sells, under the portfolio's cost basis method
 
 
 class PortfolioAnalytics(BaseModel):
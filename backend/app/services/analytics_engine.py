@@ -0,0 +1,383 @@
+"""Vectorized portfolio analytics over columnar transaction arrays (requires NumPy).
+
+Transactions of any number of portfolios are loaded with one query into
+arrays of portfolio ids, ticker codes, signed quantities, prices and
+timestamps, and positions, cost basis, market value and gain/loss are
+computed with group-by operations instead of one Python update per
+transaction.
+
+Average cost is order-dependent, but only through sells: a buy adds
+``quantity * price`` to the cost basis and a sell scales it by
+``quantity after / quantity before`` (or resets it when the position is
+sold out). So the final cost basis is the sum, over the buys after the last
+reset, of each buy's cost times the product of the sell factors that follow
+it. The products are taken as differences of a cumulative sum of log
+factors, which keeps long histories from underflowing. Results match the
+sequential replay in ``position_service``.
+
+That closed form only holds for average cost. Portfolios on a lot-based
+``cost_basis_method`` are valued from their open lots instead (one query,
+summed per holding with the same group-by), which is the cost basis the
+positions table keeps for them. Realized gains of every method are read
+from the positions table.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from app.api_client.api_client import get_stock_api_client, Priority
+from app.models.model import Lot, Portfolio, Position, Transaction
+from app.portfolio_valuation import value_summary
+from app.services.position_service import history_query, replay_history
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+@dataclass
+class TransactionColumns:
+    """Transactions as parallel arrays, in the order they were recorded."""
+    portfolio_ids: np.ndarray  # int64
+    ticker_codes: np.ndarray  # int64 index into ``tickers``
+    tickers: List[str]  # upper-case, sorted
+    quantities: np.ndarray  # float64, positive for buys and negative for sells
+    prices: np.ndarray  # float64
+    timestamps: np.ndarray  # datetime64[us]
+
+    def __len__(self) -> int:
+        return len(self.portfolio_ids)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple], chunk_size: int = 50_000) -> "TransactionColumns":
+        """Build columns from ``(portfolio_id, ticker, type, quantity, price, executed_at)`` rows in order.
+
+        Rows are converted ``chunk_size`` at a time, so only one chunk of row
+        tuples is alive at once next to the growing arrays.
+        """
+        signs = {"buy": 1.0, "sell": -1.0}
+        chunks: List[tuple] = []
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            portfolio_ids, tickers, kinds, quantities, prices, timestamps = zip(*chunk)
+            chunks.append((
+                np.array(portfolio_ids, dtype=np.int64),
+                np.array([ticker.upper() for ticker in tickers], dtype=str),
+                np.array([signs.get(kind.lower(), 0.0) for kind in kinds]) * np.array(quantities, dtype=np.float64),
+                np.array(prices, dtype=np.float64),
+                # Converting datetime objects one by one in NumPy is several times slower
+                np.array([(t - _EPOCH) // _MICROSECOND for t in timestamps], dtype=np.int64).view("datetime64[us]"),
+            ))
+        if not chunks:
+            chunks.append((np.array([], dtype=np.int64), np.array([], dtype=str), np.array([], dtype=np.float64),
+                           np.array([], dtype=np.float64), np.array([], dtype="datetime64[us]")))
+        portfolio_ids, tickers, quantities, prices, timestamps = (np.concatenate(column) for column in zip(*chunks))
+        tickers, codes = np.unique(tickers, return_inverse=True)
+        return cls(
+            portfolio_ids=portfolio_ids,
+            ticker_codes=codes.astype(np.int64),
+            tickers=tickers.tolist(),
+            quantities=quantities,
+            prices=prices,
+            timestamps=timestamps,
+        )
+
+
+@dataclass
+class PositionColumns:
+    """Open positions as parallel arrays, one entry per (portfolio, ticker), sorted by both."""
+    portfolio_ids: np.ndarray
+    ticker_codes: np.ndarray
+    tickers: List[str]
+    quantities: np.ndarray
+    total_costs: np.ndarray
+    average_costs: np.ndarray
+
+    def to_dict(self) -> Dict[int, Dict[str, Dict[str, float]]]:
+        """Positions per portfolio in the shape of ``PortfolioAnalytics.get_portfolio_positions``."""
+        result: Dict[int, Dict[str, Dict[str, float]]] = {}
+        for portfolio_id, code, quantity, total_cost, average_cost in zip(
+            self.portfolio_ids.tolist(), self.ticker_codes.tolist(), self.quantities.tolist(),
+            self.total_costs.tolist(), self.average_costs.tolist(),
+        ):
+            result.setdefault(portfolio_id, {})[self.tickers[code]] = {
+                "quantity": quantity, "total_cost": total_cost, "average_cost": average_cost,
+            }
+        return result
+
+
+    @classmethod
+    def empty(cls, tickers: Optional[List[str]] = None) -> "PositionColumns":
+        none = np.array([], dtype=np.float64)
+        return cls(np.array([], dtype=np.int64), np.array([], dtype=np.int64), tickers or [], none, none, none)
+
+    @classmethod
+    def from_holdings(cls, rows: Iterable[tuple]) -> "PositionColumns":
+        """Sum ``(portfolio_id, ticker, quantity, price)`` holdings (e.g. open lots) into positions."""
+        rows = list(rows)
+        if not rows:
+            return cls.empty()
+        portfolio_ids, tickers, quantities, prices = zip(*rows)
+        tickers, codes = np.unique(np.array([ticker.upper() for ticker in tickers], dtype=str), return_inverse=True)
+        quantities = np.array(quantities, dtype=np.float64)
+        costs = quantities * np.array(prices, dtype=np.float64)
+        keys, group = np.unique(
+            np.stack([np.array(portfolio_ids, dtype=np.int64), codes.astype(np.int64)], axis=1), axis=0, return_inverse=True
+        )
+        group = group.reshape(-1)
+        total_quantities = np.bincount(group, weights=quantities, minlength=len(keys))
+        total_costs = np.bincount(group, weights=costs, minlength=len(keys))
+        open_positions = total_quantities > 0
+        total_quantities, total_costs = total_quantities[open_positions], total_costs[open_positions]
+        return cls(
+            portfolio_ids=keys[open_positions, 0],
+            ticker_codes=keys[open_positions, 1],
+            tickers=tickers.tolist(),
+            quantities=total_quantities,
+            total_costs=total_costs,
+            average_costs=total_costs / total_quantities,
+        )
+
+    @classmethod
+    def concat(cls, parts: List["PositionColumns"]) -> "PositionColumns":
+        """One set of columns over a shared ticker list (the parts cover different portfolios)."""
+        tickers = sorted({ticker for part in parts for ticker in part.tickers})
+        if not tickers:
+            return cls.empty()
+        index = {ticker: code for code, ticker in enumerate(tickers)}
+        codes = [
+            np.array([index[ticker] for ticker in part.tickers], dtype=np.int64)[part.ticker_codes]
+            if part.tickers else part.ticker_codes
+            for part in parts
+        ]
+        return cls(
+            portfolio_ids=np.concatenate([part.portfolio_ids for part in parts]),
+            ticker_codes=np.concatenate(codes),
+            tickers=tickers,
+            quantities=np.concatenate([part.quantities for part in parts]),
+            total_costs=np.concatenate([part.total_costs for part in parts]),
+            average_costs=np.concatenate([part.average_costs for part in parts]),
+        )
+
+
+def load_methods(db: Session, portfolio_ids: Iterable[int]) -> Dict[int, str]:
+    """Cost basis method of each portfolio."""
+    return dict(db.query(Portfolio.id, Portfolio.cost_basis_method).filter(Portfolio.id.in_(list(portfolio_ids))).all())
+
+
+def load_lot_positions(db: Session, portfolio_ids: Iterable[int]) -> PositionColumns:
+    """Positions of lot-based portfolios summed from their open lots."""
+    query = select(Lot.portfolio_id, Lot.ticker_symbol, Lot.quantity, Lot.price).where(
+        Lot.portfolio_id.in_(list(portfolio_ids)), Lot.quantity > 0
+    )
+    return PositionColumns.from_holdings(db.connection().execution_options(yield_per=10_000).execute(query))
+
+
+def replay_lot_positions(db: Session, methods: Dict[int, str], as_of: datetime) -> PositionColumns:
+    """Positions of lot-based portfolios as of a date; the lots table only holds the current ones."""
+    history = history_query(db).filter(
+        Transaction.portfolio_id.in_(list(methods)), Transaction.executed_at <= as_of
+    ).order_by(Transaction.id).yield_per(10_000)
+    positions, _ = replay_history(history, methods)
+    return PositionColumns.from_holdings(
+        (portfolio_id, ticker, position.quantity, position.average_cost)
+        for (portfolio_id, ticker), position in positions.items() if position.quantity > 0
+    )
+
+
+def load_transactions(db: Session, portfolio_ids: Optional[Iterable[int]] = None) -> TransactionColumns:
+    """Load the transactions of the given portfolios (default: all) with one column-only query."""
+    query = select(
+        Transaction.portfolio_id,
+        Transaction.ticker_symbol,
+        Transaction.transaction_type,
+        Transaction.quantity,
+        Transaction.price,
+        Transaction.executed_at,
+    ).order_by(Transaction.id)
+    if portfolio_ids is not None:
+        query = query.where(Transaction.portfolio_id.in_(list(portfolio_ids)))
+    # Core rows rather than ORM query rows: there is nothing to hydrate
+    result = db.connection().execution_options(yield_per=10_000).execute(query)
+    return TransactionColumns.from_rows(result)
+
+
+def compute_positions(columns: TransactionColumns, as_of: Optional[datetime] = None) -> PositionColumns:
+    """Average-cost positions of every (portfolio, ticker) in ``columns``; only open ones are returned.
+
+    With ``as_of`` only transactions executed at or before it are counted.
+    """
+    portfolio_ids, codes = columns.portfolio_ids, columns.ticker_codes
+    quantities, prices = columns.quantities, columns.prices
+    if as_of is not None:
+        keep = columns.timestamps <= np.datetime64(as_of, "us")
+        portfolio_ids, codes, quantities, prices = portfolio_ids[keep], codes[keep], quantities[keep], prices[keep]
+    if len(quantities) == 0:
+        return PositionColumns.empty(columns.tickers)
+
+    # Group rows by (portfolio, ticker), keeping recorded order inside each group
+    order = np.lexsort((np.arange(len(quantities)), codes, portfolio_ids))
+    portfolio_ids, codes, quantities, prices = portfolio_ids[order], codes[order], quantities[order], prices[order]
+    new_group = np.empty(len(quantities), dtype=bool)
+    new_group[0] = True
+    new_group[1:] = (portfolio_ids[1:] != portfolio_ids[:-1]) | (codes[1:] != codes[:-1])
+    starts = np.flatnonzero(new_group)
+    ends = np.append(starts[1:], len(quantities)) - 1
+    group = np.cumsum(new_group) - 1
+
+    # Running quantity after each transaction, within its group. One cumsum per
+    # group (a loop over holdings, not transactions) adds in the same order as
+    # the replay, so a position sold out lands on exactly zero; subtracting
+    # offsets from one global cumsum would leave rounding residue.
+    held_after = np.concatenate([np.cumsum(chunk) for chunk in np.split(quantities, starts[1:])])
+    held_before = np.empty_like(held_after)
+    held_before[1:] = held_after[:-1]
+    held_before[starts] = 0.0
+
+    buys = quantities > 0
+    sells = quantities < 0
+    resets = sells & (held_after <= 0)
+    scaling = sells & ~resets
+    log_factors = np.zeros(len(quantities))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        np.log(held_after / held_before, out=log_factors, where=scaling)
+    cumulative = np.cumsum(log_factors)
+
+    # Only buys after a group's last reset still carry cost
+    row = np.arange(len(quantities))
+    last_reset = np.maximum.reduceat(np.where(resets, row, -1), starts)
+    live_buys = buys & (row > last_reset[group])
+    buy_costs = np.where(live_buys, quantities * prices, 0.0)
+    carried = np.zeros(len(quantities))
+    np.exp(cumulative[ends][group] - cumulative, out=carried, where=live_buys)
+    total_costs = np.bincount(group, weights=buy_costs * carried, minlength=len(starts))
+
+    final_quantities = held_after[ends]
+    open_positions = final_quantities > 0
+    final_quantities = final_quantities[open_positions]
+    total_costs = total_costs[open_positions]
+    return PositionColumns(
+        portfolio_ids=portfolio_ids[starts][open_positions],
+        ticker_codes=codes[starts][open_positions],
+        tickers=columns.tickers,
+        quantities=final_quantities,
+        total_costs=total_costs,
+        average_costs=total_costs / final_quantities,
+    )
+
+
+def value_positions(
+    positions: PositionColumns,
+    prices: Dict[str, float],
+    realized: Optional[Dict[int, float]] = None
+) -> Dict[int, Dict[str, Any]]:
+    """Value and per-stock positions per portfolio, shaped like ``PortfolioAnalytics.get_portfolio_analytics``.
+
+    Tickers missing from ``prices`` are valued at their average cost. With
+    ``realized`` (gains per portfolio id) the values include realized gains.
+    """
+    ticker_prices = np.array([prices.get(ticker, np.nan) for ticker in positions.tickers], dtype=np.float64)
+    current_prices = ticker_prices[positions.ticker_codes]
+    current_prices = np.where(np.isnan(current_prices), positions.average_costs, current_prices)
+    current_values = positions.quantities * current_prices
+    gains = current_values - positions.total_costs
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gain_percentages = np.where(positions.total_costs > 0, gains / positions.total_costs * 100, 0.0)
+
+    portfolios, index = np.unique(positions.portfolio_ids, return_inverse=True)
+    total_values = np.bincount(index, weights=current_values, minlength=len(portfolios))
+    total_costs = np.bincount(index, weights=positions.total_costs, minlength=len(portfolios))
+
+    rounded = {
+        name: np.round(values, 2).tolist()
+        for name, values in (
+            ("quantity", positions.quantities), ("average_cost", positions.average_costs),
+            ("current_price", current_prices), ("current_value", current_values),
+            ("cost_basis", positions.total_costs), ("gain_loss", gains),
+            ("gain_loss_percentage", gain_percentages),
+        )
+    }
+    result: Dict[int, Dict[str, Any]] = {
+        int(portfolio_id): {
+            "value": value_summary(
+                float(value), float(cost), None if realized is None else realized.get(int(portfolio_id), 0.0)
+            ),
+            "positions": [],
+        }
+        for portfolio_id, value, cost in zip(portfolios, total_values, total_costs)
+    }
+    for i, (portfolio_id, code) in enumerate(zip(positions.portfolio_ids.tolist(), positions.ticker_codes.tolist())):
+        result[portfolio_id]["positions"].append(
+            {"ticker": positions.tickers[code], **{name: values[i] for name, values in rounded.items()}}
+        )
+    for analytics in result.values():
+        analytics["positions"].sort(key=lambda x: x["current_value"], reverse=True)
+    return result
+
+
+class PortfolioAnalyticsEngine:
+    """Analytics for many portfolios at once from one transaction query and one price lookup per ticker."""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.api_client = get_stock_api_client()
+
+    def positions(self, portfolio_ids: List[int], as_of: Optional[datetime] = None) -> PositionColumns:
+        """Open positions of the given portfolios, each on its own cost basis method."""
+        methods = load_methods(self.db, portfolio_ids)
+        average = [pid for pid in portfolio_ids if methods.get(pid, "average") == "average"]
+        lot_based = {pid: methods[pid] for pid in portfolio_ids if methods.get(pid, "average") != "average"}
+        parts = [compute_positions(load_transactions(self.db, average), as_of)] if average else []
+        if lot_based:
+            parts.append(
+                load_lot_positions(self.db, lot_based) if as_of is None
+                else replay_lot_positions(self.db, lot_based, as_of)
+            )
+        return PositionColumns.concat(parts)
+
+    def get_positions(
+        self, portfolio_ids: Iterable[int], as_of: Optional[datetime] = None
+    ) -> Dict[int, Dict[str, Dict[str, float]]]:
+        """Open positions per portfolio; portfolios without any are left out."""
+        return self.positions(list(portfolio_ids), as_of).to_dict()
+
+    def get_analytics(
+        self,
+        portfolio_ids: Iterable[int],
+        current_prices: Optional[Dict[str, float]] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        """``{"value", "positions"}`` per portfolio id, every requested portfolio included.
+
+        Each held ticker is priced once across all portfolios; fetched prices
+        are added to ``current_prices``.
+        """
+        portfolio_ids = list(portfolio_ids)
+        positions = self.positions(portfolio_ids)
+        if current_prices is None:
+            current_prices = {}
+        for code in np.unique(positions.ticker_codes).tolist():
+            ticker = positions.tickers[code]
+            if ticker in current_prices:
+                continue
+            try:
+                current_prices[ticker] = self.api_client.get_current_price(ticker, Priority.VALUATION)
+            except Exception:
+                # Valued at average cost, as PortfolioAnalytics does
+                pass
+        realized = dict(self.db.query(Position.portfolio_id, func.sum(Position.realized_gain)).filter(
+            Position.portfolio_id.in_(portfolio_ids)
+        ).group_by(Position.portfolio_id).all())
+        analytics = value_positions(positions, current_prices, realized)
+        return {
+            portfolio_id: analytics.get(
+                portfolio_id, {"value": value_summary(0.0, 0.0, realized.get(portfolio_id, 0.0)), "positions": []}
+            )
+            for portfolio_id in portfolio_ids
+        }
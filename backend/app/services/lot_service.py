@@ -0,0 +1,130 @@
+"""Lot-based cost basis: which earlier buys a sell is matched against.
+
+Under a lot-based method each buy opens a lot, and each sell consumes open
+lots of its ticker in the method's order:
+
+- ``fifo``: oldest first
+- ``lifo``: newest first
+- ``hifo``: highest price first (largest cost basis, smallest realized gain)
+- ``specific``: the lot the sell names (``Transaction.lot_id``) first, then oldest first
+
+A sell only touches the lots it consumes. ``LotBook`` keeps a ticker's
+open lots in a deque (a heap for ``hifo``) for replays, and ``open_lots``
+streams them from the lots table in the same order. Either way
+``consume_lots`` stops at the first lot it does not use up.
+"""
+import heapq
+from collections import deque
+from itertools import chain
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.model import Lot
+
+LOT_METHODS = ("fifo", "lifo", "hifo", "specific")
+COST_BASIS_METHODS = ("average",) + LOT_METHODS
+
+
+def consume_lots(lots: Iterable[Lot], quantity: float, price: float) -> Tuple[float, float, List[Lot]]:
+    """Sell ``quantity`` at ``price`` out of ``lots``, taken in the order given.
+
+    Returns the cost basis removed, the realized gain and the lots used up.
+    No lot is fetched once the quantity is covered; quantity left over when
+    the lots run out has no cost basis and realizes nothing.
+    """
+    cost = realized = 0.0
+    emptied: List[Lot] = []
+    if quantity <= 0:
+        return cost, realized, emptied
+    for lot in lots:
+        taken = min(lot.quantity, quantity)
+        lot.quantity -= taken
+        quantity -= taken
+        cost += taken * lot.price
+        realized += taken * (price - lot.price)
+        if lot.quantity <= 0:
+            emptied.append(lot)
+        if quantity <= 0:
+            break
+    return cost, realized, emptied
+
+
+class LotBook:
+    """Open lots of one portfolio's ticker, kept in the order ``method`` sells them."""
+
+    def __init__(self, method: str):
+        if method not in LOT_METHODS:
+            raise ValueError(f"Not a lot-based cost basis method: {method}")
+        self.method = method
+        self._lots: Deque[Lot] = deque()
+        self._heap: List[Tuple[float, int, Lot]] = []
+        self._by_transaction: Dict[int, Lot] = {}
+
+    def buy(self, lot: Lot) -> None:
+        if self.method == "hifo":
+            heapq.heappush(self._heap, (-lot.price, lot.transaction_id, lot))
+        else:
+            self._lots.append(lot)
+        if self.method == "specific":
+            self._by_transaction[lot.transaction_id] = lot
+
+    def sell(self, quantity: float, price: float, lot_id: Optional[int] = None) -> Tuple[float, float]:
+        """Consume lots for a sell; returns the cost basis removed and the realized gain."""
+        lots: Iterable[Lot] = self._in_order()
+        named = self._by_transaction.get(lot_id) if lot_id is not None else None
+        if named is not None:
+            lots = chain([named], lots)
+        cost, realized, emptied = consume_lots(lots, quantity, price)
+        for lot in emptied:
+            self._by_transaction.pop(lot.transaction_id, None)
+        return cost, realized
+
+    def clear(self) -> None:
+        self._lots.clear()
+        self._heap.clear()
+        self._by_transaction.clear()
+
+    def open_lots(self) -> List[Lot]:
+        lots = (entry[2] for entry in self._heap) if self.method == "hifo" else self._lots
+        return [lot for lot in lots if lot.quantity > 0]
+
+    def _in_order(self) -> Iterator[Lot]:
+        # Used-up lots are dropped when next reached, so a lot sold out of
+        # turn (specific identification) costs nothing until then
+        while self._heap if self.method == "hifo" else self._lots:
+            if self.method == "hifo":
+                lot = self._heap[0][2]
+            else:
+                lot = self._lots[-1] if self.method == "lifo" else self._lots[0]
+            if lot.quantity > 0:
+                yield lot
+                if lot.quantity > 0:
+                    return
+            if self.method == "hifo":
+                heapq.heappop(self._heap)
+            elif self.method == "lifo":
+                self._lots.pop()
+            else:
+                self._lots.popleft()
+
+
+def open_lots(db: Session, portfolio_id: int, ticker: str, method: str, lot_id: Optional[int] = None) -> Iterator[Lot]:
+    """Stream a ticker's open lots from the lots table in the order ``method`` sells them."""
+    query = db.query(Lot).filter(
+        Lot.portfolio_id == portfolio_id,
+        Lot.ticker_symbol == ticker,
+        Lot.quantity > 0
+    )
+    if method == "specific" and lot_id is not None:
+        named = query.filter(Lot.transaction_id == lot_id).first()
+        if named is not None:
+            yield named
+            query = query.filter(Lot.transaction_id != lot_id)
+    order = {
+        "fifo": (Lot.transaction_id,),
+        "specific": (Lot.transaction_id,),
+        "lifo": (Lot.transaction_id.desc(),),
+        "hifo": (Lot.price.desc(), Lot.transaction_id),
+    }[method]
+    yield from query.order_by(*order).yield_per(100)
@@ -0,0 +1,344 @@
+"""Service layer functions for the positions table, kept in step with transactions.
+
+Each portfolio holds one ``positions`` row per ticker with its quantity and
+average-cost basis. The transaction CRUD functions update it in the same
+database transaction as the change itself, so analytics read one row per
+holding instead of replaying the portfolio's whole history.
+
+A position's cost basis follows its portfolio's ``cost_basis_method``:
+average cost, or one of the lot-based methods in ``lot_service`` (the
+open lots are then kept in the ``lots`` table). Either way the position
+accumulates the gain realized by its sells.
+
+``aggregate_positions`` is a stateless alternative that computes the same
+average-cost positions straight from the transactions with one ``GROUP BY``.
+
+Rebuild the table from the transactions (e.g. after upgrading an existing
+database) with::
+
+    python -m app.services.position_service [--portfolio-id ID]
+"""
+import argparse
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from app.database.database import SessionLocal
+from app.models.model import Lot, Portfolio, Position, Transaction
+from app.services.lot_service import LotBook, consume_lots, open_lots
+
+logger = logging.getLogger(__name__)
+
+
+def apply_transaction(position: Position, transaction_type: str, quantity: float, price: float) -> None:
+    """Apply one buy or sell to a position using the average cost method.
+
+    A buy adds its cost and re-averages; a sell keeps the average cost and
+    scales the total cost to the remaining quantity, realizing the difference
+    to the sell price on the quantity held. A position sold down to zero (or
+    below) has its cost reset.
+    """
+    kind = transaction_type.lower()
+    if kind == "buy":
+        position.quantity += quantity
+        position.total_cost += quantity * price
+        if position.quantity > 0:
+            position.average_cost = position.total_cost / position.quantity
+    elif kind == "sell":
+        if position.quantity > 0:
+            position.realized_gain += min(quantity, position.quantity) * (price - position.average_cost)
+        position.quantity -= quantity
+        if position.quantity > 0:
+            position.total_cost = position.quantity * position.average_cost
+        else:
+            position.total_cost = 0.0
+            position.average_cost = 0.0
+
+
+def apply_lot_sale(position: Position, quantity: float, cost: float, realized: float) -> None:
+    """Apply a sell whose lots have been consumed (see ``lot_service.consume_lots``).
+
+    The total cost drops by the cost of the lots consumed. As with average
+    cost, a position sold down to zero (or below) has its cost reset; the
+    caller then drops any lots left.
+    """
+    position.quantity -= quantity
+    position.realized_gain += realized
+    if position.quantity > 0:
+        position.total_cost -= cost
+        position.average_cost = position.total_cost / position.quantity
+    else:
+        position.total_cost = 0.0
+        position.average_cost = 0.0
+
+
+def _new_position(portfolio_id: int, ticker: str) -> Position:
+    return Position(
+        portfolio_id=portfolio_id, ticker_symbol=ticker, quantity=0.0, total_cost=0.0, average_cost=0.0, realized_gain=0.0
+    )
+
+
+def cost_basis_method(db: Session, portfolio_id: int) -> str:
+    return db.query(Portfolio.cost_basis_method).filter(Portfolio.id == portfolio_id).scalar() or "average"
+
+
+def _get_position(db: Session, portfolio_id: int, ticker: str) -> Optional[Position]:
+    return db.query(Position).filter(
+        Position.portfolio_id == portfolio_id,
+        Position.ticker_symbol == ticker,
+    ).first()
+
+
+def record_transaction(db: Session, transaction: Transaction) -> Position:
+    """Apply a newly added transaction to its position; the caller commits both together.
+
+    Under a lot-based method a buy opens a lot and a sell reads and updates
+    only the lots it consumes.
+    """
+    ticker = transaction.ticker_symbol.upper()
+    position = _get_position(db, transaction.portfolio_id, ticker)
+    if position is None:
+        position = _new_position(transaction.portfolio_id, ticker)
+        db.add(position)
+    method = cost_basis_method(db, transaction.portfolio_id)
+    kind = transaction.transaction_type.lower()
+    if method == "average" or kind not in ("buy", "sell"):
+        apply_transaction(position, transaction.transaction_type, transaction.quantity, transaction.price)
+    elif kind == "buy":
+        db.flush()  # the lot refers to the transaction's id
+        db.add(Lot(
+            portfolio_id=transaction.portfolio_id, ticker_symbol=ticker, transaction_id=transaction.id,
+            quantity=transaction.quantity, price=transaction.price, acquired_at=transaction.executed_at,
+        ))
+        apply_transaction(position, kind, transaction.quantity, transaction.price)
+    else:
+        lots = open_lots(db, transaction.portfolio_id, ticker, method, transaction.lot_id)
+        cost, realized, emptied = consume_lots(lots, transaction.quantity, transaction.price)
+        for lot in emptied:
+            db.delete(lot)
+        apply_lot_sale(position, transaction.quantity, cost, realized)
+        if position.quantity <= 0:
+            db.query(Lot).filter(Lot.portfolio_id == transaction.portfolio_id, Lot.ticker_symbol == ticker).delete()
+    return position
+
+
+def rebuild_position(db: Session, portfolio_id: int, ticker: str) -> Optional[Position]:
+    """Recompute one position (and its lots) by replaying that ticker's transactions in order.
+
+    Used after a transaction is edited or deleted: with average cost the
+    result depends on the order of buys and sells, and with lots on which
+    lots earlier sells consumed, so only a replay is exact. Pending changes
+    must be flushed first. The row is deleted when no transactions are left.
+    """
+    ticker = ticker.upper()
+    rows = history_query(db).filter(
+        Transaction.portfolio_id == portfolio_id,
+        func.upper(Transaction.ticker_symbol) == ticker,
+    ).order_by(Transaction.id).all()
+    position = _get_position(db, portfolio_id, ticker)
+    db.query(Lot).filter(Lot.portfolio_id == portfolio_id, Lot.ticker_symbol == ticker).delete()
+    if not rows:
+        if position is not None:
+            db.delete(position)
+        return None
+    replayed, lots = replay_history(rows, {portfolio_id: cost_basis_method(db, portfolio_id)})
+    result = replayed[(portfolio_id, ticker)]
+    if position is None:
+        position = result
+        db.add(position)
+    else:
+        position.quantity, position.total_cost = result.quantity, result.total_cost
+        position.average_cost, position.realized_gain = result.average_cost, result.realized_gain
+    db.add_all(lots)
+    return position
+
+
+def _position_data(quantity: float, total_cost: float, average_cost: float) -> Dict[str, float]:
+    return {"quantity": quantity, "total_cost": total_cost, "average_cost": average_cost}
+
+
+def load_positions(db: Session, portfolio_id: int) -> Dict[str, Dict[str, float]]:
+    """A portfolio's open positions from the positions table, keyed by ticker."""
+    rows = db.query(
+        Position.ticker_symbol, Position.quantity, Position.total_cost, Position.average_cost
+    ).filter(
+        Position.portfolio_id == portfolio_id,
+        Position.quantity > 0
+    ).all()
+    return {ticker: _position_data(quantity, total_cost, average_cost) for ticker, quantity, total_cost, average_cost in rows}
+
+
+def aggregate_positions(db: Session, portfolio_id: int) -> Dict[str, Dict[str, float]]:
+    """A portfolio's open positions computed in SQL from its transactions, keyed by ticker.
+
+    One ``GROUP BY`` over plain columns sums bought quantity and cost and
+    sold quantity per ticker. While every buy of a ticker comes before its
+    first sell, average cost is exactly bought cost / bought quantity, so
+    those tickers need nothing else. A ticker bought again after a sell
+    re-averages against the cost left after that sell, which sums cannot
+    express; the query flags those tickers (last buy id > first sell id)
+    and only their rows are fetched and replayed.
+
+    Under a lot-based method the cost left depends on which lots each sell
+    consumed, so the portfolio's history is replayed with its lots instead.
+    """
+    method = cost_basis_method(db, portfolio_id)
+    if method != "average":
+        history = history_query(db).filter(Transaction.portfolio_id == portfolio_id).order_by(Transaction.id)
+        replayed, _ = replay_history(history, {portfolio_id: method})
+        return {
+            symbol: _position_data(position.quantity, position.total_cost, position.average_cost)
+            for (_, symbol), position in replayed.items() if position.quantity > 0
+        }
+    ticker = func.upper(Transaction.ticker_symbol)
+    kind = func.lower(Transaction.transaction_type)
+    is_buy, is_sell = kind == "buy", kind == "sell"
+    rows = db.query(
+        ticker,
+        func.sum(case((is_buy, Transaction.quantity), else_=0.0)),
+        func.sum(case((is_buy, Transaction.quantity * Transaction.price), else_=0.0)),
+        func.sum(case((is_sell, Transaction.quantity), else_=0.0)),
+        func.max(case((is_buy, Transaction.id))),
+        func.min(case((is_sell, Transaction.id))),
+    ).filter(
+        Transaction.portfolio_id == portfolio_id
+    ).group_by(ticker).all()
+
+    positions: Dict[str, Dict[str, float]] = {}
+    reordered = []
+    for symbol, bought, cost, sold, last_buy, first_sell in rows:
+        if last_buy is not None and first_sell is not None and last_buy > first_sell:
+            reordered.append(symbol)
+            continue
+        quantity = bought - sold
+        if quantity <= 0:
+            continue
+        average_cost = cost / bought
+        positions[symbol] = _position_data(quantity, cost if not sold else quantity * average_cost, average_cost)
+
+    if reordered:
+        history = db.query(
+            Transaction.portfolio_id,
+            Transaction.ticker_symbol,
+            Transaction.transaction_type,
+            Transaction.quantity,
+            Transaction.price,
+        ).filter(
+            Transaction.portfolio_id == portfolio_id,
+            ticker.in_(reordered)
+        ).order_by(Transaction.id)
+        for (_, symbol), position in replay_positions(history).items():
+            if position.quantity > 0:
+                positions[symbol] = _position_data(position.quantity, position.total_cost, position.average_cost)
+    return positions
+
+
+def replay_positions(rows: Iterable[Tuple[int, str, str, float, float]]) -> Dict[Tuple[int, str], Position]:
+    """Build positions from ``(portfolio_id, ticker, type, quantity, price)`` rows given in transaction order."""
+    positions: Dict[Tuple[int, str], Position] = {}
+    for portfolio_id, ticker, transaction_type, quantity, price in rows:
+        key = (portfolio_id, ticker.upper())
+        position = positions.get(key)
+        if position is None:
+            position = positions[key] = _new_position(*key)
+        apply_transaction(position, transaction_type, quantity, price)
+    return positions
+
+
+def history_query(db: Session):
+    """Transaction columns ``replay_history`` takes, one row per transaction."""
+    return db.query(
+        Transaction.id,
+        Transaction.portfolio_id,
+        Transaction.ticker_symbol,
+        Transaction.transaction_type,
+        Transaction.quantity,
+        Transaction.price,
+        Transaction.executed_at,
+        Transaction.lot_id,
+    )
+
+
+def replay_history(rows: Iterable[tuple], methods: Dict[int, str]) -> Tuple[Dict[Tuple[int, str], Position], List[Lot]]:
+    """Build positions and open lots from ``history_query`` rows given in transaction order.
+
+    ``methods`` maps portfolio ids to their cost basis method (default: average).
+    """
+    positions: Dict[Tuple[int, str], Position] = {}
+    books: Dict[Tuple[int, str], LotBook] = {}
+    for transaction_id, portfolio_id, ticker, transaction_type, quantity, price, executed_at, lot_id in rows:
+        key = (portfolio_id, ticker.upper())
+        position = positions.get(key)
+        if position is None:
+            position = positions[key] = _new_position(*key)
+        method = methods.get(portfolio_id, "average")
+        kind = transaction_type.lower()
+        if method == "average" or kind not in ("buy", "sell"):
+            apply_transaction(position, transaction_type, quantity, price)
+            continue
+        book = books.get(key)
+        if book is None:
+            book = books[key] = LotBook(method)
+        if kind == "buy":
+            book.buy(Lot(
+                portfolio_id=portfolio_id, ticker_symbol=key[1], transaction_id=transaction_id,
+                quantity=quantity, price=price, acquired_at=executed_at,
+            ))
+            apply_transaction(position, kind, quantity, price)
+        else:
+            cost, realized = book.sell(quantity, price, lot_id)
+            apply_lot_sale(position, quantity, cost, realized)
+            if position.quantity <= 0:
+                book.clear()
+    return positions, [lot for book in books.values() for lot in book.open_lots()]
+
+
+def rebuild_positions(db: Session, portfolio_id: Optional[int] = None) -> int:
+    """Replace the positions and lots of one portfolio (default: all) with a replay of their transactions.
+
+    Returns how many positions were written; the caller commits.
+    """
+    stale = db.query(Position)
+    stale_lots = db.query(Lot)
+    methods = db.query(Portfolio.id, Portfolio.cost_basis_method)
+    transactions = history_query(db)
+    if portfolio_id is not None:
+        stale = stale.filter(Position.portfolio_id == portfolio_id)
+        stale_lots = stale_lots.filter(Lot.portfolio_id == portfolio_id)
+        methods = methods.filter(Portfolio.id == portfolio_id)
+        transactions = transactions.filter(Transaction.portfolio_id == portfolio_id)
+    stale_lots.delete()
+    stale.delete()
+    positions, lots = replay_history(transactions.order_by(Transaction.id).yield_per(1000), dict(methods.all()))
+    db.add_all(positions.values())
+    db.add_all(lots)
+    db.flush()
+    logger.info(f"Rebuilt {len(positions)} positions" + (f" for portfolio {portfolio_id}" if portfolio_id is not None else ""))
+    return len(positions)
+
+
+def backfill_positions(db: Session) -> int:
+    """Rebuild positions and lots when the table is empty but transactions exist.
+
+    Covers databases where ``create_all`` added the positions and lots tables
+    without the migration backfills. Returns how many positions were written;
+    the caller commits.
+    """
+    if db.query(Position.id).first() is not None or db.query(Transaction.id).first() is None:
+        return 0
+    return rebuild_positions(db)
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the positions table from transaction history.")
+    parser.add_argument("--portfolio-id", type=int, help="only rebuild this portfolio")
+    args = parser.parse_args(argv)
+    with SessionLocal() as db:
+        count = rebuild_positions(db, args.portfolio_id)
+        db.commit()
+    print(f"Rebuilt {count} positions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Service layer functions for locally stored daily price history."""
+import logging
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from app.api_client.api_client import get_stock_api_client, Priority
+from app.database.database import SessionLocal
+from app.exceptions import ExternalServiceError
+from app.models.model import PriceBar
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT statement, keeping well under SQLite's bound-parameter limit
+UPSERT_CHUNK_SIZE = 500
+# "compact" responses cover the latest 100 trading days (~140 calendar days)
+COMPACT_WINDOW_DAYS = 140
+BAR_FIELDS = ("open", "high", "low", "close", "volume")
+
+
+def parse_daily_bars(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Convert an Alpha Vantage TIME_SERIES_DAILY payload into bar rows (oldest first)."""
+    series = payload.get("Time Series (Daily)", {})
+    bars = []
+    for day, values in series.items():
+        try:
+            bars.append({
+                "trade_date": date.fromisoformat(day),
+                "open": float(values["1. open"]),
+                "high": float(values["2. high"]),
+                "low": float(values["3. low"]),
+                "close": float(values["4. close"]),
+                "volume": int(float(values["5. volume"])),
+            })
+        except (KeyError, ValueError) as exc:
+            logger.warning(f"Skipping malformed daily bar {day}: {exc}")
+    bars.sort(key=lambda bar: bar["trade_date"])
+    return bars
+
+
+def latest_bar_date(db: Session, ticker: str) -> Optional[date]:
+    """Return the most recent stored bar date for a ticker, if any."""
+    return db.query(func.max(PriceBar.trade_date)).filter(
+        PriceBar.ticker_symbol == ticker.upper()
+    ).scalar()
+
+
+def store_daily_series(db: Session, ticker: str, payload: Dict[str, Any]) -> int:
+    """
+    Upsert the bars of a downloaded daily series and return how many were written.
+
+    Only bars on or after the newest stored date are written: older bars are
+    already stored, and the newest one is rewritten in case it was captured
+    intraday.
+    """
+    ticker = ticker.upper()
+    latest = latest_bar_date(db, ticker)
+    rows = [
+        {"ticker_symbol": ticker, **bar}
+        for bar in parse_daily_bars(payload)
+        if latest is None or bar["trade_date"] >= latest
+    ]
+    if not rows:
+        return 0
+    try:
+        for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            _upsert_bars(db, rows[start:start + UPSERT_CHUNK_SIZE])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    logger.debug(f"Stored {len(rows)} daily bars for {ticker}")
+    return len(rows)
+
+
+def _upsert_bars(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Insert bars, updating OHLCV on (ticker, date) conflicts."""
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+        stmt = insert(PriceBar).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["ticker_symbol", "trade_date"],
+            set_={field: stmt.excluded[field] for field in BAR_FIELDS},
+        )
+        db.execute(stmt)
+        return
+
+    # Portable fallback: look up existing rows, then update or add
+    existing = {
+        bar.trade_date: bar
+        for bar in db.query(PriceBar).filter(
+            PriceBar.ticker_symbol == rows[0]["ticker_symbol"],
+            PriceBar.trade_date.in_([row["trade_date"] for row in rows]),
+        )
+    }
+    for row in rows:
+        bar = existing.get(row["trade_date"])
+        if bar is None:
+            db.add(PriceBar(**row))
+        else:
+            for field in BAR_FIELDS:
+                setattr(bar, field, row[field])
+
+
+def persist_daily_series(ticker: str, payload: Dict[str, Any]) -> None:
+    """StockAPIClient series listener: store each daily series the client downloads.
+
+    ``PriceHistoryService.refresh`` stores its own downloads and skips the
+    listeners, so each series is written once.
+    """
+    db = SessionLocal()
+    try:
+        store_daily_series(db, ticker, payload)
+    finally:
+        db.close()
+
+
+def previous_trading_day(today: date) -> date:
+    """Most recent weekday before ``today`` (exchange holidays are not modelled)."""
+    day = today - timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return day
+
+
+class PriceHistoryService:
+    """Serve daily price history from the local price_bars table."""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.api_client = get_stock_api_client()
+
+    def refresh(self, ticker: str, priority: Priority = Priority.INTERACTIVE) -> int:
+        """
+        Incrementally download new bars for a ticker and return how many were written.
+
+        A ticker seen for the first time (or whose history is older than the
+        compact window) gets a full download; otherwise only the compact series
+        is requested.
+        """
+        latest = latest_bar_date(self.db, ticker)
+        if latest is None or latest < date.today() - timedelta(days=COMPACT_WINDOW_DAYS):
+            outputsize = "full"
+        else:
+            outputsize = "compact"
+        payload = self.api_client.fetch_stock_data(ticker.upper(), priority, outputsize=outputsize, notify=False)
+        return store_daily_series(self.db, ticker, payload)
+
+    def is_stale(self, ticker: str, today: Optional[date] = None) -> bool:
+        """True when the newest stored bar is older than the previous trading day."""
+        latest = latest_bar_date(self.db, ticker)
+        return latest is None or latest < previous_trading_day(today or date.today())
+
+    def get_history(
+        self,
+        ticker: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        refresh: bool = True,
+    ) -> List[PriceBar]:
+        """
+        Return stored daily bars for a ticker in date order.
+
+        When ``refresh`` is set and the stored history is stale, new bars are
+        downloaded first; if that fails, whatever is stored is returned (or the
+        error is raised when nothing is stored yet).
+        """
+        ticker = ticker.upper()
+        if refresh and self.is_stale(ticker):
+            try:
+                self.refresh(ticker)
+            except ExternalServiceError as exc:
+                if latest_bar_date(self.db, ticker) is None:
+                    raise
+                logger.warning(f"Serving stored history for {ticker}; refresh failed: {exc.detail}")
+
+        query = self.db.query(PriceBar).filter(PriceBar.ticker_symbol == ticker)
+        if start is not None:
+            query = query.filter(PriceBar.trade_date >= start)
+        if end is not None:
+            query = query.filter(PriceBar.trade_date <= end)
+        return query.order_by(PriceBar.trade_date).all()
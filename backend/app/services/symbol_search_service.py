@@ -0,0 +1,212 @@
+"""Service layer functions for symbol autocomplete served from an in-memory index."""
+import bisect
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from app.api_client.api_client import get_stock_api_client
+from app.config import settings
+from app.exceptions import ExternalServiceError
+from app.models.model import Stock
+
+logger = logging.getLogger(__name__)
+
+# Scores for the different ways a query can match an entry
+EXACT_SYMBOL_SCORE = 1.0
+SYMBOL_PREFIX_SCORE = 0.9
+NAME_PREFIX_SCORE = 0.8
+WORD_PREFIX_SCORE = 0.7
+FUZZY_SCORE_WEIGHT = 0.6
+# Matches at or above this score count towards the "enough local results" check
+GOOD_MATCH_SCORE = 0.7
+MIN_FUZZY_SIMILARITY = 0.5
+MAX_PREFIX_SCAN = 200
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def stock_to_match(stock: Stock) -> Dict[str, str]:
+    """Represent a stored stock in Alpha Vantage's bestMatches format."""
+    return {
+        "1. symbol": stock.ticker_symbol.upper(),
+        "2. name": stock.company_name,
+        "3. type": "Equity",
+        "4. region": "",
+        "8. currency": "",
+    }
+
+
+class SymbolIndex:
+    """
+    In-memory index over ticker symbols and company names.
+
+    Prefix lookups use a sorted key list searched with ``bisect`` (ticker,
+    full name and each name word are keys); fuzzy lookups use a trigram
+    inverted index scored by the share of the query's trigrams an entry
+    contains, so a short misspelled query still matches a long name. Entries are stored in
+    Alpha Vantage's bestMatches shape so results can be returned as-is.
+    """
+
+    def __init__(self, max_entries: int = settings.symbol_index_max_entries) -> None:
+        self.max_entries = max_entries
+        self._entries: Dict[str, Dict[str, str]] = {}
+        self._keys: List[Tuple[str, str, float]] = []  # (key, symbol, score), sorted
+        self._entry_trigrams: Dict[str, Set[str]] = {}
+        self._trigram_index: Dict[str, Set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, match: Dict[str, Any]) -> None:
+        """Add or replace one entry given in bestMatches format."""
+        symbol = str(match.get("1. symbol", "")).strip().upper()
+        if not symbol:
+            return
+        name = str(match.get("2. name", "")).strip()
+        entry = {key: str(value) for key, value in match.items() if key != "9. matchScore"}
+        entry["1. symbol"] = symbol
+        with self._lock:
+            if self._entries.get(symbol) == entry:
+                return
+            if symbol in self._entries:
+                self._remove(symbol)
+            elif len(self._entries) >= self.max_entries:
+                return
+            self._entries[symbol] = entry
+            keys = {(symbol.lower(), SYMBOL_PREFIX_SCORE)}
+            if name:
+                keys.add((name.lower(), NAME_PREFIX_SCORE))
+                keys.update((word, WORD_PREFIX_SCORE) for word in name.lower().split()[1:] if len(word) > 1)
+            for key, score in keys:
+                bisect.insort(self._keys, (key, symbol, score))
+            trigrams = _trigrams(symbol.lower()) | _trigrams(name.lower())
+            self._entry_trigrams[symbol] = trigrams
+            for trigram in trigrams:
+                self._trigram_index[trigram].add(symbol)
+
+    def add_many(self, matches: Iterable[Dict[str, Any]]) -> None:
+        for match in matches:
+            self.add(match)
+
+    def search(self, query: str, limit: int = settings.symbol_search_max_results) -> List[Tuple[float, Dict[str, str]]]:
+        """Return up to ``limit`` ``(score, match)`` pairs, best first."""
+        q = query.strip().lower()
+        if not q:
+            return []
+        scores: Dict[str, float] = {}
+        with self._lock:
+            if q.upper() in self._entries:
+                scores[q.upper()] = EXACT_SYMBOL_SCORE
+
+            position = bisect.bisect_left(self._keys, (q,))
+            for key, symbol, score in self._keys[position:position + MAX_PREFIX_SCAN]:
+                if not key.startswith(q):
+                    break
+                scores[symbol] = max(scores.get(symbol, 0.0), score)
+
+            if len(scores) < limit and len(q) >= 3:
+                query_trigrams = _trigrams(q)
+                shared: Dict[str, int] = defaultdict(int)
+                for trigram in query_trigrams:
+                    for symbol in self._trigram_index.get(trigram, ()):
+                        shared[symbol] += 1
+                for symbol, count in shared.items():
+                    similarity = count / len(query_trigrams)
+                    if similarity >= MIN_FUZZY_SIMILARITY:
+                        scores[symbol] = max(scores.get(symbol, 0.0), similarity * FUZZY_SCORE_WEIGHT)
+
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], len(item[0]), item[0]))[:limit]
+            return [(score, dict(self._entries[symbol])) for symbol, score in ranked]
+
+    def _remove(self, symbol: str) -> None:
+        """Drop an entry's keys and trigrams (lock held)."""
+        self._keys = [item for item in self._keys if item[1] != symbol]
+        for trigram in self._entry_trigrams.pop(symbol, set()):
+            self._trigram_index[trigram].discard(symbol)
+        del self._entries[symbol]
+
+
+class SymbolSearchService:
+    """Answer symbol searches locally, falling back to Alpha Vantage when needed."""
+
+    def __init__(
+        self,
+        index: SymbolIndex,
+        min_local_matches: int = settings.symbol_search_min_local_matches,
+        max_results: int = settings.symbol_search_max_results,
+    ) -> None:
+        self.index = index
+        self.min_local_matches = min_local_matches
+        self.max_results = max_results
+        # Queries already sent upstream; their results are in the index now
+        self._searched_upstream: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.local_answers = 0
+        self.upstream_searches = 0
+
+    def load_stocks(self, stocks: Iterable[Stock]) -> None:
+        """Seed the index from the stocks table."""
+        self.index.add_many(stock_to_match(stock) for stock in stocks)
+
+    def learn(self, matches: Iterable[Dict[str, Any]]) -> None:
+        """Add matches returned by the upstream provider to the index."""
+        self.index.add_many(matches)
+
+    async def search_async(self, query: str) -> List[Dict[str, str]]:
+        """
+        Return bestMatches-style results for a query.
+
+        The local index answers when it has at least ``min_local_matches`` good
+        matches (or an exact ticker match), or when the same query was already
+        searched upstream. Otherwise Alpha Vantage is asked once and its
+        results are learned; on upstream failure local results are returned
+        if there are any.
+        """
+        normalized = query.strip().lower()
+        local = self.index.search(normalized, self.max_results)
+        good = [match for score, match in local if score >= GOOD_MATCH_SCORE]
+        exact = bool(local) and local[0][0] >= EXACT_SYMBOL_SCORE
+        with self._lock:
+            already_searched = normalized in self._searched_upstream
+        if not normalized or exact or len(good) >= self.min_local_matches or already_searched:
+            self.local_answers += 1
+            return [match for _, match in local]
+
+        try:
+            upstream = await get_stock_api_client().search_stocks_async(query)
+        except ExternalServiceError as exc:
+            if local:
+                logger.warning(f"Symbol search upstream failed for '{query}', serving local results: {exc.detail}")
+                return [match for _, match in local]
+            raise
+        self.upstream_searches += 1
+        self.learn(upstream)
+        self._remember_query(normalized)
+
+        results = [dict(match) for match in upstream]
+        seen = {match.get("1. symbol", "").upper() for match in results}
+        results.extend(match for _, match in local if match["1. symbol"] not in seen)
+        return results[:self.max_results]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self.index),
+            "local_answers": self.local_answers,
+            "upstream_searches": self.upstream_searches,
+        }
+
+    def _remember_query(self, normalized: str) -> None:
+        with self._lock:
+            self._searched_upstream[normalized] = None
+            self._searched_upstream.move_to_end(normalized)
+            while len(self._searched_upstream) > settings.symbol_index_max_entries:
+                self._searched_upstream.popitem(last=False)
+
+
+# Process-wide search service, seeded from the stocks table at startup
+symbol_search = SymbolSearchService(SymbolIndex())
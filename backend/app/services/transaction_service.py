@@ -1,14 +1,13 @@
 """Service layer functions for transaction-related business logic."""
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.models.model import Transaction
+from app.models.model import Position
 
 
 def get_current_position(portfolio_id: int, ticker: str, db: Session) -> int:
     """
-    Calculate the current position (net quantity) for a given portfolio and ticker.
+    Return the current position (net quantity) for a given portfolio and ticker.
     
-    Sums all BUY transaction quantities and subtracts all SELL transaction quantities.
+    Reads the maintained positions row instead of summing the transaction history.
     
     Args:
         portfolio_id: The portfolio ID to query
@@ -21,20 +20,8 @@ def get_current_position(portfolio_id: int, ticker: str, db: Session) -> int:
     # Normalize ticker to uppercase for consistency
     ticker_upper = ticker.upper()
     
-    # Sum all BUY transactions
-    buy_total = db.query(func.sum(Transaction.quantity)).filter(
-        Transaction.portfolio_id == portfolio_id,
-        Transaction.ticker_symbol == ticker_upper,
-        Transaction.transaction_type == "buy"
+    quantity = db.query(Position.quantity).filter(
+        Position.portfolio_id == portfolio_id,
+        Position.ticker_symbol == ticker_upper
     ).scalar() or 0.0
-    
-    # Sum all SELL transactions
-    sell_total = db.query(func.sum(Transaction.quantity)).filter(
-        Transaction.portfolio_id == portfolio_id,
-        Transaction.ticker_symbol == ticker_upper,
-        Transaction.transaction_type == "sell"
-    ).scalar() or 0.0
-    
-    # Calculate net position and convert to integer
-    net_position = buy_total - sell_total
-    return int(net_position)
+    return int(quantity)
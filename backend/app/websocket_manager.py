@@ -1,140 +1,927 @@
 import asyncio
+import heapq
+import itertools
 import json
 import logging
-from typing import Dict, Set
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, FrozenSet, Hashable, List, Optional, Set, Tuple, Union
 from fastapi import WebSocket, WebSocketDisconnect
-from app.api_client.api_client import StockAPIClient
+from app.api_client.api_client import StockAPIClient, Priority, get_stock_api_client
+from app.config import settings
+from app.price_bus import InProcessPriceBus, Message, PriceBus, create_price_bus
+from app import wire_format
+from app.portfolio_valuation import PortfolioValuations
+from app.refresh_schedule import RefreshSchedule
 
 logger = logging.getLogger(__name__)
 
+# Close codes for connections the server drops
+CLOSE_SLOW_CONSUMER = 1013  # "try again later"
+CLOSE_HEARTBEAT_TIMEOUT = 1001  # "going away"
+
+_connection_ids = itertools.count(1)
+
+
+class LoopLagMonitor:
+    """Measure how long the event loop is blocked.
+
+    A sampler task sleeps ``interval`` seconds at a time; any delay beyond that
+    before it wakes up (above ``threshold``) is time the loop spent running
+    code that did not yield.
+    """
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.005):
+        self.interval = interval
+        self.threshold = threshold
+        self._blocked = 0.0
+        # When the sampler should wake, and how far its current overshoot was already counted
+        self._expected_wake: Optional[float] = None
+        self._counted_until = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._sample())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._expected_wake = None
+
+    def take_blocked_seconds(self) -> float:
+        """Return the blocked time accumulated since the last call and reset it.
+
+        Includes the overshoot of a sampler wake-up that is overdue right now,
+        so a block that just ended is counted even if the sampler has not run yet.
+        """
+        if self._expected_wake is not None:
+            self._add_lag(asyncio.get_running_loop().time())
+        blocked, self._blocked = self._blocked, 0.0
+        return blocked
+
+    def _add_lag(self, now: float):
+        if self._expected_wake is None or now - self._expected_wake <= self.threshold:
+            return
+        self._blocked += now - max(self._expected_wake, self._counted_until)
+        self._counted_until = now
+
+    async def _sample(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._expected_wake = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self._add_lag(loop.time())
+
+
+class ClientConnection:
+    """The outbound side of one WebSocket: a bounded queue drained by its own writer task.
+
+    ``enqueue`` never waits on the socket. Frames sent with a ``key`` (e.g. one
+    ticker's price) replace a still-queued frame with the same key, so a client
+    that falls behind gets the latest price per ticker rather than a backlog.
+    No other frame is ever dropped: snapshots, ticker-ID frames and the like
+    are state the client cannot do without, so a frame that finds the queue
+    full evicts the client instead. So does a queue that has not moved for
+    ``slow_consumer_seconds`` (or a single send that takes that long):
+    ``on_evict`` is called and the socket is closed.
+
+    Traffic in both directions is counted; ``last_activity`` is the last time
+    the client sent anything, which is what heartbeat reaping looks at.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        on_evict: Callable[[WebSocket], None],
+        max_queue: int = settings.ws_send_queue_size,
+        slow_consumer_seconds: float = settings.ws_slow_consumer_seconds,
+        clock: Callable[[], float] = time.monotonic,
+        encoding: str = wire_format.JSON,
+    ):
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.slow_consumer_seconds = slow_consumer_seconds
+        self._on_evict = on_evict
+        self._clock = clock
+        self._pending: "OrderedDict[Hashable, Union[str, bytes]]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self._next_id = 0
+        # Last time the writer made progress (or the queue became non-empty)
+        self._last_progress = clock()
+        # Opt-in: one price_batch frame per refresh cycle instead of one frame per ticker
+        self.batch = False
+        # Binary sessions get price frames keyed by per-session ticker IDs
+        self.encoding = encoding
+        self.ticker_ids: Dict[str, int] = {}
+        # Tickers subscribed by name, and portfolios whose holdings are followed
+        self.explicit_tickers: Set[str] = set()
+        self.portfolios: Set[int] = set()
+        self.id = next(_connection_ids)
+        self.connected_at = clock()
+        self.last_activity = self.connected_at
+        self.received = 0
+        self.bytes_received = 0
+        self.sent = 0
+        self.bytes_sent = 0
+        self.coalesced = 0
+        self.closed = False
+        self._writer = asyncio.get_running_loop().create_task(self._write_loop())
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    @property
+    def binary(self) -> bool:
+        return self.encoding == wire_format.BINARY
+
+    def idle_seconds(self) -> float:
+        """Seconds since the client last sent a message."""
+        return self._clock() - self.last_activity
+
+    def record_received(self, data: Union[str, bytes]):
+        """Count a message from the client and mark it as alive."""
+        self.received += 1
+        self.bytes_received += len(data)
+        self.last_activity = self._clock()
+
+    def stats(self) -> Dict[str, Any]:
+        now = self._clock()
+        return {
+            "id": self.id,
+            "encoding": self.encoding,
+            "batch": self.batch,
+            "connected_seconds": round(now - self.connected_at, 3),
+            "idle_seconds": round(now - self.last_activity, 3),
+            "messages_in": self.received,
+            "bytes_in": self.bytes_received,
+            "messages_out": self.sent,
+            "bytes_out": self.bytes_sent,
+            "queue_depth": self.queue_depth,
+            "coalesced": self.coalesced,
+        }
+
+    def assign_ticker_id(self, ticker: str) -> Optional[int]:
+        """Give a ticker this session's next ID; returns None if it already has one."""
+        if ticker in self.ticker_ids:
+            return None
+        ticker_id = len(self.ticker_ids) + 1
+        if ticker_id > wire_format.MAX_TICKER_ID:
+            raise ValueError("Too many tickers for one binary session")
+        self.ticker_ids[ticker] = ticker_id
+        return ticker_id
+
+    def enqueue(self, message: Union[str, bytes], key: Optional[Hashable] = None) -> bool:
+        """Queue a frame without waiting; returns False if the connection is gone."""
+        if self.closed:
+            return False
+        if self._pending and self._clock() - self._last_progress > self.slow_consumer_seconds:
+            self.evict("send queue stalled")
+            return False
+        if key is not None and key in self._pending:
+            self._pending[key] = message
+            self.coalesced += 1
+            return True
+        if len(self._pending) >= self.max_queue:
+            self.evict("send queue full")
+            return False
+        if key is None:
+            key = ("frame", self._next_id)
+            self._next_id += 1
+        if not self._pending:
+            self._last_progress = self._clock()
+        self._pending[key] = message
+        self._ready.set()
+        return True
+
+    def evict(self, reason: str, code: int = CLOSE_SLOW_CONSUMER):
+        """Drop a client that cannot keep up (or has stopped answering)."""
+        if self.closed:
+            return
+        logger.warning(f"Evicting WebSocket client {self.id} ({reason}, {len(self._pending)} frames queued)")
+        self.close()
+        self._on_evict(self.websocket)
+        asyncio.get_running_loop().create_task(self._close_socket(code))
+
+    def close(self):
+        """Stop the writer and discard queued frames."""
+        self.closed = True
+        self._pending.clear()
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+    async def _write_loop(self):
+        while not self.closed:
+            await self._ready.wait()
+            while self._pending and not self.closed:
+                _, message = self._pending.popitem(last=False)
+                try:
+                    if isinstance(message, bytes):
+                        send = self.websocket.send_bytes(message)
+                    else:
+                        send = self.websocket.send_text(message)
+                    await asyncio.wait_for(send, self.slow_consumer_seconds)
+                except asyncio.TimeoutError:
+                    self.evict("send timed out")
+                    return
+                except Exception:
+                    # Connection is closed
+                    self.close()
+                    self._on_evict(self.websocket)
+                    return
+                self.sent += 1
+                # Text frames are ASCII-only JSON, so characters == bytes
+                self.bytes_sent += len(message)
+                self._last_progress = self._clock()
+            self._ready.clear()
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+
+@dataclass
+class CycleStats:
+    """Outcome of one price refresh cycle."""
+    tickers: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    over_budget: int = 0
+    duration: float = 0.0
+    loop_blocked: float = 0.0
+
 
 class ConnectionManager:
     """Manages WebSocket connections and broadcasts stock price updates."""
     
-    def __init__(self):
+    def __init__(
+        self,
+        interval: float = settings.broadcast_interval_seconds,
+        concurrency: int = settings.broadcast_concurrency,
+        cycle_budget: float = settings.broadcast_cycle_budget_seconds,
+        bus: Optional[PriceBus] = None,
+        schedule: Optional[RefreshSchedule] = None,
+        heartbeat_interval: float = settings.ws_heartbeat_interval_seconds,
+        heartbeat_timeout: float = settings.ws_heartbeat_timeout_seconds,
+    ):
         # Map of ticker -> set of websocket connections subscribed to it
         self.active_connections: Dict[str, Set[WebSocket]] = {}
         # Map of websocket -> set of tickers it's subscribed to
         self.connection_subscriptions: Dict[WebSocket, Set[str]] = {}
-        self.client = StockAPIClient()
+        # Map of websocket -> its outbound queue and writer
+        self.connections: Dict[WebSocket, ClientConnection] = {}
+        # Connections that asked for price_batch frames
+        self.batch_connections: Set[WebSocket] = set()
+        # Portfolio id -> connections following it, and its current holdings
+        self.portfolio_followers: Dict[int, Set[WebSocket]] = {}
+        self.portfolio_holdings: Dict[int, Set[str]] = {}
+        # Running totals of followed portfolios, moved by each price tick
+        self.valuations = PortfolioValuations()
+        # Followed portfolios revalued in the current cycle, for batch-mode followers
+        self._cycle_portfolios: Set[int] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
         self.price_cache: Dict[str, float] = {}
+        # Per-ticker sequence number, bumped on every real price change
+        self.sequences: Dict[str, int] = {}
+        self.interval = interval
+        self.concurrency = concurrency
+        self.cycle_budget = cycle_budget
+        self.last_cycle: Optional[CycleStats] = None
+        # Only the bus leader polls; every worker fans out what the leader publishes
+        self.bus = bus or InProcessPriceBus()
+        self.bus.add_listener(self.handle_bus_message)
+        self._interest_dirty = False
+        # When each ticker is refreshed next (used by the leader's poll loop)
+        self.schedule = schedule if schedule is not None else RefreshSchedule(base_interval=interval)
+        # Prices changed so far in the leader's current cycle, for price_batch frames
+        self._cycle_updates: Dict[str, float] = {}
+        self._lag_monitor = LoopLagMonitor()
         self._broadcast_task = None
+        # Clients are pinged every interval and dropped after timeout seconds of silence
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.reaped = 0
+        self._heartbeat_task = None
+
+    @property
+    def client(self) -> StockAPIClient:
+        """The process-wide stock API client (shared with the REST routes)."""
+        return get_stock_api_client()
         
-    async def connect(self, websocket: WebSocket):
-        """Accept a new WebSocket connection."""
+    async def connect(self, websocket: WebSocket, encoding: str = wire_format.JSON):
+        """Accept a new WebSocket connection that receives price frames in ``encoding``."""
         await websocket.accept()
+        self._loop = asyncio.get_running_loop()
         self.connection_subscriptions[websocket] = set()
+        self.connections[websocket] = ClientConnection(websocket, self.disconnect, encoding=encoding)
         logger.info("New WebSocket connection established")
         
     def disconnect(self, websocket: WebSocket):
         """Remove a WebSocket connection and its subscriptions."""
+        connection = self.connections.pop(websocket, None)
+        if connection is not None:
+            connection.close()
+            for portfolio_id in connection.portfolios:
+                self._unfollow_portfolio(websocket, portfolio_id)
+        self.batch_connections.discard(websocket)
         # Remove from all ticker subscriptions
         if websocket in self.connection_subscriptions:
             tickers = self.connection_subscriptions[websocket].copy()
             for ticker in tickers:
-                self.unsubscribe(websocket, ticker)
+                self._remove_subscription(websocket, ticker)
             del self.connection_subscriptions[websocket]
             logger.info(f"WebSocket connection closed (was subscribed to {len(tickers)} tickers)")
     
+    def record_received(self, websocket: WebSocket, data: Union[str, bytes]):
+        """Count a message from a client; any message answers a heartbeat."""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.record_received(data)
+
+    def send_heartbeats(self) -> int:
+        """Ping every connection and reap the ones silent past ``heartbeat_timeout``; returns how many were reaped.
+
+        Reaping goes through ``disconnect``, so a dead client's tickers stop
+        being refreshed without waiting for a send to fail.
+        """
+        message = json.dumps({"type": "heartbeat", "timestamp": asyncio.get_event_loop().time()})
+        reaped = 0
+        for connection in list(self.connections.values()):
+            if self.heartbeat_timeout > 0 and connection.idle_seconds() > self.heartbeat_timeout:
+                connection.evict("heartbeat timed out", CLOSE_HEARTBEAT_TIMEOUT)
+                reaped += 1
+            else:
+                connection.enqueue(message, "heartbeat")
+        self.reaped += reaped
+        return reaped
+
+    async def heartbeat_loop(self):
+        """Send heartbeats every ``heartbeat_interval`` seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                self.send_heartbeats()
+            except Exception as e:
+                logger.error(f"Error sending WebSocket heartbeats: {str(e)}", exc_info=True)
+
+    def stats(self, limit: int = 10) -> Dict[str, Any]:
+        """Connection counts plus the ``limit`` tickers with most subscribers and connections with most traffic."""
+        tickers = heapq.nlargest(limit, self.active_connections.items(), key=lambda item: len(item[1]))
+        connections = heapq.nlargest(
+            limit, self.connections.items(), key=lambda item: item[1].bytes_sent + item[1].bytes_received
+        )
+        return {
+            "connections": len(self.connections),
+            "tickers": len(self.active_connections),
+            "portfolios": len(self.portfolio_followers),
+            "queued_frames": sum(connection.queue_depth for connection in self.connections.values()),
+            "heartbeat": {
+                "interval_seconds": self.heartbeat_interval,
+                "timeout_seconds": self.heartbeat_timeout,
+                "reaped": self.reaped,
+            },
+            "heaviest_tickers": [
+                {"ticker": ticker, "subscribers": len(sockets)} for ticker, sockets in tickers
+            ],
+            "heaviest_connections": [
+                {
+                    **connection.stats(),
+                    "subscriptions": len(self.connection_subscriptions.get(websocket, ())),
+                    "portfolios": sorted(connection.portfolios),
+                }
+                for websocket, connection in connections
+            ],
+        }
+
     def subscribe(self, websocket: WebSocket, ticker: str):
         """Subscribe a connection to a ticker symbol."""
-        ticker = ticker.upper()
-        if ticker not in self.active_connections:
-            self.active_connections[ticker] = set()
-        self.active_connections[ticker].add(websocket)
-        self.connection_subscriptions[websocket].add(ticker)
+        self.subscribe_many(websocket, [ticker])
+
+    def subscribe_many(self, websocket: WebSocket, tickers) -> List[str]:
+        """Subscribe a connection to several tickers; returns them upper-cased and de-duplicated.
+
+        Tickers that cannot be sent on the wire are skipped with an ``error`` frame.
+        """
+        tickers = self._valid_tickers(websocket, tickers)
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.explicit_tickers.update(tickers)
+        self._add_subscriptions(websocket, tickers)
+        return tickers
+
+    def follow_portfolio(self, websocket: WebSocket, portfolio_id: int, positions: Dict[str, Dict]) -> List[str]:
+        """Subscribe a connection to a portfolio's holdings and keep it subscribed as they change.
+
+        ``positions`` is ``PortfolioAnalytics.get_portfolio_positions`` output;
+        it seeds the running valuation pushed as ``portfolio_value`` frames.
+        The caller has already checked that the connection may see the portfolio.
+        """
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return []
+        holdings = {ticker.upper() for ticker in positions}
+        connection.portfolios.add(portfolio_id)
+        self.portfolio_followers.setdefault(portfolio_id, set()).add(websocket)
+        self.portfolio_holdings[portfolio_id] = holdings
+        self.valuations.track(portfolio_id, positions, self.price_cache)
+        self._add_subscriptions(websocket, sorted(holdings))
+        return sorted(holdings)
+
+    def follows_portfolio(self, portfolio_id: int) -> bool:
+        return portfolio_id in self.portfolio_followers
+
+    def update_portfolio_holdings(self, portfolio_id: int, positions: Dict[str, Dict]):
+        """Move a portfolio's followers onto its new holdings.
+
+        Followers are subscribed to new holdings and sent their cached prices
+        and the revalued portfolio; tickers no longer held are dropped unless
+        the connection also wants them by name or through another followed
+        portfolio.
+        """
+        followers = self.portfolio_followers.get(portfolio_id)
+        if not followers:
+            return
+        holdings = {ticker.upper() for ticker in positions}
+        previous = self.portfolio_holdings.get(portfolio_id, set())
+        self.portfolio_holdings[portfolio_id] = holdings
+        added = sorted(holdings - previous)
+        removed = previous - holdings
+        message = json.dumps({
+            "type": "portfolio_holdings",
+            "portfolio_id": portfolio_id,
+            "tickers": sorted(holdings),
+            "prices": self.cached_prices(added),
+            "value": self.valuations.track(portfolio_id, positions, self.price_cache),
+        })
+        for websocket in list(followers):
+            connection = self.connections.get(websocket)
+            if connection is None:
+                continue
+            self._add_subscriptions(websocket, added)
+            for ticker in removed:
+                if ticker in connection.explicit_tickers or any(
+                    ticker in self.portfolio_holdings.get(other, ()) for other in connection.portfolios
+                ):
+                    continue
+                self._remove_subscription(websocket, ticker)
+            connection.enqueue(message)
+
+    def notify_portfolio_holdings(self, portfolio_id: int, positions: Dict[str, Dict]):
+        """Thread-safe ``update_portfolio_holdings`` for sync routes running in the threadpool."""
+        if self._loop is None or not self.follows_portfolio(portfolio_id):
+            return
+        self._loop.call_soon_threadsafe(self.update_portfolio_holdings, portfolio_id, dict(positions))
+
+    def _unfollow_portfolio(self, websocket: WebSocket, portfolio_id: int):
+        followers = self.portfolio_followers.get(portfolio_id)
+        if followers is None:
+            return
+        followers.discard(websocket)
+        if not followers:
+            del self.portfolio_followers[portfolio_id]
+            self.portfolio_holdings.pop(portfolio_id, None)
+            self.valuations.untrack(portfolio_id)
+            self._cycle_portfolios.discard(portfolio_id)
+
+    def _valid_tickers(self, websocket: WebSocket, tickers) -> List[str]:
+        """Upper-case and de-duplicate tickers, dropping any ``wire_format.valid_ticker`` rejects.
+
+        The connection gets an ``error`` frame for each dropped ticker, so a bad
+        symbol never reaches the subscription state.
+        """
+        accepted = []
+        for ticker in tickers:
+            if not ticker:
+                continue
+            if isinstance(ticker, str) and wire_format.valid_ticker(ticker.upper()):
+                accepted.append(ticker.upper())
+                continue
+            self.send_personal_message(json.dumps({
+                "type": "error",
+                "ticker": ticker,
+                "message": f"Invalid ticker symbol: expected up to {wire_format.MAX_TICKER_LENGTH} ASCII characters"
+            }), websocket)
+        return list(dict.fromkeys(accepted))
+
+    def _add_subscriptions(self, websocket: WebSocket, tickers: List[str]):
+        """Add upper-case tickers to a connection; binary sessions get one frame announcing the new IDs."""
+        tickers = self._valid_tickers(websocket, tickers)
+        if not tickers:
+            return
+        connection = self.connections.get(websocket)
+        new_ids = []
+        for ticker in tickers:
+            self.active_connections.setdefault(ticker, set()).add(websocket)
+            self.connection_subscriptions[websocket].add(ticker)
+            if connection is not None and connection.binary:
+                ticker_id = connection.assign_ticker_id(ticker)
+                if ticker_id is not None:
+                    new_ids.append((ticker_id, ticker))
+        self._interest_changed()
+        if connection is not None and new_ids:
+            connection.enqueue(wire_format.encode_ticker_ids(new_ids))
     
+    def set_batch_mode(self, websocket: WebSocket, enabled: bool):
+        """Switch a connection between per-ticker price_update and per-cycle price_batch frames."""
+        connection = self.connections.get(websocket)
+        if connection is None:
+            return
+        connection.batch = enabled
+        if enabled:
+            self.batch_connections.add(websocket)
+        else:
+            self.batch_connections.discard(websocket)
+
     def unsubscribe(self, websocket: WebSocket, ticker: str):
         """Unsubscribe a connection from a ticker symbol."""
         ticker = ticker.upper()
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.explicit_tickers.discard(ticker)
+        self._remove_subscription(websocket, ticker)
+
+    def _remove_subscription(self, websocket: WebSocket, ticker: str):
         if ticker in self.active_connections:
             self.active_connections[ticker].discard(websocket)
             if not self.active_connections[ticker]:
                 del self.active_connections[ticker]
+            self._interest_changed()
         if websocket in self.connection_subscriptions:
             self.connection_subscriptions[websocket].discard(ticker)
     
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        """Send a message to a specific connection."""
+    def _interest_changed(self):
+        """Report subscriber counts to the bus, at most once per event-loop iteration."""
+        if self._interest_dirty:
+            return
+        self._interest_dirty = True
         try:
-            await websocket.send_text(message)
-        except Exception:
-            # Connection may be closed
-            self.disconnect(websocket)
-    
-    async def broadcast_price_update(self, ticker: str, price: float):
-        """Broadcast a price update to all connections subscribed to a ticker."""
+            asyncio.get_running_loop().call_soon(self._flush_interest)
+        except RuntimeError:
+            self._flush_interest()
+
+    def _flush_interest(self):
+        if self._interest_dirty:
+            self._interest_dirty = False
+            self.bus.update_interest({ticker: len(sockets) for ticker, sockets in self.active_connections.items()})
+
+    def record_price(self, ticker: str, price: float, seq: Optional[int] = None) -> bool:
+        """Store a price; returns True if it changed.
+
+        Without ``seq`` the ticker's sequence is bumped on a change. With the
+        leader-assigned ``seq`` the price is taken as is, unless that sequence
+        was already seen.
+        """
         ticker = ticker.upper()
-        if ticker not in self.active_connections:
+        if seq is None:
+            if self.price_cache.get(ticker) == price:
+                return False
+            seq = self.sequences.get(ticker, 0) + 1
+        elif seq <= self.sequences.get(ticker, 0):
+            return False
+        self.price_cache[ticker] = price
+        self.sequences[ticker] = seq
+        return True
+
+    def cached_prices(self, tickers) -> List[dict]:
+        """``{"ticker", "price", "seq"}`` for each ticker with a cached price, sorted by ticker."""
+        return [
+            {"ticker": ticker, "price": self.price_cache[ticker], "seq": self.sequences.get(ticker, 0)}
+            for ticker in sorted(t.upper() for t in tickers)
+            if ticker in self.price_cache
+        ]
+
+    def snapshot_message(self, tickers) -> str:
+        """A ``snapshot`` frame with the cached price and sequence of each known ticker."""
+        return json.dumps({"type": "snapshot", "prices": self.cached_prices(tickers)})
+
+    def send_snapshot(self, websocket: WebSocket, tickers=None):
+        """Answer a ``resync``: current state for the given tickers (default: all subscriptions).
+
+        Binary sessions are re-sent their ticker IDs first.
+        """
+        subscribed = self.connection_subscriptions.get(websocket, set())
+        wanted = subscribed if tickers is None else {t.upper() for t in tickers} & subscribed
+        connection = self.connections.get(websocket)
+        if connection is not None and connection.binary:
+            connection.enqueue(wire_format.encode_ticker_ids(
+                sorted((connection.ticker_ids[ticker], ticker) for ticker in wanted)
+            ))
+        self.send_personal_message(self.snapshot_message(wanted), websocket)
+
+    def send_cached_price(self, websocket: WebSocket, ticker: str):
+        """Send a new subscriber the last known price of a ticker, if there is one."""
+        ticker = ticker.upper()
+        connection = self.connections.get(websocket)
+        if connection is None or ticker not in self.price_cache:
             return
-        
-        message = json.dumps({
+        price, seq = self.price_cache[ticker], self.sequences.get(ticker, 0)
+        if connection.binary:
+            timestamp = asyncio.get_event_loop().time()
+            connection.enqueue(
+                wire_format.encode_prices(timestamp, [(connection.ticker_ids[ticker], seq, price)]),
+                ("price", ticker),
+            )
+            return
+        connection.enqueue(json.dumps({
             "type": "price_update",
             "ticker": ticker,
             "price": price,
-            "timestamp": asyncio.get_event_loop().time()
+            "seq": seq,
+            "cached": True
+        }), ("price", ticker))
+
+    def send_personal_message(self, message: str, websocket: WebSocket):
+        """Queue a message for a specific connection."""
+        connection = self.connections.get(websocket)
+        if connection is not None:
+            connection.enqueue(message)
+
+    def broadcast_price_update(self, ticker: str, price: float):
+        """Queue a price update for every connection subscribed to a ticker."""
+        ticker = ticker.upper()
+        if ticker not in self.active_connections:
+            return
+
+        seq = self.sequences.get(ticker, 0)
+        timestamp = asyncio.get_event_loop().time()
+        key = ("price", ticker)
+        message = None
+        # Binary sessions that subscribed in the same order share an ID, and a frame
+        binary_frames: Dict[int, bytes] = {}
+        for websocket in list(self.active_connections[ticker]):
+            connection = self.connections.get(websocket)
+            # Batch-mode connections get this price in the cycle's price_batch frame
+            if connection is None or connection.batch:
+                continue
+            if connection.binary:
+                ticker_id = connection.ticker_ids[ticker]
+                frame = binary_frames.get(ticker_id)
+                if frame is None:
+                    frame = binary_frames[ticker_id] = wire_format.encode_prices(
+                        timestamp, [(ticker_id, seq, price)]
+                    )
+                connection.enqueue(frame, key)
+                continue
+            if message is None:
+                message = json.dumps({
+                    "type": "price_update",
+                    "ticker": ticker,
+                    "price": price,
+                    "seq": seq,
+                    "timestamp": timestamp
+                })
+            connection.enqueue(message, key)
+
+    def broadcast_error(self, ticker: str, error: Union[Exception, str]):
+        """Tell a ticker's subscribers that its price could not be fetched."""
+        error_message = json.dumps({
+            "type": "error",
+            "ticker": ticker,
+            "message": f"Failed to fetch price: {str(error)}"
         })
-        
-        # Send to all subscribed connections
-        disconnected = []
-        for connection in self.active_connections[ticker].copy():
-            try:
-                await connection.send_text(message)
-            except Exception:
-                # Connection is closed, mark for removal
-                disconnected.append(connection)
-        
-        # Clean up disconnected connections
-        for connection in disconnected:
-            self.disconnect(connection)
-    
+        self._fan_out(ticker, error_message, ("error", ticker))
+
+    def broadcast_price_batch(self, prices: Dict[str, float]) -> int:
+        """Queue one price_batch frame per batch-mode connection and return how many were queued.
+
+        Each ticker's ``{"ticker", "price", "seq"}`` fragment is serialized once, and
+        connections whose changed tickers are the same share one frame.
+        """
+        if not prices or not self.batch_connections:
+            return 0
+        now = asyncio.get_event_loop().time()
+        timestamp = json.dumps(now)
+        fragments: Dict[str, str] = {}
+        frames: Dict[FrozenSet[str], str] = {}
+        binary_frames: Dict[Tuple[Tuple[int, str], ...], bytes] = {}
+        queued = 0
+        for websocket in list(self.batch_connections):
+            tickers = frozenset(
+                ticker for ticker in self.connection_subscriptions.get(websocket, ()) if ticker in prices
+            )
+            if not tickers:
+                continue
+            connection = self.connections[websocket]
+            if connection.binary:
+                ids = tuple(sorted((connection.ticker_ids[ticker], ticker) for ticker in tickers))
+                binary_frame = binary_frames.get(ids)
+                if binary_frame is None:
+                    binary_frame = binary_frames[ids] = wire_format.encode_prices(now, [
+                        (ticker_id, self.sequences.get(ticker, 0), prices[ticker]) for ticker_id, ticker in ids
+                    ])
+                connection.enqueue(binary_frame)
+                queued += 1
+                continue
+            frame = frames.get(tickers)
+            if frame is None:
+                parts = []
+                for ticker in sorted(tickers):
+                    fragment = fragments.get(ticker)
+                    if fragment is None:
+                        fragment = fragments[ticker] = json.dumps(
+                            {"ticker": ticker, "price": prices[ticker], "seq": self.sequences.get(ticker, 0)}
+                        )
+                    parts.append(fragment)
+                frame = frames[tickers] = (
+                    f'{{"type": "price_batch", "timestamp": {timestamp}, "prices": [{", ".join(parts)}]}}'
+                )
+            connection.enqueue(frame)
+            queued += 1
+        return queued
+
+    def portfolio_value_message(self, portfolio_id: int) -> str:
+        """A ``portfolio_value`` frame with a followed portfolio's running totals."""
+        value: Dict[str, Any] = self.valuations.value(portfolio_id) or {}
+        return json.dumps({
+            "type": "portfolio_value",
+            "portfolio_id": portfolio_id,
+            **value,
+            "timestamp": asyncio.get_event_loop().time(),
+        })
+
+    def broadcast_portfolio_values(self, ticker: str, price: float):
+        """Revalue the followed portfolios holding ``ticker`` and queue their new totals.
+
+        Only portfolios that hold the ticker are touched. Batch-mode followers
+        get each portfolio's latest total once, after the cycle's price_batch.
+        """
+        for portfolio_id in self.valuations.apply_price(ticker, price):
+            message = None
+            for websocket in list(self.portfolio_followers.get(portfolio_id, ())):
+                connection = self.connections.get(websocket)
+                if connection is None:
+                    continue
+                if connection.batch:
+                    self._cycle_portfolios.add(portfolio_id)
+                    continue
+                if message is None:
+                    message = self.portfolio_value_message(portfolio_id)
+                connection.enqueue(message, ("portfolio_value", portfolio_id))
+
+    def _flush_cycle_portfolio_values(self):
+        portfolios, self._cycle_portfolios = self._cycle_portfolios, set()
+        for portfolio_id in portfolios:
+            message = self.portfolio_value_message(portfolio_id)
+            for websocket in list(self.portfolio_followers.get(portfolio_id, ())):
+                connection = self.connections.get(websocket)
+                if connection is not None and connection.batch:
+                    connection.enqueue(message, ("portfolio_value", portfolio_id))
+
+    def _fan_out(self, ticker: str, message: str, key: Hashable):
+        """Enqueue one serialized frame on every subscriber of a ticker (never waits on a socket)."""
+        for websocket in list(self.active_connections.get(ticker, ())):
+            connection = self.connections.get(websocket)
+            if connection is not None:
+                connection.enqueue(message, key)
+
+    def handle_bus_message(self, message: Message):
+        """Fan a message published by the bus leader out to this worker's connections."""
+        kind = message.get("type")
+        if kind == "price":
+            ticker, price = message["ticker"], message["price"]
+            if self.record_price(ticker, price, message["seq"]):
+                self._cycle_updates[ticker] = price
+                self.broadcast_price_update(ticker, price)
+                self.broadcast_portfolio_values(ticker, price)
+        elif kind == "error":
+            self.broadcast_error(message["ticker"], message["message"])
+        elif kind == "cycle_end":
+            updates, self._cycle_updates = self._cycle_updates, {}
+            self.broadcast_price_batch(updates)
+            self._flush_cycle_portfolio_values()
+
+    async def refresh_cycle(self, tickers: Optional[List[str]] = None) -> CycleStats:
+        """Fetch the given tickers (default: every ticker subscribed on any worker) and publish the results.
+
+        At most ``concurrency`` lookups run at once. Tickers still pending when
+        ``cycle_budget`` runs out are abandoned for this cycle (an upstream
+        request already in flight keeps running and fills the quote cache for
+        the next one). Each changed price is published as it arrives, so
+        per-ticker connections get it straight away; the closing ``cycle_end``
+        message sends batch-mode connections one price_batch frame. Prices
+        equal to the cached one are not re-sent. Every ticker is then
+        rescheduled in ``schedule``.
+        """
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        self._lag_monitor.take_blocked_seconds()
+        self._flush_interest()
+        if tickers is None:
+            tickers = sorted(self.bus.interest())
+        stats = CycleStats(tickers=len(tickers))
+        refreshed: Set[str] = set()
+        semaphore = asyncio.Semaphore(max(self.concurrency, 1))
+
+        async def refresh(ticker: str):
+            async with semaphore:
+                try:
+                    price = await self.client.get_current_price_async(ticker, Priority.BACKGROUND)
+                except Exception as e:
+                    stats.failed += 1
+                    logger.error(f"Failed to fetch price for {ticker}: {str(e)}")
+                    self.bus.publish({"type": "error", "ticker": ticker, "message": str(e)})
+                    return
+            refreshed.add(ticker)
+            changed = self.price_cache.get(ticker) != price
+            self.schedule.record(ticker, changed)
+            if not changed:
+                stats.unchanged += 1
+                return
+            stats.updated += 1
+            seq = self.sequences.get(ticker, 0) + 1
+            self.bus.publish({"type": "price", "ticker": ticker, "price": price, "seq": seq})
+
+        tasks = [loop.create_task(refresh(ticker)) for ticker in tickers]
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=self.cycle_budget)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            stats.over_budget = len(pending)
+        for ticker in tickers:
+            if ticker not in refreshed:
+                # Failed or over budget: try again after the current interval
+                self.schedule.record(ticker, None)
+        self.bus.publish({"type": "cycle_end"})
+
+        stats.duration = loop.time() - started
+        stats.loop_blocked = self._lag_monitor.take_blocked_seconds()
+        self.last_cycle = stats
+        if tickers:
+            log = logger.warning if stats.over_budget else logger.debug
+            log(
+                f"Price refresh cycle: {stats.tickers} tickers, {stats.updated} changed, {stats.unchanged} unchanged, "
+                f"{stats.failed} failed, {stats.over_budget} over budget in {stats.duration * 1000:.0f}ms "
+                f"(event loop blocked {stats.loop_blocked * 1000:.0f}ms)"
+            )
+        return stats
+
     async def fetch_and_broadcast_prices(self):
-        """Periodically fetch prices for all subscribed tickers and broadcast updates."""
-        while True:
-            try:
-                # Get all unique tickers that have active subscriptions
-                tickers_to_update = set(self.active_connections.keys())
-                
-                for ticker in tickers_to_update:
-                    try:
-                        # Fetch current price
-                        price = self.client.get_current_price(ticker)
-                        self.price_cache[ticker] = price
-                        
-                        # Broadcast update
-                        await self.broadcast_price_update(ticker, price)
-                    except Exception as e:
-                        # If price fetch fails, send error to subscribers
-                        logger.error(f"Failed to fetch price for {ticker}: {str(e)}", exc_info=True)
-                        error_message = json.dumps({
-                            "type": "error",
-                            "ticker": ticker,
-                            "message": f"Failed to fetch price: {str(e)}"
-                        })
-                        for connection in self.active_connections.get(ticker, set()).copy():
-                            try:
-                                await connection.send_text(error_message)
-                            except Exception:
-                                self.disconnect(connection)
-                
-                # Wait 5 seconds before next update cycle
-                await asyncio.sleep(5)
-            except Exception as e:
-                # Log error and continue
-                logger.error(f"Error in price broadcast loop: {str(e)}", exc_info=True)
-                await asyncio.sleep(5)
-    
+        """Refresh tickers as ``schedule`` makes them due, while this worker leads the price bus.
+
+        The loop wakes at least every ``schedule.min_interval`` seconds so new
+        subscriptions are picked up quickly.
+        """
+        await self.bus.start()
+        self._lag_monitor.start()
+        try:
+            while True:
+                try:
+                    if not self.bus.is_leader:
+                        await asyncio.sleep(self.interval)
+                        continue
+                    self._flush_interest()
+                    self.schedule.sync(self.bus.interest())
+                    self.schedule.set_capacity(self.client.background_capacity())
+                    due = self.schedule.pop_due()
+                    if due:
+                        await self.refresh_cycle(due)
+                    wait = self.schedule.seconds_until_due()
+                    if wait is None or wait > self.schedule.min_interval:
+                        wait = self.schedule.min_interval
+                    await asyncio.sleep(wait)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Log error and continue
+                    logger.error(f"Error in price broadcast loop: {str(e)}", exc_info=True)
+                    await asyncio.sleep(self.interval)
+        finally:
+            self._lag_monitor.stop()
+            await self.bus.stop()
+
     def start_broadcast_task(self):
-        """Start the background task for price broadcasting."""
+        """Start the background tasks for price broadcasting and heartbeats."""
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
         if self._broadcast_task is None or self._broadcast_task.done():
-            try:
-                loop = asyncio.get_event_loop()
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
             self._broadcast_task = loop.create_task(self.fetch_and_broadcast_prices())
+        # Every worker pings its own connections, leader or not
+        if self.heartbeat_interval > 0 and (self._heartbeat_task is None or self._heartbeat_task.done()):
+            self._heartbeat_task = loop.create_task(self.heartbeat_loop())
+
+    async def stop_broadcast_task(self):
+        """Cancel the background price broadcasting and heartbeat tasks, if running."""
+        for task in (self._broadcast_task, self._heartbeat_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._broadcast_task = None
+        self._heartbeat_task = None
 
 
 # Global connection manager instance
-manager = ConnectionManager()
+manager = ConnectionManager(bus=create_price_bus())
 
@@ -0,0 +1,81 @@
+"""Binary frame layout for /ws/prices sessions opened with ``?encoding=binary``.
+
+Price frames carry a per-session ticker ID instead of the symbol. The server
+announces IDs in a ticker-ID frame when the session subscribes to a ticker
+(and again on ``resync``). Control messages (pong, configured, errors,
+snapshots) stay JSON text frames. All integers and floats are little-endian.
+
+Ticker-ID frame::
+
+    u8 type = 1 | u16 count | count x (u16 id | u8 length | ascii ticker)
+
+Prices frame (one entry for a price_update, several for a price_batch)::
+
+    u8 type = 2 | f64 timestamp | u16 count | count x (u16 id | u32 seq | f64 price)
+"""
+import struct
+from typing import Any, Dict, Iterable, List, Tuple
+
+JSON = "json"
+BINARY = "binary"
+ENCODINGS = (JSON, BINARY)
+
+FRAME_TICKER_IDS = 1
+FRAME_PRICES = 2
+
+# IDs are u16 and never reused within a session
+MAX_TICKER_ID = 0xFFFF
+# Ticker-ID entries carry the symbol as ASCII behind a u8 length
+MAX_TICKER_LENGTH = 0xFF
+
+_TICKER_IDS_HEADER = struct.Struct("<BH")
+_TICKER_ID_ENTRY = struct.Struct("<HB")
+_PRICES_HEADER = struct.Struct("<BdH")
+_PRICE_ENTRY = struct.Struct("<HId")
+
+
+def valid_ticker(ticker: str) -> bool:
+    """True when a ticker fits a ticker-ID entry: non-empty ASCII of at most MAX_TICKER_LENGTH bytes."""
+    return 0 < len(ticker) <= MAX_TICKER_LENGTH and ticker.isascii()
+
+
+def encode_ticker_ids(ids: Iterable[Tuple[int, str]]) -> bytes:
+    """A ticker-ID frame for ``(id, ticker)`` pairs; tickers must pass ``valid_ticker``."""
+    entries = list(ids)
+    parts = [_TICKER_IDS_HEADER.pack(FRAME_TICKER_IDS, len(entries))]
+    for ticker_id, ticker in entries:
+        symbol = ticker.encode("ascii")
+        parts.append(_TICKER_ID_ENTRY.pack(ticker_id, len(symbol)))
+        parts.append(symbol)
+    return b"".join(parts)
+
+
+def encode_prices(timestamp: float, prices: Iterable[Tuple[int, int, float]]) -> bytes:
+    """A prices frame for ``(id, seq, price)`` entries."""
+    entries = list(prices)
+    parts = [_PRICES_HEADER.pack(FRAME_PRICES, timestamp, len(entries))]
+    parts.extend(_PRICE_ENTRY.pack(ticker_id, seq, price) for ticker_id, seq, price in entries)
+    return b"".join(parts)
+
+
+def decode_frame(data: bytes) -> Dict[str, Any]:
+    """Decode a binary frame (reference implementation for clients and tests)."""
+    frame_type = data[0]
+    if frame_type == FRAME_TICKER_IDS:
+        _, count = _TICKER_IDS_HEADER.unpack_from(data)
+        offset = _TICKER_IDS_HEADER.size
+        tickers: Dict[int, str] = {}
+        for _ in range(count):
+            ticker_id, length = _TICKER_ID_ENTRY.unpack_from(data, offset)
+            offset += _TICKER_ID_ENTRY.size
+            tickers[ticker_id] = data[offset:offset + length].decode("ascii")
+            offset += length
+        return {"type": "ticker_ids", "tickers": tickers}
+    if frame_type == FRAME_PRICES:
+        _, timestamp, count = _PRICES_HEADER.unpack_from(data)
+        prices: List[Tuple[int, int, float]] = [
+            _PRICE_ENTRY.unpack_from(data, _PRICES_HEADER.size + i * _PRICE_ENTRY.size)
+            for i in range(count)
+        ]
+        return {"type": "prices", "timestamp": timestamp, "prices": prices}
+    raise ValueError(f"Unknown binary frame type {frame_type}")
@@ -0,0 +1,142 @@
+"""Benchmark: per-portfolio analytics service vs the vectorized analytics engine.
+
+Spreads synthetic ``trade`` histories (buys and sells interleaved) of each
+size over ``--portfolios`` portfolios and times value + positions for all of
+them three ways:
+
+- service, replay: PortfolioAnalytics.get_portfolio_analytics per portfolio,
+  with positions from hydrating and replaying every Transaction in Python
+- service, table: the same, with positions read from the positions table
+- engine: PortfolioAnalyticsEngine.get_analytics, one column query and
+  NumPy group-bys for every portfolio at once
+
+With ``--method fifo`` (or another lot-based method) the portfolios use that
+cost basis: the engine sums their open lots, and the replay path is left
+out since it only knows average cost.
+
+Prices are fixed, so no upstream calls are made. Latency is the median of
+``--repeat`` runs; memory is the tracemalloc peak of one run (NumPy reports
+its allocations to tracemalloc).
+
+Run from backend/ (requires NumPy):
+
+    python -m benchmarks.bench_analytics_engine [--sizes 10000,100000,1000000] [--portfolios 10] [--method average]
+"""
+import argparse
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from benchmarks.bench_positions import TICKERS, INSERT_CHUNK, orm_replay, synthetic_rows
+from app.models.model import Base, Portfolio, Stock, Transaction, User
+from app.services.analytics_engine import PortfolioAnalyticsEngine
+from app.services.lot_service import COST_BASIS_METHODS
+from app.services.portfolio_service import PortfolioAnalytics
+from app.services.position_service import rebuild_positions
+
+PRICES = {ticker: 100.0 + i for i, ticker in enumerate(TICKERS)}
+
+
+class ReplayAnalytics(PortfolioAnalytics):
+    """PortfolioAnalytics with the original replay-every-transaction positions."""
+
+    def get_portfolio_positions(self, portfolio_id: int) -> Dict[str, Dict]:
+        return orm_replay(self.db, portfolio_id)
+
+
+def service_replay(db: Session, portfolio_ids: List[int]) -> dict:
+    service = ReplayAnalytics(db)
+    return {pid: service.get_portfolio_analytics(pid, dict(PRICES)) for pid in portfolio_ids}
+
+
+def service_table(db: Session, portfolio_ids: List[int]) -> dict:
+    service = PortfolioAnalytics(db)
+    return {pid: service.get_portfolio_analytics(pid, dict(PRICES)) for pid in portfolio_ids}
+
+
+def engine(db: Session, portfolio_ids: List[int]) -> dict:
+    return PortfolioAnalyticsEngine(db).get_analytics(portfolio_ids, dict(PRICES))
+
+
+def populate(url: str, count: int, portfolios: int, method: str) -> tuple:
+    db_engine = create_engine(url)
+    Base.metadata.drop_all(db_engine)
+    Base.metadata.create_all(db_engine)
+    make_session = sessionmaker(bind=db_engine)
+    with make_session() as db:
+        user = User(email="bench@example.com", username="bench", hashed_password="x")
+        db.add(user)
+        db.flush()
+        owned = [Portfolio(name=f"Benchmark {i}", user_id=user.id, cost_basis_method=method) for i in range(portfolios)]
+        db.add_all(owned)
+        db.execute(insert(Stock), [{"ticker_symbol": ticker, "company_name": ticker} for ticker in TICKERS])
+        db.flush()
+        for seed, portfolio in enumerate(owned):
+            rows = synthetic_rows(portfolio.id, count // portfolios, "trade", seed)
+            for start in range(0, len(rows), INSERT_CHUNK):
+                db.execute(insert(Transaction), rows[start:start + INSERT_CHUNK])
+        rebuild_positions(db)
+        db.commit()
+        return db_engine, make_session, [portfolio.id for portfolio in owned]
+
+
+def measure(make_session: Callable[[], Session], fn, portfolio_ids: List[int], repeat: int) -> tuple:
+    timings = []
+    result = None
+    for _ in range(repeat):
+        with make_session() as db:
+            started = time.perf_counter()
+            result = fn(db, portfolio_ids)
+            timings.append(time.perf_counter() - started)
+    with make_session() as db:
+        tracemalloc.start()
+        fn(db, portfolio_ids)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return statistics.median(timings), peak, result
+
+
+def same_analytics(a: dict, b: dict) -> bool:
+    """Equal up to a cent per rounded field (the paths add floats in different orders)."""
+    def close(x, y):
+        return abs(x - y) <= 0.011 if isinstance(x, float) else x == y
+
+    return a.keys() == b.keys() and all(
+        all(close(a[pid]["value"][k], b[pid]["value"][k]) for k in b[pid]["value"])
+        and sorted(p["ticker"] for p in a[pid]["positions"]) == sorted(p["ticker"] for p in b[pid]["positions"])
+        for pid in b
+    )
+
+
+def run(sizes: List[int], portfolios: int, repeat: int, method: str) -> None:
+    paths = [("service, replay", service_replay), ("service, table", service_table), ("engine", engine)]
+    if method != "average":
+        paths = paths[1:]
+    print(f"{'transactions':>12} {'portfolios':>10} {'path':16} {'ms':>10} {'peak MiB':>9}  matches")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            db_engine, make_session, portfolio_ids = populate(f"sqlite:///{tmp}/bench_analytics.db", size, portfolios, method)
+            baseline = None
+            for label, fn in paths:
+                seconds, peak, result = measure(make_session, fn, portfolio_ids, repeat)
+                baseline = baseline if baseline is not None else result
+                print(
+                    f"{size:>12} {portfolios:>10} {label:16} {seconds * 1000:>10.1f} "
+                    f"{peak / 2**20:>9.1f}  {same_analytics(result, baseline)}"
+                )
+            db_engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--portfolios", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--method", choices=COST_BASIS_METHODS, default="average")
+    args = parser.parse_args()
+    run([int(size) for size in args.sizes.split(",")], args.portfolios, args.repeat, args.method)
@@ -0,0 +1,156 @@
+"""Benchmark: portfolio positions from ORM replay vs SQL aggregation vs the positions table.
+
+Builds one portfolio of synthetic transactions per size and times three ways
+of computing its positions:
+
+- ORM replay: hydrate every Transaction and replay it in Python (the
+  original get_portfolio_positions)
+- SQL aggregate: aggregate_positions, one GROUP BY over plain columns, plus a
+  replay of only the tickers bought again after a sell
+- positions table: load_positions, one row per holding
+
+``accumulate`` histories only buy, then trim every ticker at the end, so the
+aggregate needs no replay; ``trade`` histories interleave buys and sells, so most
+tickers fall back to the (column-only) replay. Latency is the median of
+``--repeat`` runs; memory is the tracemalloc peak of one run.
+
+Run from backend/ (SQLite in a temporary file, plus PostgreSQL if a URL is given):
+
+    python -m benchmarks.bench_positions [--sizes 1000,100000,1000000] [--postgres-url postgresql://...]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+os.environ.setdefault("API_KEY", "benchmark")
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import Session, sessionmaker  # noqa: E402
+
+from app.models.model import Base, Portfolio, Stock, Transaction, User  # noqa: E402
+from app.services.position_service import (  # noqa: E402
+    aggregate_positions, load_positions, rebuild_positions, replay_positions,
+)
+
+TICKERS = [f"T{i:03d}" for i in range(200)]
+INSERT_CHUNK = 10_000
+
+
+def orm_replay(db: Session, portfolio_id: int) -> Dict[str, Dict[str, float]]:
+    """The original path: load Transaction objects and replay them in Python."""
+    transactions = db.query(Transaction).filter(Transaction.portfolio_id == portfolio_id).all()
+    replayed = replay_positions(
+        (t.portfolio_id, t.ticker_symbol, t.transaction_type, t.quantity, t.price) for t in transactions
+    )
+    return {
+        ticker: {"quantity": p.quantity, "total_cost": p.total_cost, "average_cost": p.average_cost}
+        for (_, ticker), p in replayed.items() if p.quantity > 0
+    }
+
+
+def synthetic_rows(portfolio_id: int, count: int, history: str, seed: int = 0) -> List[dict]:
+    rng = random.Random(seed)
+    held = dict.fromkeys(TICKERS, 0.0)
+    rows = []
+    # accumulate: buys only, then small trims in the last 10%; trade: sells mixed in throughout
+    sells_from = count * 9 // 10
+    for i in range(count):
+        ticker = TICKERS[i % len(TICKERS)]
+        price = round(rng.uniform(10, 500), 2)
+        if history == "accumulate" and i >= sells_from:
+            quantity = held[ticker] * rng.uniform(0.001, 0.01)
+            held[ticker] -= quantity
+            kind = "sell"
+        elif history == "trade" and held[ticker] > 1 and rng.random() < 0.3:
+            quantity = round(held[ticker] * rng.uniform(0.1, 0.5), 2)
+            held[ticker] -= quantity
+            kind = "sell"
+        else:
+            quantity = float(rng.randint(1, 50))
+            held[ticker] += quantity
+            kind = "buy"
+        rows.append({
+            "portfolio_id": portfolio_id, "ticker_symbol": ticker, "transaction_type": kind,
+            "quantity": quantity, "price": price,
+        })
+    return rows
+
+
+def populate(url: str, count: int, history: str) -> tuple:
+    engine = create_engine(url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    make_session = sessionmaker(bind=engine)
+    with make_session() as db:
+        user = User(email="bench@example.com", username="bench", hashed_password="x")
+        db.add(user)
+        db.flush()
+        portfolio = Portfolio(name="Benchmark", user_id=user.id)
+        db.add(portfolio)
+        db.execute(insert(Stock), [{"ticker_symbol": ticker, "company_name": ticker} for ticker in TICKERS])
+        db.flush()
+        rows = synthetic_rows(portfolio.id, count, history)
+        for start in range(0, len(rows), INSERT_CHUNK):
+            db.execute(insert(Transaction), rows[start:start + INSERT_CHUNK])
+        rebuild_positions(db, portfolio.id)
+        db.commit()
+        return engine, make_session, portfolio.id
+
+
+def measure(make_session: Callable[[], Session], fn, portfolio_id: int, repeat: int) -> tuple:
+    timings = []
+    result = None
+    for _ in range(repeat):
+        with make_session() as db:
+            started = time.perf_counter()
+            result = fn(db, portfolio_id)
+            timings.append(time.perf_counter() - started)
+    with make_session() as db:
+        tracemalloc.start()
+        fn(db, portfolio_id)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return statistics.median(timings), peak, result
+
+
+def same_positions(a: Dict[str, Dict[str, float]], b: Dict[str, Dict[str, float]]) -> bool:
+    return a.keys() == b.keys() and all(
+        abs(a[t][field] - b[t][field]) <= 1e-6 * max(1.0, abs(b[t][field]))
+        for t in a for field in ("quantity", "total_cost", "average_cost")
+    )
+
+
+def run(backends: Dict[str, str], sizes: List[int], repeat: int) -> None:
+    paths = [("ORM replay", orm_replay), ("SQL aggregate", aggregate_positions), ("positions table", load_positions)]
+    print(f"{'backend':10} {'history':10} {'transactions':>12} {'path':16} {'ms':>10} {'peak MiB':>9}  matches")
+    for backend, url in backends.items():
+        for history in ("accumulate", "trade"):
+            for size in sizes:
+                engine, make_session, portfolio_id = populate(url, size, history)
+                baseline = None
+                for label, fn in paths:
+                    seconds, peak, result = measure(make_session, fn, portfolio_id, repeat)
+                    baseline = baseline if baseline is not None else result
+                    print(
+                        f"{backend:10} {history:10} {size:>12} {label:16} {seconds * 1000:>10.1f} "
+                        f"{peak / 2**20:>9.1f}  {same_positions(result, baseline)}"
+                    )
+                engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,100000,1000000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--postgres-url", help="also run against this (scratch) PostgreSQL database")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {"sqlite": f"sqlite:///{tmp}/bench_positions.db"}
+        if args.postgres_url:
+            backends["postgresql"] = args.postgres_url
+        run(backends, [int(size) for size in args.sizes.split(",")], args.repeat)
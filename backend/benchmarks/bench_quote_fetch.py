@@ -0,0 +1,120 @@
+"""Benchmark: latest price via the daily series vs the single-quote path.
+
+Compares, per quote, the bytes the provider sends, the time to decode them and
+the memory allocated while fetching and parsing one price. Both paths run
+through StockAPIClient with a mocked transport, so no network or quota is used.
+
+Run from backend/:
+
+    python -m benchmarks.bench_quote_fetch [--quotes 2000]
+"""
+import argparse
+import json
+import os
+import time
+import tracemalloc
+from datetime import date, timedelta
+from typing import Callable
+
+os.environ.setdefault("API_KEY", "benchmark")
+
+import httpx  # noqa: E402
+
+from app.api_client import fast_json  # noqa: E402
+from app.api_client.api_client import StockAPIClient  # noqa: E402
+from app.api_client.quote_cache import QuoteCache  # noqa: E402
+from app.api_client.rate_scheduler import QuotaScheduler  # noqa: E402
+
+
+def daily_body(bars: int = 100) -> bytes:
+    """A compact TIME_SERIES_DAILY response as Alpha Vantage formats it."""
+    day = date(2024, 6, 28)
+    series = {}
+    while len(series) < bars:
+        if day.weekday() < 5:
+            series[day.isoformat()] = {
+                "1. open": "189.2500", "2. high": "191.4800", "3. low": "188.1200",
+                "4. close": "190.6100", "5. volume": "51234567",
+            }
+        day -= timedelta(days=1)
+    payload = {
+        "Meta Data": {
+            "1. Information": "Daily Prices (open, high, low, close) and Volumes",
+            "2. Symbol": "AAPL", "3. Last Refreshed": "2024-06-28",
+            "4. Output Size": "Compact", "5. Time Zone": "US/Eastern",
+        },
+        "Time Series (Daily)": series,
+    }
+    return json.dumps(payload, indent=4).encode()
+
+
+def quote_body() -> bytes:
+    """A GLOBAL_QUOTE response as Alpha Vantage formats it."""
+    payload = {
+        "Global Quote": {
+            "01. symbol": "AAPL", "02. open": "189.2500", "03. high": "191.4800",
+            "04. low": "188.1200", "05. price": "190.6100", "06. volume": "51234567",
+            "07. latest trading day": "2024-06-28", "08. previous close": "188.9900",
+            "09. change": "1.6200", "10. change percent": "0.8572%",
+        }
+    }
+    return json.dumps(payload, indent=4).encode()
+
+
+def make_client(supports_quote: bool) -> StockAPIClient:
+    bodies = {"TIME_SERIES_DAILY": daily_body(), "GLOBAL_QUOTE": quote_body()}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=bodies[request.url.params["function"]])
+
+    client = StockAPIClient(
+        http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+        # Every lookup must reach the provider: no caching, no quota
+        quote_cache=QuoteCache(ttl_seconds=0, stale_ttl_seconds=0),
+        scheduler=QuotaScheduler(per_minute=10**9, per_day=10**12, daily_reserve=0),
+    )
+    client.provider.supports_quote = supports_quote
+    return client
+
+
+def time_per_call(fn: Callable[[], object], count: int) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter() - started) / count
+
+
+def peak_allocation(fn: Callable[[], object]) -> int:
+    """Peak bytes allocated (tracemalloc) while one call runs."""
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def run(quotes: int) -> None:
+    legacy = make_client(supports_quote=False)
+    current = make_client(supports_quote=True)
+    daily, quote = daily_body(), quote_body()
+
+    rows = [
+        ("before: daily series + json", len(daily), lambda: json.loads(daily),
+         lambda: legacy.get_current_price("AAPL")),
+        (f"after: GLOBAL_QUOTE + {fast_json.BACKEND}", len(quote), lambda: fast_json.loads(quote),
+         lambda: current.get_current_price("AAPL")),
+    ]
+    print(f"{quotes} quotes per path, JSON backend: {fast_json.BACKEND}\n")
+    print(f"{'path':34} {'bytes/quote':>12} {'decode us':>10} {'fetch us':>10} {'peak KiB':>9}")
+    for label, size, decode, fetch in rows:
+        fetch()  # warm up
+        decode_us = time_per_call(decode, quotes) * 1e6
+        fetch_us = time_per_call(fetch, quotes) * 1e6
+        peak_kib = peak_allocation(fetch) / 1024
+        print(f"{label:34} {size:>12} {decode_us:>10.1f} {fetch_us:>10.1f} {peak_kib:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quotes", type=int, default=2000)
+    run(parser.parse_args().quotes)
@@ -0,0 +1,115 @@
+"""Benchmark: JSON vs binary /ws/prices frames.
+
+Reports the bytes each price update costs on the wire, as a single
+price_update frame and as one entry of a price_batch frame, and the server CPU
+time to push 10k updates through ConnectionManager (encode, enqueue and hand
+the frames to the socket). The sockets only count bytes, so no network is used.
+
+Run from backend/:
+
+    python -m benchmarks.bench_wire_format [--updates 10000] [--connections 1] [--batch 20]
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Dict
+
+os.environ.setdefault("API_KEY", "benchmark")
+
+from app import wire_format  # noqa: E402
+from app.websocket_manager import ConnectionManager  # noqa: E402
+
+TICKERS = ["AAPL", "MSFT", "GOOGL", "AMZN", "NVDA", "META", "TSLA", "BRK.B", "JPM", "V",
+           "UNH", "XOM", "JNJ", "WMT", "MA", "PG", "HD", "CVX", "ABBV", "COST"]
+
+
+class CountingWebSocket:
+    """Accepts every frame immediately and counts its bytes."""
+
+    def __init__(self) -> None:
+        self.frames = 0
+        self.bytes = 0
+
+    async def accept(self) -> None:
+        pass
+
+    async def send_text(self, message: str) -> None:
+        self.frames += 1
+        self.bytes += len(message.encode())
+
+    async def send_bytes(self, message: bytes) -> None:
+        self.frames += 1
+        self.bytes += len(message)
+
+    async def close(self, code: int = 1000) -> None:
+        pass
+
+
+async def measure(encoding: str, updates: int, connections: int, batch: int) -> Dict[str, float]:
+    manager = ConnectionManager()
+    sockets = []
+    for _ in range(connections):
+        websocket = CountingWebSocket()
+        await manager.connect(websocket, encoding)
+        for ticker in TICKERS:
+            manager.subscribe(websocket, ticker)
+        sockets.append(websocket)
+    await asyncio.sleep(0)  # flush the ticker-ID frames
+    for websocket in sockets:
+        websocket.frames = websocket.bytes = 0
+
+    cpu_started = time.process_time()
+    for i in range(updates):
+        ticker = TICKERS[i % len(TICKERS)]
+        price = 100.0 + (i % 1000) / 100
+        manager.record_price(ticker, price)
+        manager.broadcast_price_update(ticker, price)
+        await asyncio.sleep(0)  # let the writers send it, so nothing is coalesced
+    cpu_seconds = time.process_time() - cpu_started
+    single_bytes = sum(websocket.bytes for websocket in sockets) / sum(websocket.frames for websocket in sockets)
+
+    for websocket in sockets:
+        manager.set_batch_mode(websocket, True)
+        websocket.frames = websocket.bytes = 0
+    manager.broadcast_price_batch({ticker: manager.price_cache[ticker] for ticker in TICKERS[:batch]})
+    await asyncio.sleep(0)
+    batch_bytes = sockets[0].bytes / batch
+
+    for websocket in sockets:
+        manager.disconnect(websocket)
+    return {"single": single_bytes, "batch": batch_bytes, "cpu_ms": cpu_seconds * 1000}
+
+
+def encode_ms_per_10k(encoding: str) -> float:
+    """CPU time to serialize 10k single-price frames, without the manager around it."""
+    started = time.process_time()
+    for i in range(10_000):
+        price = 100.0 + (i % 1000) / 100
+        if encoding == wire_format.BINARY:
+            wire_format.encode_prices(12345.678, [(1 + i % 20, i, price)])
+        else:
+            json.dumps({"type": "price_update", "ticker": TICKERS[i % 20], "price": price,
+                        "seq": i, "timestamp": 12345.678})
+    return (time.process_time() - started) * 1000
+
+
+def run(updates: int, connections: int, batch: int) -> None:
+    print(f"{updates} updates to {connections} connection(s), batch of {batch} tickers\n")
+    print(f"{'encoding':8} {'bytes/update':>13} {'bytes/update (batch)':>21} "
+          f"{'encode ms/10k':>14} {'CPU ms/10k sent':>16}")
+    for encoding in wire_format.ENCODINGS:
+        result = asyncio.run(measure(encoding, updates, connections, batch))
+        per_10k = result["cpu_ms"] * 10_000 / (updates * connections)
+        print(f"{encoding:8} {result['single']:>13.1f} {result['batch']:>21.1f} "
+              f"{encode_ms_per_10k(encoding):>14.1f} {per_10k:>16.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=10_000)
+    parser.add_argument("--connections", type=int, default=1)
+    parser.add_argument("--batch", type=int, default=20)
+    args = parser.parse_args()
+    run(args.updates, args.connections, args.batch)
@@ -1,15 +1,32 @@
 """Pytest configuration and shared fixtures."""
+import os
+
+# The shared stock API client is created during app startup and requires a key
+os.environ.setdefault("API_KEY", "test-api-key")
+
 import pytest  # type: ignore
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import StaticPool
 from fastapi.testclient import TestClient
-from typing import Generator
+from typing import Dict, Generator, List
+
+import asyncio
+import json
 
-from app.database import get_db
+import httpx
+
+from app import websocket_manager, wire_format
+from app.api_client import api_client as api_client_module
+from app.api_client.api_client import StockAPIClient
+from app.api_client.rate_scheduler import QuotaScheduler
+from app.database import get_db, get_session_factory
+from app.exceptions import ExternalServiceError
 from app.main import app
 from app.models.model import Base, User, Portfolio, Stock, Transaction
 from app.security import hash_password
+from app.services.position_service import record_transaction
+from app.websocket_manager import ConnectionManager
 
 
 # Use in-memory SQLite database for testing
@@ -26,6 +43,36 @@ test_engine = create_engine(
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=test_engine)
 
 
+def daily_payload(ticker: str, close: str = "155.25") -> dict:
+    """Build a minimal Alpha Vantage TIME_SERIES_DAILY payload."""
+    return {
+        "Meta Data": {"2. Symbol": ticker, "3. Last Refreshed": "2024-01-05"},
+        "Time Series (Daily)": {
+            "2024-01-05": {
+                "1. open": "150.00",
+                "2. high": "156.00",
+                "3. low": "149.50",
+                "4. close": close,
+                "5. volume": "1000000",
+            },
+        },
+    }
+
+
+def quote_payload(ticker: str, price: str = "155.25") -> dict:
+    """Build an Alpha Vantage GLOBAL_QUOTE payload."""
+    return {
+        "Global Quote": {
+            "01. symbol": ticker,
+            "02. open": "150.0000",
+            "05. price": price,
+            "06. volume": "1000000",
+            "07. latest trading day": "2024-01-05",
+            "08. previous close": "150.0000",
+        },
+    }
+
+
 @pytest.fixture(scope="function")
 def db_session() -> Generator[Session, None, None]:
     """Create a fresh database session for each test."""
@@ -53,6 +100,7 @@ def client(db_session: Session) -> Generator[TestClient, None, None]:
             pass
     
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
     
     with TestClient(app) as test_client:
         yield test_client
@@ -130,6 +178,7 @@ def test_transaction_buy(
         price=150.0,
     )
     db_session.add(transaction)
+    record_transaction(db_session, transaction)
     db_session.commit()
     db_session.refresh(transaction)
     return transaction
@@ -149,3 +198,91 @@ def auth_headers(client: TestClient, test_user: User) -> dict:
     token = response.json()["access_token"]
     return {"Authorization": f"Bearer {token}"}
 
+
+
+@pytest.fixture
+def upstream_prices(monkeypatch) -> Dict[str, float]:
+    """Install a shared StockAPIClient whose upstream serves prices from this dict.
+
+    Tickers missing from the dict get an Alpha Vantage "Error Message" payload.
+    """
+    prices: Dict[str, float] = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        symbol = request.url.params.get("symbol", "").upper()
+        if symbol not in prices:
+            return httpx.Response(200, json={"Error Message": f"Invalid API call for {symbol}"})
+        if request.url.params.get("function") == "GLOBAL_QUOTE":
+            return httpx.Response(200, json=quote_payload(symbol, str(prices[symbol])))
+        return httpx.Response(200, json=daily_payload(symbol, str(prices[symbol])))
+
+    fake_client = StockAPIClient(
+        http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+        async_http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        scheduler=QuotaScheduler(per_minute=1000, per_day=100_000, daily_reserve=0),
+    )
+    monkeypatch.setattr(api_client_module, "_shared_client", fake_client)
+    return prices
+
+
+class FakeWebSocket:
+    """Records the frames sent to it; ``blocked`` makes sends hang until released."""
+
+    def __init__(self) -> None:
+        self.sent: List[dict] = []
+        self.blocked = asyncio.Event()
+        self.blocked.set()
+        self.closed_with = None
+
+    async def accept(self) -> None:
+        pass
+
+    async def send_text(self, message: str) -> None:
+        await self.blocked.wait()
+        self.sent.append(json.loads(message))
+
+    async def send_bytes(self, message: bytes) -> None:
+        await self.blocked.wait()
+        self.sent.append(wire_format.decode_frame(message))
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed_with = code
+
+
+class FakePriceClient:
+    """Stands in for StockAPIClient.get_current_price_async with per-ticker delays."""
+
+    def __init__(self, prices: Dict[str, float], delays: Dict[str, float] | None = None) -> None:
+        self.prices = prices
+        self.delays = delays or {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def get_current_price_async(self, ticker: str, priority=None) -> float:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delays.get(ticker, 0.01))
+            if ticker not in self.prices:
+                raise ExternalServiceError("Alpha Vantage", f"Invalid API call for {ticker}", "API_ERROR")
+            return self.prices[ticker]
+        finally:
+            self.in_flight -= 1
+
+    def background_capacity(self):
+        return None
+
+
+@pytest.fixture
+def price_client(monkeypatch) -> FakePriceClient:
+    fake = FakePriceClient({f"T{i}": float(i) for i in range(10)})
+    monkeypatch.setattr(websocket_manager, "get_stock_api_client", lambda: fake)
+    return fake
+
+
+async def connect(manager: ConnectionManager, *tickers: str, encoding: str = wire_format.JSON) -> FakeWebSocket:
+    websocket = FakeWebSocket()
+    await manager.connect(websocket, encoding)
+    for ticker in tickers:
+        manager.subscribe(websocket, ticker)
+    return websocket
@@ -0,0 +1,170 @@
+"""Tests for the vectorized multi-portfolio analytics engine."""
+from datetime import datetime
+
+import pytest  # type: ignore
+from sqlalchemy.orm import Session
+
+np = pytest.importorskip("numpy")
+
+from app.crud import update_portfolio  # noqa: E402
+from app.models.model import Portfolio, User  # noqa: E402
+from app.schemas.schemas import PortfolioUpdate  # noqa: E402
+from app.services.analytics_engine import (  # noqa: E402
+    PortfolioAnalyticsEngine, TransactionColumns, compute_positions,
+)
+from app.services.portfolio_service import PortfolioAnalytics  # noqa: E402
+from app.services.position_service import replay_positions  # noqa: E402
+from tests.test_portfolio_service import CountingPriceClient  # noqa: E402
+from tests.test_position_service import add, assert_same_positions  # noqa: E402
+
+
+def replayed(rows: list) -> dict:
+    """Expected open positions per portfolio, from the sequential replay."""
+    expected: dict = {}
+    for (portfolio_id, ticker), p in replay_positions(row[:5] for row in rows).items():
+        if p.quantity > 0:
+            expected.setdefault(portfolio_id, {})[ticker] = {
+                "quantity": p.quantity, "total_cost": p.total_cost, "average_cost": p.average_cost,
+            }
+    return expected
+
+
+def assert_matches_replay(actual: dict, rows: list) -> None:
+    expected = replayed(rows)
+    assert set(actual) == set(expected)
+    for portfolio_id, positions in expected.items():
+        assert_same_positions(actual[portfolio_id], positions)
+
+
+class TestComputePositions:
+    """Test cases for compute_positions against the sequential replay."""
+
+    def test_interleaved_buys_sells_and_resets(self):
+        """Test re-averaging after sells, sold-out resets and mixed-case tickers."""
+        day = datetime(2024, 1, 1)
+        rows = [
+            (1, "AAPL", "buy", 10, 100.0, day),
+            (1, "aapl", "sell", 4, 130.0, day),
+            (1, "AAPL", "buy", 6, 160.0, day),
+            (1, "MSFT", "buy", 5, 300.0, day),
+            (1, "MSFT", "sell", 5, 310.0, day),  # sold out: cost resets
+            (1, "MSFT", "buy", 2, 250.0, day),
+            (1, "AAPL", "sell", 3.5, 170.0, day),
+            (1, "TSLA", "buy", 1, 200.0, day),
+            (1, "TSLA", "sell", 2, 210.0, day),  # oversold: left out
+        ]
+
+        actual = compute_positions(TransactionColumns.from_rows(rows)).to_dict()
+
+        assert set(actual[1]) == {"AAPL", "MSFT"}
+        assert actual[1]["MSFT"] == {"quantity": 2.0, "total_cost": 500.0, "average_cost": 250.0}
+        assert_matches_replay(actual, rows)
+
+    def test_many_portfolios_random_histories(self):
+        """Test random histories over several portfolios match the replay."""
+        rng = np.random.default_rng(7)
+        held: dict = {}
+        rows = []
+        for _ in range(2000):
+            key = (int(rng.integers(1, 6)), f"T{int(rng.integers(0, 8))}")
+            if held.get(key, 0) > 0 and rng.random() < 0.4:
+                quantity = held[key] if rng.random() < 0.1 else round(held[key] * rng.uniform(0.1, 0.9), 2)
+                held[key] -= quantity
+                rows.append((*key, "sell", quantity, 1.0, datetime(2024, 1, 1)))
+            else:
+                quantity = float(rng.integers(1, 50))
+                held[key] = held.get(key, 0) + quantity
+                rows.append((*key, "buy", quantity, round(float(rng.uniform(5, 500)), 2), datetime(2024, 1, 1)))
+
+        assert_matches_replay(compute_positions(TransactionColumns.from_rows(rows)).to_dict(), rows)
+
+    def test_as_of_ignores_later_transactions(self):
+        """Test positions as of a date only count transactions executed by then."""
+        rows = [
+            (1, "AAPL", "buy", 10, 100.0, datetime(2024, 1, 1)),
+            (1, "AAPL", "sell", 10, 120.0, datetime(2024, 3, 1)),
+            (2, "MSFT", "buy", 4, 50.0, datetime(2024, 2, 1)),
+        ]
+        columns = TransactionColumns.from_rows(rows)
+
+        assert compute_positions(columns, as_of=datetime(2024, 1, 15)).to_dict() == {
+            1: {"AAPL": {"quantity": 10.0, "total_cost": 1000.0, "average_cost": 100.0}},
+        }
+        assert set(compute_positions(columns).to_dict()) == {2}
+        assert compute_positions(columns, as_of=datetime(2023, 1, 1)).to_dict() == {}
+
+
+class TestPortfolioAnalyticsEngine:
+    """Test cases for PortfolioAnalyticsEngine against PortfolioAnalytics."""
+
+    def test_analytics_match_service(self, db_session: Session, test_user: User):
+        """Test several portfolios in one call match the per-portfolio service and share price lookups."""
+        portfolios = [Portfolio(name=f"P{i}", user_id=test_user.id) for i in range(3)]
+        db_session.add_all(portfolios)
+        db_session.commit()
+        first, second, empty = portfolios
+        for kind, quantity, price, ticker in [
+            ("buy", 10, 100.0, "AAPL"), ("sell", 4, 120.0, "AAPL"), ("buy", 2, 90.0, "AAPL"), ("buy", 3, 40.0, "GONE"),
+        ]:
+            add(db_session, first, test_user, kind, quantity, price, ticker)
+        add(db_session, second, test_user, "buy", 5, 200.0, "AAPL")
+        add(db_session, second, test_user, "buy", 1, 300.0, "MSFT")
+        prices = {"AAPL": 110.0, "MSFT": 250.0}
+
+        engine = PortfolioAnalyticsEngine(db_session)
+        engine.api_client = CountingPriceClient(prices)
+        actual = engine.get_analytics([p.id for p in portfolios])
+
+        assert engine.api_client.calls == {"AAPL": 1, "MSFT": 1, "GONE": 1}
+        assert actual[first.id]["value"]["realized_gain_loss"] == 80.0
+        service = PortfolioAnalytics(db_session)
+        service.api_client = CountingPriceClient(prices)
+        for portfolio in (first, second):
+            assert actual[portfolio.id] == service.get_portfolio_analytics(portfolio.id)
+        assert actual[empty.id] == {
+            "value": {
+                "total_value": 0.0, "total_cost": 0.0, "total_gain_loss": 0.0, "gain_loss_percentage": 0.0,
+                "realized_gain_loss": 0.0,
+            },
+            "positions": [],
+        }
+        assert set(engine.get_positions([p.id for p in portfolios])) == {first.id, second.id}
+
+    @pytest.mark.parametrize("method", ["fifo", "lifo", "hifo", "specific"])
+    def test_lot_based_portfolios_match_service(self, db_session: Session, test_user: User, method):
+        """Test lot-based portfolios are valued on their lots next to an average-cost one."""
+        lots, average = Portfolio(name="Lots", user_id=test_user.id), Portfolio(name="Average", user_id=test_user.id)
+        db_session.add_all([lots, average])
+        db_session.commit()
+        update_portfolio(db_session, lots.id, PortfolioUpdate(cost_basis_method=method), test_user.id)
+        for portfolio in (lots, average):
+            add(db_session, portfolio, test_user, "buy", 10, 100.0, "AAPL")
+            add(db_session, portfolio, test_user, "buy", 10, 300.0, "AAPL")
+            add(db_session, portfolio, test_user, "sell", 5, 200.0, "AAPL")
+            add(db_session, portfolio, test_user, "buy", 2, 50.0, "MSFT")
+        prices = {"AAPL": 250.0, "MSFT": 60.0}
+
+        engine = PortfolioAnalyticsEngine(db_session)
+        engine.api_client = CountingPriceClient(prices)
+        actual = engine.get_analytics([lots.id, average.id])
+
+        service = PortfolioAnalytics(db_session)
+        service.api_client = CountingPriceClient(prices)
+        for portfolio in (lots, average):
+            assert actual[portfolio.id] == service.get_portfolio_analytics(portfolio.id)
+        assert actual[lots.id]["value"]["total_cost"] != actual[average.id]["value"]["total_cost"]
+
+    def test_lot_based_positions_as_of(self, db_session: Session, test_portfolio: Portfolio, test_user: User):
+        """Test lot-based positions as of a date replay the lots consumed by then."""
+        update_portfolio(db_session, test_portfolio.id, PortfolioUpdate(cost_basis_method="lifo"), test_user.id)
+        add(db_session, test_portfolio, test_user, "buy", 10, 100.0, "AAPL")
+        add(db_session, test_portfolio, test_user, "buy", 10, 300.0, "AAPL")
+        add(db_session, test_portfolio, test_user, "sell", 5, 200.0, "AAPL")
+        cutoff = datetime.now()
+        add(db_session, test_portfolio, test_user, "sell", 15, 200.0, "AAPL")
+
+        engine = PortfolioAnalyticsEngine(db_session)
+        assert engine.get_positions([test_portfolio.id]) == {}
+        assert engine.get_positions([test_portfolio.id], as_of=cutoff) == {
+            test_portfolio.id: {"AAPL": {"quantity": 15.0, "total_cost": 2500.0, "average_cost": 2500.0 / 15}},
+        }
@@ -0,0 +1,143 @@
+"""Tests for the Alpha Vantage stock API client."""
+import asyncio
+
+import httpx
+import pytest  # type: ignore
+
+from app.api_client import api_client as api_client_module
+from app.api_client.api_client import StockAPIClient, get_stock_api_client, close_stock_api_client
+from app.exceptions import ExternalServiceError
+from tests.conftest import daily_payload, quote_payload
+
+
+def make_client(handler) -> StockAPIClient:
+    """Create a client whose sync and async transports call the same handler."""
+    return StockAPIClient(
+        http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+        async_http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+
+
+class TestStockAPIClient:
+    """Test cases for StockAPIClient request handling."""
+
+    def test_get_current_price(self):
+        """Test the latest price is read from the single-quote endpoint."""
+        def handler(request: httpx.Request) -> httpx.Response:
+            assert request.url.params["function"] == "GLOBAL_QUOTE"
+            return httpx.Response(200, json=quote_payload("AAPL"))
+
+        client = make_client(handler)
+        assert client.get_current_price("AAPL") == 155.25
+
+    def test_quote_fields_trimmed(self):
+        """Test only the quote fields the client reads are kept after decoding."""
+        client = make_client(lambda request: httpx.Response(200, json=quote_payload("AAPL")))
+        payload = client.provider.request({"function": "GLOBAL_QUOTE", "symbol": "AAPL"})
+        assert set(payload["Global Quote"]) == {"01. symbol", "05. price", "07. latest trading day"}
+
+    def test_empty_quote_is_api_error(self):
+        """Test an empty quote for an unknown symbol raises API_ERROR."""
+        client = make_client(lambda request: httpx.Response(200, json={"Global Quote": {}}))
+        with pytest.raises(ExternalServiceError) as exc_info:
+            client.get_current_price("NOPE")
+        assert exc_info.value.error_code == "API_ERROR"
+
+    def test_daily_series_fallback(self):
+        """Test providers without a quote function are priced from the daily series."""
+        def handler(request: httpx.Request) -> httpx.Response:
+            assert request.url.params["function"] == "TIME_SERIES_DAILY"
+            return httpx.Response(200, json=daily_payload("AAPL"))
+
+        client = make_client(handler)
+        client.provider.supports_quote = False
+        assert client.get_current_price("AAPL") == 155.25
+
+    def test_series_listener_sees_daily_downloads(self):
+        """Test every daily series is handed to listeners unless the caller opts out."""
+        client = make_client(lambda request: httpx.Response(200, json=daily_payload("AAPL")))
+        client.provider.supports_quote = False
+        seen = []
+        client.add_series_listener(lambda ticker, payload: seen.append(ticker))
+
+        client.fetch_stock_data("AAPL", outputsize="full")
+        asyncio.run(client.fetch_stock_data_async("MSFT"))
+        client.fetch_stock_data("IBM", notify=False)
+        client.get_current_price("AAPL")
+        client._listener_executor.shutdown(wait=True)
+
+        assert seen == ["AAPL", "MSFT", "AAPL"]
+
+    def test_quote_provider_keeps_series_listener(self):
+        """Test daily downloads reach listeners even when prices come from the quote endpoint."""
+        client = make_client(lambda request: httpx.Response(200, json=daily_payload("AAPL")))
+        assert client.provider.supports_quote
+        seen = []
+        client.add_series_listener(lambda ticker, payload: seen.append(ticker))
+
+        client.fetch_stock_data("AAPL")
+        client._listener_executor.shutdown(wait=True)
+
+        assert seen == ["AAPL"]
+
+    def test_get_current_price_async(self):
+        """Test the async counterpart returns the same price."""
+        client = make_client(lambda request: httpx.Response(200, json=quote_payload("AAPL")))
+        assert asyncio.run(client.get_current_price_async("AAPL")) == 155.25
+
+    def test_search_stocks_async(self):
+        """Test search results are taken from bestMatches."""
+        matches = [{"1. symbol": "AAPL", "2. name": "Apple Inc."}]
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            assert request.url.params["function"] == "SYMBOL_SEARCH"
+            assert request.url.params["keywords"] == "apple"
+            return httpx.Response(200, json={"bestMatches": matches})
+
+        client = make_client(handler)
+        assert asyncio.run(client.search_stocks_async("apple")) == matches
+
+    def test_malformed_response(self):
+        """Test a payload without a time series raises MALFORMED_RESPONSE."""
+        client = make_client(lambda request: httpx.Response(200, json={"Meta Data": {}}))
+        with pytest.raises(ExternalServiceError) as exc_info:
+            client.get_current_price("AAPL")
+        assert exc_info.value.error_code == "MALFORMED_RESPONSE"
+
+    def test_rate_limit_note(self):
+        """Test the in-band rate limit note raises RATE_LIMIT."""
+        client = make_client(lambda request: httpx.Response(200, json={"Note": "Thank you for using"}))
+        with pytest.raises(ExternalServiceError) as exc_info:
+            asyncio.run(client.get_current_price_async("AAPL"))
+        assert exc_info.value.error_code == "RATE_LIMIT"
+
+    def test_timeout(self):
+        """Test transport timeouts are mapped to TIMEOUT."""
+        def handler(request: httpx.Request) -> httpx.Response:
+            raise httpx.ReadTimeout("timed out", request=request)
+
+        client = make_client(handler)
+        with pytest.raises(ExternalServiceError) as exc_info:
+            client.fetch_stock_data("AAPL")
+        assert exc_info.value.error_code == "TIMEOUT"
+
+    def test_http_error(self):
+        """Test non-2xx responses are mapped to HTTP_ERROR."""
+        client = make_client(lambda request: httpx.Response(503, text="unavailable"))
+        with pytest.raises(ExternalServiceError) as exc_info:
+            asyncio.run(client.fetch_stock_data_async("AAPL"))
+        assert exc_info.value.error_code == "HTTP_ERROR"
+
+
+class TestSharedClient:
+    """Test cases for the process-wide client instance."""
+
+    def test_shared_client_is_reused(self):
+        """Test get_stock_api_client returns one instance until closed."""
+        asyncio.run(close_stock_api_client())
+        first = get_stock_api_client()
+        assert get_stock_api_client() is first
+        asyncio.run(close_stock_api_client())
+        assert api_client_module._shared_client is None
+        assert get_stock_api_client() is not first
+        asyncio.run(close_stock_api_client())
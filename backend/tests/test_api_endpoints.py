@@ -1,8 +1,14 @@
 """Integration tests for API endpoints."""
+import time
+
 import pytest  # type: ignore
 from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
 
+from app.database import get_session_factory
+from app.main import app
 from app.models.model import Transaction
+from tests.conftest import TestingSessionLocal
 
 
 class TestTransactionEndpoints:
@@ -29,6 +35,28 @@ class TestTransactionEndpoints:
         assert data["quantity"] == 10.0
         assert data["price"] == 150.0
     
+    def test_follower_notify_failure_keeps_created_transaction(
+        self, client: TestClient, auth_headers: dict, test_portfolio, test_stock, db_session, monkeypatch
+    ):
+        """Test a failure pushing holdings to followers does not fail the committed transaction."""
+        def fail(portfolio_id):
+            raise RuntimeError("notify failed")
+
+        monkeypatch.setattr("app.routers.transactions.manager.follows_portfolio", fail)
+        response = client.post(
+            "/transactions/",
+            json={
+                "portfolio_id": test_portfolio.id,
+                "ticker_symbol": test_stock.ticker_symbol,
+                "transaction_type": "buy",
+                "quantity": 10.0,
+                "price": 150.0,
+            },
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+        assert db_session.query(Transaction).filter(Transaction.portfolio_id == test_portfolio.id).count() == 1
+
     def test_create_transaction_sell_success(
         self, client: TestClient, auth_headers: dict, test_portfolio, test_stock, test_transaction_buy
     ):
@@ -212,6 +240,21 @@ class TestPortfolioEndpoints:
         )
         assert response.status_code == 404
 
+    def test_portfolio_analytics_and_value(
+        self, client: TestClient, auth_headers: dict, test_portfolio, test_transaction_buy, upstream_prices: dict
+    ):
+        """Test /analytics and /value report the same totals."""
+        upstream_prices["AAPL"] = 160.0
+        analytics = client.get(f"/portfolios/{test_portfolio.id}/analytics", headers=auth_headers)
+        value = client.get(f"/portfolios/{test_portfolio.id}/value", headers=auth_headers)
+        assert analytics.status_code == 200 and value.status_code == 200
+        data = analytics.json()
+        assert data["value"] == value.json() == {
+            "total_value": 1600.0, "total_cost": 1500.0, "total_gain_loss": 100.0, "gain_loss_percentage": 6.67,
+            "realized_gain_loss": 0.0,
+        }
+        assert [position["ticker"] for position in data["positions"]] == ["AAPL"]
+
 
 class TestStockEndpoints:
     """Test stock API endpoints."""
@@ -232,6 +275,13 @@ class TestStockEndpoints:
         assert data["ticker_symbol"] == "TSLA"
         assert data["company_name"] == "Tesla Inc."
     
+    def test_client_stats_requires_auth(self, client: TestClient, auth_headers: dict):
+        """Test the stock API client counters are only shown to authenticated users."""
+        assert client.get("/api/stocks/client/stats").status_code == 401
+        response = client.get("/api/stocks/client/stats", headers=auth_headers)
+        assert response.status_code == 200
+        assert "symbol_search" in response.json()
+    
     def test_list_stocks(self, client: TestClient, auth_headers: dict, test_stock):
         """Test listing stocks."""
         response = client.get("/stocks/", headers=auth_headers)
@@ -251,3 +301,200 @@ class TestStockEndpoints:
         assert data["id"] == test_stock.id
         assert data["ticker_symbol"] == test_stock.ticker_symbol
 
+
+
+class TestStockPriceEndpoints:
+    """Test cases for public stock price endpoints."""
+
+    def test_get_stock_price(self, client: TestClient, upstream_prices: dict):
+        """Test fetching a single ticker price."""
+        upstream_prices["AAPL"] = 150.5
+        response = client.get("/api/stocks/AAPL/price")
+        assert response.status_code == 200
+        assert response.json() == {"ticker": "AAPL", "price": 150.5}
+
+    def test_batch_prices_get(self, client: TestClient, upstream_prices: dict):
+        """Test the batch endpoint dedupes tickers and reports per-ticker errors."""
+        upstream_prices.update({"AAPL": 150.0, "MSFT": 300.0})
+        response = client.get("/api/stocks/prices", params={"tickers": "aapl,MSFT,AAPL,,BOGUS"})
+        assert response.status_code == 200
+        prices = response.json()["prices"]
+        assert list(prices) == ["AAPL", "MSFT", "BOGUS"]
+        assert prices["AAPL"]["price"] == 150.0
+        assert prices["MSFT"]["price"] == 300.0
+        assert prices["BOGUS"]["price"] is None
+        assert prices["BOGUS"]["error_code"] == "API_ERROR"
+
+    def test_batch_prices_post(self, client: TestClient, upstream_prices: dict):
+        """Test the POST variant accepts tickers in the body."""
+        upstream_prices["GOOG"] = 140.0
+        response = client.post("/api/stocks/prices", json={"tickers": ["GOOG"]})
+        assert response.status_code == 200
+        assert response.json()["prices"]["GOOG"]["price"] == 140.0
+
+    def test_batch_prices_too_many(self, client: TestClient, upstream_prices: dict):
+        """Test requests above the ticker limit are rejected."""
+        tickers = [f"T{i}" for i in range(1000)]
+        response = client.post("/api/stocks/prices", json={"tickers": tickers})
+        assert response.status_code == 400
+
+
+class TestWebSocketPrices:
+    """Test cases for the /ws/prices endpoint."""
+
+    def test_ping_and_cached_price(self, client: TestClient):
+        """Test pong, configure, cached price on subscribe and resync replies."""
+        from app.websocket_manager import manager
+        manager.record_price("AAPL", 150.0)
+        seq = manager.sequences["AAPL"]
+        try:
+            with client.websocket_connect("/ws/prices") as websocket:
+                websocket.send_json({"type": "ping"})
+                assert websocket.receive_json() == {"type": "pong"}
+                websocket.send_json({"type": "configure", "batch": True})
+                assert websocket.receive_json() == {"type": "configured", "batch": True}
+                websocket.send_json({"type": "subscribe", "ticker": "aapl"})
+                assert websocket.receive_json() == {
+                    "type": "price_update", "ticker": "AAPL", "price": 150.0, "seq": seq, "cached": True,
+                }
+                websocket.send_json({"type": "resync"})
+                assert websocket.receive_json() == {
+                    "type": "snapshot", "prices": [{"ticker": "AAPL", "price": 150.0, "seq": seq}],
+                }
+        finally:
+            manager.price_cache.pop("AAPL", None)
+
+    def test_binary_encoding_negotiated(self, client: TestClient):
+        """Test ?encoding=binary sends ticker IDs and binary price frames, JSON control replies."""
+        from app import wire_format
+        from app.websocket_manager import manager
+        manager.record_price("MSFT", 410.5)
+        seq = manager.sequences["MSFT"]
+        try:
+            with client.websocket_connect("/ws/prices?encoding=binary") as websocket:
+                websocket.send_json({"type": "subscribe", "ticker": "MSFT"})
+                assert wire_format.decode_frame(websocket.receive_bytes()) == {
+                    "type": "ticker_ids", "tickers": {1: "MSFT"},
+                }
+                frame = wire_format.decode_frame(websocket.receive_bytes())
+                assert frame["prices"] == [(1, seq, 410.5)]
+                websocket.send_json({"type": "ping"})
+                assert websocket.receive_json() == {"type": "pong"}
+        finally:
+            manager.price_cache.pop("MSFT", None)
+
+    def test_heartbeat_replies_keep_client_past_timeout(self, client: TestClient, price_client, monkeypatch):
+        """Test a client answering heartbeats as the frontend does outlives the timeout, and a silent one is closed."""
+        from app.websocket_manager import manager
+        client.portal.call(manager.stop_broadcast_task)
+        monkeypatch.setattr(manager, "heartbeat_interval", 0.05)
+        monkeypatch.setattr(manager, "heartbeat_timeout", 0.3)
+        client.portal.call(manager.start_broadcast_task)
+
+        with client.websocket_connect("/ws/prices") as websocket:
+            websocket.send_json({"type": "configure", "batch": True})
+            assert websocket.receive_json()["type"] == "configured"
+            heartbeats = 0
+            started = time.monotonic()
+            while time.monotonic() - started < 3 * manager.heartbeat_timeout:
+                if websocket.receive_json()["type"] == "heartbeat":
+                    heartbeats += 1
+                    websocket.send_json({"type": "heartbeat"})
+            websocket.send_json({"type": "ping"})
+            while (frame := websocket.receive_json())["type"] == "heartbeat":
+                pass
+            assert frame == {"type": "pong"}
+            assert heartbeats >= 5
+
+        with client.websocket_connect("/ws/prices") as websocket:
+            with pytest.raises(WebSocketDisconnect) as exc_info:
+                while websocket.receive_json()["type"] == "heartbeat":
+                    pass
+            assert exc_info.value.code == 1001
+
+    def test_stats_require_auth(self, client: TestClient, auth_headers: dict):
+        """Test connection stats are only shown to authenticated users."""
+        assert client.get("/api/websocket/stats").status_code == 401
+        response = client.get("/api/websocket/stats?limit=5", headers=auth_headers)
+        assert response.status_code == 200
+        assert "heaviest_connections" in response.json()
+
+    def test_unknown_encoding_rejected(self, client: TestClient):
+        """Test an unsupported encoding closes the connection."""
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect("/ws/prices?encoding=xml") as websocket:
+                websocket.receive_json()
+
+    def test_subscribe_many(self, client: TestClient):
+        """Test a list of tickers is subscribed at once and cached prices come back in one frame."""
+        from app.websocket_manager import manager
+        manager.record_price("NVDA", 120.0)
+        try:
+            with client.websocket_connect("/ws/prices") as websocket:
+                websocket.send_json({"type": "subscribe_many", "tickers": ["nvda", "AMD", "NVDA"]})
+                reply = websocket.receive_json()
+                assert reply["type"] == "subscribed"
+                assert reply["tickers"] == ["NVDA", "AMD"]
+                assert [entry["ticker"] for entry in reply["prices"]] == ["NVDA"]
+        finally:
+            manager.price_cache.pop("NVDA", None)
+
+    def test_subscribe_portfolio_follows_transactions(
+        self, client: TestClient, auth_headers: dict, test_portfolio, test_transaction_buy
+    ):
+        """Test subscribe_portfolio subscribes to holdings and follows new transactions."""
+        token = auth_headers["Authorization"].split()[1]
+        with client.websocket_connect(f"/ws/prices?token={token}") as websocket:
+            websocket.send_json({"type": "subscribe_portfolio", "portfolio_id": test_portfolio.id})
+            reply = websocket.receive_json()
+            assert reply["type"] == "portfolio_subscribed"
+            assert reply["tickers"] == ["AAPL"]
+            assert reply["value"]["total_cost"] == 1500.0
+
+            response = client.post(
+                "/transactions/",
+                json={
+                    "portfolio_id": test_portfolio.id, "ticker_symbol": "MSFT",
+                    "transaction_type": "buy", "quantity": 1, "price": 400.0,
+                },
+                headers=auth_headers,
+            )
+            assert response.status_code == 200
+            update = websocket.receive_json()
+            assert update["type"] == "portfolio_holdings"
+            assert update["tickers"] == ["AAPL", "MSFT"]
+            assert update["value"]["total_cost"] == 1900.0
+
+    def test_subscribe_portfolio_requires_ownership(
+        self, client: TestClient, test_user2, test_portfolio
+    ):
+        """Test another user's portfolio cannot be followed."""
+        login = client.post("/auth/login", data={"username": test_user2.username, "password": "testpassword123"})
+        token = login.json()["access_token"]
+        with client.websocket_connect("/ws/prices") as websocket:
+            websocket.send_json({"type": "subscribe_portfolio", "portfolio_id": test_portfolio.id, "token": token})
+            assert websocket.receive_json() == {
+                "type": "error", "portfolio_id": test_portfolio.id, "message": "Portfolio not found",
+            }
+            websocket.send_json({"type": "subscribe_portfolio", "portfolio_id": test_portfolio.id, "token": "bad"})
+            assert websocket.receive_json()["type"] == "error"
+
+    def test_subscribe_portfolio_session_per_message(
+        self, client: TestClient, auth_headers: dict, test_portfolio, test_transaction_buy
+    ):
+        """Test each subscribe_portfolio message opens a database session and closes it before replying."""
+        sessions = []
+
+        def make_session():
+            session = TestingSessionLocal()
+            sessions.append(session)
+            return session
+
+        app.dependency_overrides[get_session_factory] = lambda: make_session
+        token = auth_headers["Authorization"].split()[1]
+        with client.websocket_connect(f"/ws/prices?token={token}") as websocket:
+            for _ in range(2):
+                websocket.send_json({"type": "subscribe_portfolio", "portfolio_id": test_portfolio.id})
+                assert websocket.receive_json()["type"] == "portfolio_subscribed"
+                assert not sessions[-1].in_transaction()
+        assert len(sessions) == 2
@@ -0,0 +1,169 @@
+"""Tests for negative caching of failing tickers and the provider circuit breaker."""
+import asyncio
+
+import httpx
+import pytest  # type: ignore
+
+from app.api_client.api_client import StockAPIClient
+from app.api_client.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from app.api_client.negative_cache import NegativeCache
+from app.api_client.quote_cache import QuoteCache
+from app.api_client.rate_scheduler import Priority, QuotaScheduler
+from app.exceptions import ExternalServiceError
+from tests.conftest import quote_payload
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def timeout_error() -> ExternalServiceError:
+    return ExternalServiceError("Alpha Vantage", "Request timed out", "TIMEOUT")
+
+
+class TestNegativeCache:
+    """Test cases for NegativeCache backoff."""
+
+    def test_backoff_doubles_until_max(self):
+        """Test each failure doubles the backoff, capped at the maximum."""
+        clock = FakeClock()
+        cache = NegativeCache(base_seconds=10, max_seconds=25, clock=clock)
+        error = ExternalServiceError("Alpha Vantage", "Invalid API call", "API_ERROR")
+
+        cache.record_failure("zzzz", error)
+        assert cache.check("ZZZZ").error_code == "API_ERROR"
+        clock.now = 10
+        assert cache.check("ZZZZ") is None
+
+        cache.record_failure("ZZZZ", error)
+        clock.now = 29
+        assert cache.check("ZZZZ") is not None
+        clock.now = 30
+        cache.record_failure("ZZZZ", error)
+        clock.now = 54
+        assert cache.check("ZZZZ") is not None
+        clock.now = 55
+        assert cache.check("ZZZZ") is None
+
+    def test_transport_errors_not_cached(self):
+        """Test provider-wide failures are not blamed on the ticker."""
+        cache = NegativeCache()
+        cache.record_failure("AAPL", timeout_error())
+        assert cache.check("AAPL") is None
+
+    def test_success_clears(self):
+        """Test a successful lookup clears the entry."""
+        cache = NegativeCache()
+        cache.record_failure("AAPL", ExternalServiceError("Alpha Vantage", "bad", "MALFORMED_RESPONSE"))
+        cache.record_success("AAPL")
+        assert cache.check("AAPL") is None
+
+
+class TestCircuitBreaker:
+    """Test cases for CircuitBreaker state transitions."""
+
+    def test_opens_after_threshold(self):
+        """Test consecutive transport failures open the breaker."""
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30, clock=FakeClock())
+        breaker.record_failure(timeout_error())
+        assert breaker.state == CLOSED
+        breaker.record_failure(timeout_error())
+        assert breaker.state == OPEN
+        with pytest.raises(ExternalServiceError) as exc_info:
+            breaker.before_request()
+        assert exc_info.value.error_code == "CIRCUIT_OPEN"
+
+    def test_other_errors_reset_count(self):
+        """Test a non-transport answer proves the provider is reachable."""
+        breaker = CircuitBreaker(failure_threshold=2, clock=FakeClock())
+        breaker.record_failure(timeout_error())
+        breaker.record_failure(ExternalServiceError("Alpha Vantage", "bad symbol", "API_ERROR"))
+        breaker.record_failure(timeout_error())
+        assert breaker.state == CLOSED
+
+    def test_half_open_single_probe(self):
+        """Test one probe is allowed after the reset period and decides the state."""
+        clock = FakeClock()
+        breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30, clock=clock)
+        breaker.record_failure(timeout_error())
+        clock.now = 30
+        assert breaker.state == HALF_OPEN
+        breaker.before_request()
+        with pytest.raises(ExternalServiceError):
+            breaker.before_request()
+
+        breaker.record_failure(timeout_error())
+        assert breaker.state == OPEN
+        clock.now = 60
+        breaker.before_request()
+        breaker.record_success()
+        assert breaker.state == CLOSED
+
+
+class TestClientFailureHandling:
+    """Test cases for StockAPIClient fail-fast behaviour."""
+
+    def test_bad_ticker_not_retried(self):
+        """Test an unknown ticker is not requested again while backing off."""
+        calls = 0
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            return httpx.Response(200, json={"Error Message": "Invalid API call"})
+
+        client = StockAPIClient(http_client=httpx.Client(transport=httpx.MockTransport(handler)))
+        for _ in range(3):
+            with pytest.raises(ExternalServiceError) as exc_info:
+                client.get_current_price("NOPE")
+            assert exc_info.value.error_code == "API_ERROR"
+        assert calls == 1
+        assert client.stats()["negative_cache"]["hits"] == 2
+
+    def test_open_breaker_fails_fast_with_last_known_price(self):
+        """Test an open breaker skips the provider and serves cached prices."""
+        calls = 0
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            raise httpx.ConnectError("refused", request=request)
+
+        cache = QuoteCache(ttl_seconds=0, stale_ttl_seconds=0)
+        cache.set("AAPL", 99.0)
+        transport = httpx.MockTransport(handler)
+        client = StockAPIClient(
+            http_client=httpx.Client(transport=transport),
+            async_http_client=httpx.AsyncClient(transport=transport),
+            quote_cache=cache,
+            scheduler=QuotaScheduler(per_minute=1000, per_day=100_000, daily_reserve=0),
+            breaker=CircuitBreaker(failure_threshold=2, reset_seconds=60),
+        )
+        for ticker in ("MSFT", "GOOG"):
+            with pytest.raises(ExternalServiceError):
+                asyncio.run(client.get_current_price_async(ticker))
+        assert calls == 2
+
+        with pytest.raises(ExternalServiceError) as exc_info:
+            asyncio.run(client.get_current_price_async("TSLA"))
+        assert exc_info.value.error_code == "CIRCUIT_OPEN"
+        assert asyncio.run(client.get_current_price_async("AAPL")) == 99.0
+        assert calls == 2
+
+    def test_quota_rejection_keeps_breaker_closed(self):
+        """Test local quota rejections do not count as provider failures."""
+        client = StockAPIClient(
+            http_client=httpx.Client(transport=httpx.MockTransport(
+                lambda request: httpx.Response(200, json=quote_payload("AAPL"))
+            )),
+            scheduler=QuotaScheduler(per_minute=0, per_day=100, daily_reserve=0,
+                                     max_wait_seconds={priority: 0.0 for priority in Priority}),
+            breaker=CircuitBreaker(failure_threshold=1),
+        )
+        with pytest.raises(ExternalServiceError):
+            client.get_current_price("AAPL")
+        assert client.breaker.state == CLOSED
@@ -0,0 +1,250 @@
+"""Tests for lot-based cost basis methods and realized gains."""
+import random
+from datetime import datetime
+
+import pytest  # type: ignore
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.crud import create_transaction, delete_transaction, update_portfolio, update_transaction
+from app.models.model import Lot, Portfolio, Position, User
+from app.schemas.schemas import PortfolioUpdate, TransactionCreate, TransactionUpdate
+from app.services.lot_service import LotBook
+from app.services.portfolio_service import PortfolioAnalytics
+from app.portfolio_valuation import PortfolioValuations
+from app.services.position_service import aggregate_positions, load_positions, rebuild_positions
+from tests.test_portfolio_service import CountingPriceClient
+
+
+def lot(transaction_id: int, quantity: float, price: float) -> Lot:
+    return Lot(transaction_id=transaction_id, quantity=quantity, price=price, acquired_at=datetime(2024, 1, 1))
+
+
+def trade(db: Session, portfolio: Portfolio, user: User, kind: str, quantity: float, price: float,
+          ticker: str = "AAPL", lot_id: int | None = None):
+    return create_transaction(
+        db,
+        TransactionCreate(
+            portfolio_id=portfolio.id, ticker_symbol=ticker, transaction_type=kind, quantity=quantity, price=price,
+            lot_id=lot_id,
+        ),
+        user.id,
+    )
+
+
+def snapshot(db: Session, portfolio: Portfolio) -> tuple:
+    positions = {
+        p.ticker_symbol: (p.quantity, p.total_cost, p.realized_gain)
+        for p in db.query(Position).filter(Position.portfolio_id == portfolio.id)
+    }
+    lots = sorted(
+        (l.ticker_symbol, l.transaction_id, l.quantity, l.price)
+        for l in db.query(Lot).filter(Lot.portfolio_id == portfolio.id)
+    )
+    return positions, lots
+
+
+def use_method(db: Session, portfolio: Portfolio, method: str) -> None:
+    portfolio.cost_basis_method = method
+    db.commit()
+
+
+class TestLotBook:
+    """Test cases for the in-memory lot order of each method."""
+
+    @pytest.mark.parametrize("method, cost, left", [
+        ("fifo", 10 * 10.0 + 5 * 30.0, [(2, 5.0), (3, 10.0)]),
+        ("lifo", 10 * 20.0 + 5 * 30.0, [(1, 10.0), (2, 5.0)]),
+        ("hifo", 10 * 30.0 + 5 * 20.0, [(1, 10.0), (3, 5.0)]),
+    ])
+    def test_sell_order(self, method, cost, left):
+        """Test each method consumes lots in its order and realizes against their prices."""
+        book = LotBook(method)
+        for transaction_id, price in [(1, 10.0), (2, 30.0), (3, 20.0)]:
+            book.buy(lot(transaction_id, 10, price))
+
+        assert book.sell(15, 40.0) == (pytest.approx(cost), pytest.approx(15 * 40.0 - cost))
+        assert sorted((l.transaction_id, l.quantity) for l in book.open_lots()) == left
+
+    def test_specific_named_lot_then_oldest(self):
+        """Test a specific-identification sell takes the named lot first, then the oldest."""
+        book = LotBook("specific")
+        for transaction_id, price in [(1, 10.0), (2, 20.0), (3, 30.0)]:
+            book.buy(lot(transaction_id, 10, price))
+
+        assert book.sell(12, 50.0, lot_id=2) == (pytest.approx(10 * 20.0 + 2 * 10.0), pytest.approx(12 * 50.0 - 220.0))
+        assert book.sell(8, 50.0) == (pytest.approx(80.0), pytest.approx(320.0))
+        assert [(l.transaction_id, l.quantity) for l in book.open_lots()] == [(3, 10.0)]
+
+    def test_sell_stops_at_first_lot_not_used_up(self):
+        """Test a sell only reaches the lots it consumes."""
+        book = LotBook("fifo")
+        lots = [lot(i, 1, 10.0) for i in range(1000)]
+        for open_lot in lots:
+            book.buy(open_lot)
+
+        book.sell(2.5, 11.0)
+
+        assert [l.quantity for l in lots[:4]] == [0.0, 0.0, 0.5, 1.0]
+        assert len(book.open_lots()) == 998
+
+
+class TestLotPositions:
+    """Test cases for positions and lots maintained under lot-based methods."""
+
+    def test_fifo_realized_and_unrealized(self, db_session: Session, test_portfolio: Portfolio, test_user: User):
+        """Test FIFO cost basis, realized gains and the value reported for the portfolio."""
+        use_method(db_session, test_portfolio, "fifo")
+        trade(db_session, test_portfolio, test_user, "buy", 10, 100.0)
+        trade(db_session, test_portfolio, test_user, "buy", 10, 200.0)
+        trade(db_session, test_portfolio, test_user, "sell", 15, 250.0)
+
+        positions, lots = snapshot(db_session, test_portfolio)
+        assert positions == {"AAPL": (5.0, 1000.0, pytest.approx(15 * 250.0 - 2000.0))}
+        assert [(quantity, price) for _, _, quantity, price in lots] == [(5.0, 200.0)]
+
+        service = PortfolioAnalytics(db_session)
+        service.api_client = CountingPriceClient({"AAPL": 300.0})
+        assert service.get_portfolio_value(test_portfolio.id) == {
+            "total_value": 1500.0, "total_cost": 1000.0, "total_gain_loss": 500.0, "gain_loss_percentage": 50.0,
+            "realized_gain_loss": 1750.0,
+        }
+
+    def test_specific_lot_and_sold_out_reset(self, db_session: Session, test_portfolio: Portfolio, test_user: User):
+        """Test a sell naming its lot, and that selling out drops every lot."""
+        use_method(db_session, test_portfolio, "specific")
+        first = trade(db_session, test_portfolio, test_user, "buy", 10, 100.0)
+        second = trade(db_session, test_portfolio, test_user, "buy", 10, 300.0)
+        trade(db_session, test_portfolio, test_user, "sell", 10, 200.0, lot_id=second.id)
+
+        positions, lots = snapshot(db_session, test_portfolio)
+        assert positions == {"AAPL": (10.0, 1000.0, -1000.0)}
+        assert [transaction_id for _, transaction_id, _, _ in lots] == [first.id]
+
+        trade(db_session, test_portfolio, test_user, "sell", 12, 150.0)
+        positions, lots = snapshot(db_session, test_portfolio)
+        assert positions == {"AAPL": (-2.0, 0.0, -500.0)}
+        assert lots == []
+
+    @pytest.mark.parametrize("method", ["average", "fifo", "lifo", "hifo", "specific"])
+    def test_incremental_matches_rebuild(self, db_session: Session, test_portfolio: Portfolio, test_user: User, method):
+        """Test positions and lots kept per transaction equal a replay of the whole history."""
+        use_method(db_session, test_portfolio, method)
+        rng = random.Random(5)
+        held = {"AAPL": 0.0, "MSFT": 0.0}
+        for _ in range(60):
+            ticker = rng.choice(["AAPL", "MSFT"])
+            price = round(rng.uniform(50, 150), 2)
+            if held[ticker] > 0 and rng.random() < 0.4:
+                quantity = round(held[ticker] * rng.choice([1.0, rng.uniform(0.1, 0.9)]), 2)
+                if quantity <= 0:
+                    continue
+                open_lots = sorted(
+                    l.transaction_id for l in db_session.query(Lot).filter(Lot.ticker_symbol == ticker, Lot.quantity > 0)
+                )
+                lot_id = rng.choice(open_lots) if method == "specific" and open_lots else None
+                trade(db_session, test_portfolio, test_user, "sell", quantity, price, ticker, lot_id=lot_id)
+                held[ticker] -= quantity
+            else:
+                quantity = float(rng.randint(1, 20))
+                trade(db_session, test_portfolio, test_user, "buy", quantity, price, ticker)
+                held[ticker] += quantity
+        incremental = snapshot(db_session, test_portfolio)
+
+        rebuild_positions(db_session, test_portfolio.id)
+        db_session.commit()
+        positions, lots = snapshot(db_session, test_portfolio)
+
+        assert set(positions) == set(incremental[0])
+        for ticker, values in incremental[0].items():
+            assert positions[ticker] == pytest.approx(values)
+        assert [l[:2] for l in lots] == [l[:2] for l in incremental[1]]
+        assert [l[2:] for l in lots] == pytest.approx([l[2:] for l in incremental[1]])
+        if method == "average":
+            assert lots == []
+
+    def test_method_change_and_delete_replay(self, db_session: Session, test_portfolio: Portfolio, test_user: User):
+        """Test switching methods and deleting a buy replay the history."""
+        first = trade(db_session, test_portfolio, test_user, "buy", 10, 100.0)
+        trade(db_session, test_portfolio, test_user, "buy", 10, 200.0)
+        trade(db_session, test_portfolio, test_user, "sell", 10, 300.0)
+        assert snapshot(db_session, test_portfolio)[0] == {"AAPL": (10.0, 1500.0, 1500.0)}
+
+        update_portfolio(db_session, test_portfolio.id, PortfolioUpdate(cost_basis_method="lifo"), test_user.id)
+        assert snapshot(db_session, test_portfolio)[0] == {"AAPL": (10.0, 1000.0, 1000.0)}
+
+        delete_transaction(db_session, first.id, test_user.id)
+        positions, lots = snapshot(db_session, test_portfolio)
+        assert positions == {"AAPL": (0.0, 0.0, 1000.0)}
+        assert lots == []
+
+    def test_lot_id_rejected_unless_open_specific_lot(
+        self, db_session: Session, test_portfolio: Portfolio, test_user: User
+    ):
+        """Test lot_id is refused outside specific-identification sells of an open lot of the same holding."""
+        buy = trade(db_session, test_portfolio, test_user, "buy", 10, 100.0)
+        other = trade(db_session, test_portfolio, test_user, "buy", 10, 100.0, "MSFT")
+        with pytest.raises(HTTPException) as exc_info:
+            trade(db_session, test_portfolio, test_user, "sell", 1, 120.0, lot_id=buy.id)
+        assert exc_info.value.status_code == 400
+
+        update_portfolio(db_session, test_portfolio.id, PortfolioUpdate(cost_basis_method="specific"), test_user.id)
+        for kind, ticker, lot_id in [("buy", "AAPL", buy.id), ("sell", "AAPL", other.id), ("sell", "AAPL", 9999)]:
+            with pytest.raises(HTTPException) as exc_info:
+                trade(db_session, test_portfolio, test_user, kind, 1, 120.0, ticker, lot_id=lot_id)
+            assert exc_info.value.status_code == 400
+
+        sell = trade(db_session, test_portfolio, test_user, "sell", 10, 120.0, lot_id=buy.id)
+        trade(db_session, test_portfolio, test_user, "buy", 5, 100.0)
+        with pytest.raises(HTTPException) as exc_info:
+            trade(db_session, test_portfolio, test_user, "sell", 1, 120.0, lot_id=buy.id)
+        assert exc_info.value.status_code == 400
+        # The sell that used the lot up may still be edited
+        update_transaction(db_session, sell.id, TransactionUpdate(price=130.0), test_user.id)
+        assert snapshot(db_session, test_portfolio)[0]["AAPL"][2] == pytest.approx(300.0)
+
+    def test_deleting_named_buy_clears_lot_id(self, db_session: Session, test_portfolio: Portfolio, test_user: User):
+        """Test a sell naming a deleted buy falls back to the method's default order."""
+        use_method(db_session, test_portfolio, "specific")
+        trade(db_session, test_portfolio, test_user, "buy", 10, 100.0)
+        named = trade(db_session, test_portfolio, test_user, "buy", 10, 200.0)
+        sell = trade(db_session, test_portfolio, test_user, "sell", 5, 300.0, lot_id=named.id)
+
+        delete_transaction(db_session, named.id, test_user.id)
+
+        db_session.refresh(sell)
+        assert sell.lot_id is None
+        assert snapshot(db_session, test_portfolio)[0] == {"AAPL": (5.0, 500.0, 1000.0)}
+
+    def test_clearing_lot_id_restores_default_order(self, db_session: Session, test_portfolio: Portfolio, test_user: User):
+        """Test an explicit null lot_id on update drops the named lot, while an unrelated edit keeps it."""
+        use_method(db_session, test_portfolio, "specific")
+        trade(db_session, test_portfolio, test_user, "buy", 10, 100.0)
+        named = trade(db_session, test_portfolio, test_user, "buy", 10, 200.0)
+        sell = trade(db_session, test_portfolio, test_user, "sell", 5, 300.0, lot_id=named.id)
+
+        update_transaction(db_session, sell.id, TransactionUpdate(price=310.0), test_user.id)
+        assert sell.lot_id == named.id
+        assert snapshot(db_session, test_portfolio)[0] == {"AAPL": (15.0, 2000.0, 550.0)}
+
+        update_transaction(db_session, sell.id, TransactionUpdate.model_validate({"lot_id": None}), test_user.id)
+        assert sell.lot_id is None
+        assert snapshot(db_session, test_portfolio)[0] == {"AAPL": (15.0, 2500.0, 1050.0)}
+
+    @pytest.mark.parametrize("method", ["fifo", "lifo", "hifo"])
+    def test_every_source_reports_lot_cost_basis(
+        self, db_session: Session, test_portfolio: Portfolio, test_user: User, method
+    ):
+        """Test the SQL aggregate and the WebSocket valuation use the same lot cost basis as the table."""
+        use_method(db_session, test_portfolio, method)
+        for kind, quantity, price in [("buy", 10, 100.0), ("buy", 10, 300.0), ("sell", 5, 200.0), ("buy", 5, 200.0)]:
+            trade(db_session, test_portfolio, test_user, kind, quantity, price)
+
+        table = load_positions(db_session, test_portfolio.id)
+        assert aggregate_positions(db_session, test_portfolio.id) == table
+
+        service = PortfolioAnalytics(db_session)
+        service.api_client = CountingPriceClient({"AAPL": 250.0})
+        value = service.get_portfolio_value(test_portfolio.id)
+        value.pop("realized_gain_loss")
+        assert PortfolioValuations().track(test_portfolio.id, table, {"AAPL": 250.0}) == value
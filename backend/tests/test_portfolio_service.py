@@ -0,0 +1,70 @@
+"""Tests for portfolio analytics computed from positions and current prices."""
+from collections import Counter
+
+from sqlalchemy.orm import Session
+
+from app.crud import create_transaction
+from app.exceptions import ExternalServiceError
+from app.models.model import Portfolio, User
+from app.schemas.schemas import TransactionCreate
+from app.services.portfolio_service import PortfolioAnalytics
+
+
+class CountingPriceClient:
+    """Serves prices from a dict and counts lookups; unknown tickers fail."""
+
+    def __init__(self, prices: dict) -> None:
+        self.prices = prices
+        self.calls: Counter = Counter()
+
+    def get_current_price(self, ticker: str, priority=None) -> float:
+        self.calls[ticker] += 1
+        if ticker not in self.prices:
+            raise ExternalServiceError("Alpha Vantage", f"Invalid API call for {ticker}", "API_ERROR")
+        return self.prices[ticker]
+
+
+def buy(db: Session, portfolio: Portfolio, user: User, ticker: str, quantity: float, price: float) -> None:
+    create_transaction(
+        db,
+        TransactionCreate(
+            portfolio_id=portfolio.id, ticker_symbol=ticker, transaction_type="buy", quantity=quantity, price=price
+        ),
+        user.id,
+    )
+
+
+class TestPortfolioAnalytics:
+    """Test cases for PortfolioAnalytics.get_portfolio_analytics."""
+
+    def test_one_price_lookup_per_ticker(self, db_session: Session, test_portfolio: Portfolio, test_user: User):
+        """Test value and positions share one lookup per ticker, including failed ones."""
+        buy(db_session, test_portfolio, test_user, "AAPL", 10, 100.0)
+        buy(db_session, test_portfolio, test_user, "MSFT", 2, 300.0)
+        buy(db_session, test_portfolio, test_user, "GONE", 1, 50.0)
+        service = PortfolioAnalytics(db_session)
+        service.api_client = CountingPriceClient({"AAPL": 110.0, "MSFT": 250.0})
+
+        analytics = service.get_portfolio_analytics(test_portfolio.id)
+
+        assert service.api_client.calls == {"AAPL": 1, "MSFT": 1, "GONE": 1}
+        assert analytics["value"] == {
+            "total_value": 1650.0, "total_cost": 1650.0, "total_gain_loss": 0.0, "gain_loss_percentage": 0.0,
+            "realized_gain_loss": 0.0,
+        }
+        assert [(p["ticker"], p["current_price"], p["gain_loss"]) for p in analytics["positions"]] == [
+            ("AAPL", 110.0, 100.0), ("MSFT", 250.0, -100.0), ("GONE", 50.0, 0.0),
+        ]
+
+    def test_views_reuse_given_prices(self, db_session: Session, test_portfolio: Portfolio, test_user: User):
+        """Test get_portfolio_value and get_stock_positions use and fill current_prices."""
+        buy(db_session, test_portfolio, test_user, "AAPL", 10, 100.0)
+        buy(db_session, test_portfolio, test_user, "MSFT", 1, 200.0)
+        service = PortfolioAnalytics(db_session)
+        service.api_client = CountingPriceClient({"AAPL": 120.0, "MSFT": 200.0})
+        prices = {"AAPL": 105.0}
+
+        assert service.get_portfolio_value(test_portfolio.id, prices)["total_value"] == 1250.0
+        assert prices == {"AAPL": 105.0, "MSFT": 200.0}
+        assert [p["ticker"] for p in service.get_stock_positions(test_portfolio.id, prices)] == ["AAPL", "MSFT"]
+        assert service.api_client.calls == {"MSFT": 1}
@@ -0,0 +1,44 @@
+"""Tests for incrementally maintained portfolio valuations."""
+from app.portfolio_valuation import PortfolioValuations, value_summary
+
+
+def position(quantity: float, average_cost: float) -> dict:
+    return {"quantity": quantity, "total_cost": quantity * average_cost, "average_cost": average_cost}
+
+
+class TestPortfolioValuations:
+    """Test cases for PortfolioValuations."""
+
+    def test_initial_value_uses_prices_or_average_cost(self):
+        """Test tracking values holdings at known prices and falls back to average cost."""
+        valuations = PortfolioValuations()
+        value = valuations.track(1, {"aapl": position(10, 150.0), "MSFT": position(2, 300.0)}, {"AAPL": 160.0})
+        assert value == {"total_value": 2200.0, "total_cost": 2100.0,
+                         "total_gain_loss": 100.0, "gain_loss_percentage": 4.76}
+        assert 1 in valuations
+
+    def test_tick_moves_only_holding_portfolios(self):
+        """Test a price tick adds quantity times the price change to portfolios holding the ticker."""
+        valuations = PortfolioValuations()
+        valuations.track(1, {"AAPL": position(10, 150.0)}, {"AAPL": 150.0})
+        valuations.track(2, {"MSFT": position(1, 300.0)}, {})
+        assert valuations.apply_price("aapl", 155.0) == [1]
+        assert valuations.apply_price("AAPL", 155.0) == []
+        assert valuations.apply_price("TSLA", 200.0) == []
+        assert valuations.value(1)["total_value"] == 1550.0
+        assert valuations.value(2)["total_value"] == 300.0
+
+    def test_retrack_and_untrack_update_index(self):
+        """Test new holdings replace the old ones in the ticker index."""
+        valuations = PortfolioValuations()
+        valuations.track(1, {"AAPL": position(1, 100.0)}, {})
+        valuations.track(1, {"MSFT": position(1, 100.0)}, {})
+        assert valuations.apply_price("AAPL", 120.0) == []
+        assert valuations.apply_price("MSFT", 120.0) == [1]
+        valuations.untrack(1)
+        assert valuations.apply_price("MSFT", 130.0) == []
+        assert valuations.value(1) is None and len(valuations) == 0
+
+    def test_empty_portfolio(self):
+        """Test a portfolio without cost reports a zero percentage."""
+        assert value_summary(0.0, 0.0)["gain_loss_percentage"] == 0.0
@@ -0,0 +1,143 @@
+"""Tests for the positions table kept in step with transaction CRUD."""
+import pytest  # type: ignore
+from sqlalchemy.orm import Session
+
+from app.crud import create_transaction, update_transaction, delete_transaction
+from app.models.model import Portfolio, Position, Transaction, User
+from app.schemas.schemas import TransactionCreate, TransactionUpdate
+from app.services.portfolio_service import PortfolioAnalytics
+from app.services.position_service import aggregate_positions, backfill_positions, load_positions, rebuild_positions
+
+
+def add(db: Session, portfolio: Portfolio, user: User, kind: str, quantity: float, price: float, ticker: str = "AAPL"):
+    return create_transaction(
+        db,
+        TransactionCreate(
+            portfolio_id=portfolio.id, ticker_symbol=ticker, transaction_type=kind, quantity=quantity, price=price
+        ),
+        user.id,
+    )
+
+
+def positions(db: Session, portfolio: Portfolio) -> dict:
+    return PortfolioAnalytics(db).get_portfolio_positions(portfolio.id)
+
+
+def assert_same_positions(actual: dict, expected: dict) -> None:
+    assert set(actual) == set(expected)
+    for ticker, position in expected.items():
+        assert actual[ticker] == pytest.approx(position)
+
+
+class TestPositionMaintenance:
+    """Test cases for positions updated by create/update/delete_transaction."""
+
+    def test_create_applies_average_cost(self, db_session: Session, test_portfolio: Portfolio, test_user: User):
+        """Test buys re-average the cost and sells keep it."""
+        add(db_session, test_portfolio, test_user, "buy", 10, 100.0)
+        add(db_session, test_portfolio, test_user, "buy", 10, 200.0)
+        add(db_session, test_portfolio, test_user, "sell", 5, 300.0)
+        add(db_session, test_portfolio, test_user, "buy", 1, 10.0, ticker="msft")
+
+        assert positions(db_session, test_portfolio) == {
+            "AAPL": {"quantity": 15.0, "total_cost": 2250.0, "average_cost": 150.0},
+            "MSFT": {"quantity": 1.0, "total_cost": 10.0, "average_cost": 10.0},
+        }
+        position = db_session.query(Position).filter(Position.ticker_symbol == "AAPL").one()
+        assert position.version == 3
+
+    def test_update_and_delete_replay_position(
+        self, db_session: Session, test_portfolio: Portfolio, test_user: User
+    ):
+        """Test editing or deleting an earlier transaction recomputes the position in order."""
+        first = add(db_session, test_portfolio, test_user, "buy", 10, 100.0)
+        add(db_session, test_portfolio, test_user, "sell", 4, 120.0)
+        add(db_session, test_portfolio, test_user, "buy", 4, 200.0)
+
+        update_transaction(db_session, first.id, TransactionUpdate.model_validate({"price": 50.0}), test_user.id)
+        assert positions(db_session, test_portfolio)["AAPL"] == pytest.approx(
+            {"quantity": 10.0, "total_cost": 1100.0, "average_cost": 110.0}
+        )
+
+        update_transaction(db_session, first.id, TransactionUpdate.model_validate({"ticker_symbol": "NVDA"}), test_user.id)
+        assert set(positions(db_session, test_portfolio)) == {"NVDA"}  # AAPL sold below zero
+
+        delete_transaction(db_session, first.id, test_user.id)
+        assert positions(db_session, test_portfolio) == {}
+        assert db_session.query(Position).filter(Position.ticker_symbol == "NVDA").count() == 0
+
+
+class TestRebuildPositions:
+    """Test cases for rebuilding positions from transaction history."""
+
+    def test_rebuild_matches_incremental(self, db_session: Session, test_portfolio: Portfolio, test_user: User):
+        """Test a rebuild reproduces the incrementally maintained positions."""
+        for kind, quantity, price in [("buy", 10, 10.0), ("buy", 5, 13.0), ("sell", 3, 20.0), ("buy", 2, 8.0)]:
+            add(db_session, test_portfolio, test_user, kind, quantity, price)
+        incremental = positions(db_session, test_portfolio)
+
+        assert rebuild_positions(db_session, test_portfolio.id) == 1
+        db_session.commit()
+        assert_same_positions(positions(db_session, test_portfolio), incremental)
+
+    def test_rebuild_backfills_raw_transactions(self, db_session: Session, test_portfolio: Portfolio):
+        """Test transactions written without the CRUD layer are picked up by a rebuild."""
+        db_session.add_all([
+            Transaction(portfolio_id=test_portfolio.id, ticker_symbol="aapl", transaction_type="buy", quantity=2, price=5.0),
+            Transaction(portfolio_id=test_portfolio.id, ticker_symbol="AAPL", transaction_type="buy", quantity=2, price=7.0),
+        ])
+        db_session.commit()
+        assert positions(db_session, test_portfolio) == {}
+
+        rebuild_positions(db_session)
+        db_session.commit()
+        assert positions(db_session, test_portfolio) == {
+            "AAPL": {"quantity": 4.0, "total_cost": 24.0, "average_cost": 6.0},
+        }
+
+    def test_backfill_fills_only_an_empty_table(self, db_session: Session, test_portfolio: Portfolio):
+        """Test startup backfill rebuilds an empty positions table and leaves a populated one alone."""
+        assert backfill_positions(db_session) == 0
+        db_session.add(Transaction(portfolio_id=test_portfolio.id, ticker_symbol="MSFT", transaction_type="buy", quantity=3, price=4.0))
+        db_session.commit()
+
+        assert backfill_positions(db_session) == 1
+        db_session.commit()
+        assert positions(db_session, test_portfolio) == {
+            "MSFT": {"quantity": 3.0, "total_cost": 12.0, "average_cost": 4.0},
+        }
+        assert backfill_positions(db_session) == 0
+
+
+class TestAggregatePositions:
+    """Test cases for positions computed with one GROUP BY over the transactions."""
+
+    def test_matches_average_cost_replay(self, db_session: Session, test_portfolio: Portfolio, test_user: User):
+        """Test buy-then-sell tickers and tickers re-bought after a sell both match the replayed table."""
+        history = [
+            ("AAPL", "buy", 10, 100.0), ("AAPL", "buy", 10, 200.0), ("AAPL", "sell", 5, 300.0),
+            ("MSFT", "buy", 10, 100.0), ("MSFT", "sell", 5, 120.0), ("MSFT", "buy", 5, 200.0),
+            ("NVDA", "buy", 3, 50.0),
+            ("TSLA", "buy", 2, 10.0), ("TSLA", "sell", 2, 12.0),
+        ]
+        for ticker, kind, quantity, price in history:
+            add(db_session, test_portfolio, test_user, kind, quantity, price, ticker=ticker)
+
+        aggregated = aggregate_positions(db_session, test_portfolio.id)
+        assert set(aggregated) == {"AAPL", "MSFT", "NVDA"}
+        assert_same_positions(aggregated, load_positions(db_session, test_portfolio.id))
+        assert aggregated["MSFT"] == pytest.approx({"quantity": 10.0, "total_cost": 1500.0, "average_cost": 150.0})
+
+    def test_selected_by_setting(self, db_session: Session, test_portfolio: Portfolio, monkeypatch):
+        """Test POSITIONS_SOURCE=aggregate reads transactions even when the table is empty."""
+        from app.config import settings
+        db_session.add(
+            Transaction(portfolio_id=test_portfolio.id, ticker_symbol="AAPL", transaction_type="buy", quantity=2, price=5.0)
+        )
+        db_session.commit()
+        assert positions(db_session, test_portfolio) == {}
+
+        monkeypatch.setattr(settings, "positions_source", "aggregate")
+        assert positions(db_session, test_portfolio) == {
+            "AAPL": {"quantity": 2.0, "total_cost": 10.0, "average_cost": 5.0},
+        }
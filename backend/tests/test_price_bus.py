@@ -0,0 +1,113 @@
+"""Tests for the price bus: leader election, interest aggregation and cross-worker fan-out."""
+import asyncio
+from typing import List
+
+import pytest  # type: ignore
+
+from app.price_bus import InProcessPriceBus, UnixSocketPriceBus, create_price_bus
+from app.websocket_manager import ConnectionManager
+from tests.conftest import FakePriceClient, connect
+
+
+async def wait_for(condition, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+def unix_bus(tmp_path) -> UnixSocketPriceBus:
+    return UnixSocketPriceBus(socket_path=str(tmp_path / "bus.sock"), retry_seconds=0.02)
+
+
+class TestInProcessPriceBus:
+    """Test cases for InProcessPriceBus."""
+
+    def test_always_leader_and_delivers_directly(self):
+        """Test the single-worker bus leads and calls listeners synchronously."""
+        bus = InProcessPriceBus()
+        received: List[dict] = []
+        bus.add_listener(received.append)
+        bus.update_interest({"AAPL": 2})
+        bus.publish({"type": "cycle_end"})
+        assert bus.is_leader
+        assert bus.interest() == {"AAPL": 2}
+        assert received == [{"type": "cycle_end"}]
+
+    def test_unknown_backend_rejected(self):
+        """Test an unknown PRICE_BUS value fails loudly."""
+        with pytest.raises(RuntimeError):
+            create_price_bus("carrier-pigeon")
+
+
+class TestUnixSocketPriceBus:
+    """Test cases for UnixSocketPriceBus."""
+
+    def test_one_leader_and_interest_aggregated(self, tmp_path):
+        """Test only one worker leads and sees subscriber counts summed over workers."""
+        async def scenario():
+            first, second = unix_bus(tmp_path), unix_bus(tmp_path)
+            received: List[dict] = []
+            second.add_listener(received.append)
+            await first.start()
+            await wait_for(lambda: first.is_leader)
+            await second.start()
+            second.update_interest({"MSFT": 1, "AAPL": 2})
+            first.update_interest({"AAPL": 1, "TSLA": 4})
+            await wait_for(lambda: first.interest() == {"AAPL": 3, "MSFT": 1, "TSLA": 4})
+            first.publish({"type": "price", "ticker": "MSFT", "price": 1.0, "seq": 1})
+            await wait_for(lambda: received)
+            leaders = (first.is_leader, second.is_leader)
+            await second.stop()
+            await first.stop()
+            return leaders, received
+
+        leaders, received = asyncio.run(scenario())
+        assert leaders == (True, False)
+        assert received == [{"type": "price", "ticker": "MSFT", "price": 1.0, "seq": 1}]
+
+    def test_follower_takes_over_when_leader_stops(self, tmp_path):
+        """Test leadership moves to a follower once the leader goes away."""
+        async def scenario():
+            first, second = unix_bus(tmp_path), unix_bus(tmp_path)
+            await first.start()
+            await wait_for(lambda: first.is_leader)
+            await second.start()
+            await wait_for(lambda: len(first._followers) == 1)
+            await first.stop()
+            await wait_for(lambda: second.is_leader)
+            await second.stop()
+            return first.is_leader, second.elections_won
+
+        first_leads, elections_won = asyncio.run(scenario())
+        assert not first_leads
+        assert elections_won == 1
+
+
+class TestCrossWorkerFanOut:
+    """Test cases for ConnectionManagers sharing a UnixSocketPriceBus."""
+
+    def test_leader_polls_follower_subscriptions(self, tmp_path, price_client: FakePriceClient):
+        """Test a ticker subscribed only on a follower is polled once and reaches its socket."""
+        async def scenario():
+            leader = ConnectionManager(bus=unix_bus(tmp_path))
+            follower = ConnectionManager(bus=unix_bus(tmp_path))
+            await leader.bus.start()
+            await wait_for(lambda: leader.bus.is_leader)
+            await follower.bus.start()
+            local = await connect(leader, "T1")
+            remote = await connect(follower, "T2")
+            await wait_for(lambda: leader.bus.interest() == {"T1": 1, "T2": 1})
+            stats = await leader.refresh_cycle()
+            await wait_for(lambda: remote.sent and local.sent)
+            await follower.bus.stop()
+            await leader.bus.stop()
+            return stats, local, remote, follower
+
+        stats, local, remote, follower = asyncio.run(scenario())
+        assert stats.tickers == 2 and stats.updated == 2
+        assert [(frame["ticker"], frame["seq"]) for frame in remote.sent] == [("T2", 1)]
+        assert [frame["ticker"] for frame in local.sent] == ["T1"]
+        # Followers keep the leader's state, so a new leader continues the sequences
+        assert follower.sequences == {"T1": 1, "T2": 1}
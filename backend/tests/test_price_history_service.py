@@ -0,0 +1,120 @@
+"""Tests for the local daily price history store."""
+from datetime import date
+from typing import Dict, List
+
+import pytest  # type: ignore
+from sqlalchemy.orm import Session
+
+from app.exceptions import ExternalServiceError
+from app.models.model import PriceBar
+from app.services.price_history_service import (
+    PriceHistoryService,
+    parse_daily_bars,
+    previous_trading_day,
+    store_daily_series,
+)
+
+
+def series_payload(closes: Dict[str, float]) -> dict:
+    """Build a TIME_SERIES_DAILY payload from date -> close."""
+    return {
+        "Meta Data": {"3. Last Refreshed": max(closes)},
+        "Time Series (Daily)": {
+            day: {
+                "1. open": str(close - 1),
+                "2. high": str(close + 1),
+                "3. low": str(close - 2),
+                "4. close": str(close),
+                "5. volume": "1000",
+            }
+            for day, close in closes.items()
+        },
+    }
+
+
+class FakeSeriesClient:
+    """Stands in for StockAPIClient, recording requested output sizes."""
+
+    def __init__(self, payload: dict) -> None:
+        self.payload = payload
+        self.outputsizes: List[str] = []
+        self.error: Exception | None = None
+
+    def fetch_stock_data(self, ticker, priority=None, outputsize="compact", notify=True):
+        # refresh stores the payload itself, so it must not also reach the series listeners
+        assert notify is False
+        self.outputsizes.append(outputsize)
+        if self.error is not None:
+            raise self.error
+        return self.payload
+
+
+@pytest.fixture
+def history_service(db_session: Session):
+    """PriceHistoryService wired to a fake upstream client."""
+    service = PriceHistoryService(db_session)
+    service.api_client = FakeSeriesClient(series_payload({"2024-01-02": 100.0, "2024-01-03": 101.0}))
+    return service
+
+
+class TestStoreDailySeries:
+    """Test cases for parsing and upserting daily bars."""
+
+    def test_parse_daily_bars_sorted(self):
+        """Test bars are parsed into typed rows, oldest first."""
+        bars = parse_daily_bars(series_payload({"2024-01-03": 101.0, "2024-01-02": 100.0}))
+        assert [bar["trade_date"] for bar in bars] == [date(2024, 1, 2), date(2024, 1, 3)]
+        assert bars[0]["close"] == 100.0
+        assert bars[0]["volume"] == 1000
+
+    def test_store_only_new_rows(self, db_session: Session):
+        """Test a second store writes the latest stored bar and newer ones only."""
+        assert store_daily_series(db_session, "aapl", series_payload({"2024-01-02": 100.0, "2024-01-03": 101.0})) == 2
+
+        written = store_daily_series(
+            db_session, "AAPL",
+            series_payload({"2024-01-02": 100.0, "2024-01-03": 101.5, "2024-01-04": 102.0}),
+        )
+        assert written == 2
+        bars = db_session.query(PriceBar).order_by(PriceBar.trade_date).all()
+        assert [(bar.trade_date.day, bar.close) for bar in bars] == [(2, 100.0), (3, 101.5), (4, 102.0)]
+        assert {bar.ticker_symbol for bar in bars} == {"AAPL"}
+
+
+class TestPriceHistoryService:
+    """Test cases for incremental refresh and history reads."""
+
+    def test_old_history_refetches_full(self, history_service: PriceHistoryService):
+        """Test history older than the compact window is refreshed with a full download."""
+        assert history_service.refresh("AAPL") == 2
+        history_service.refresh("AAPL")
+        assert history_service.api_client.outputsizes == ["full", "full"]
+
+    def test_compact_refresh_for_recent_history(self, history_service: PriceHistoryService):
+        """Test a ticker with recent history is refreshed with the compact series."""
+        today = date.today().isoformat()
+        history_service.api_client.payload = series_payload({today: 100.0})
+        history_service.refresh("AAPL")
+        history_service.refresh("AAPL")
+        assert history_service.api_client.outputsizes == ["full", "compact"]
+
+    def test_get_history_range(self, history_service: PriceHistoryService):
+        """Test history is read from the local table with date filters."""
+        bars = history_service.get_history("aapl", start=date(2024, 1, 3))
+        assert [bar.close for bar in bars] == [101.0]
+
+    def test_get_history_serves_stored_on_failure(self, history_service: PriceHistoryService):
+        """Test stored bars are served when a refresh fails."""
+        history_service.refresh("AAPL")
+        history_service.api_client.error = ExternalServiceError("Alpha Vantage", "down", "TIMEOUT")
+        assert len(history_service.get_history("AAPL")) == 2
+
+    def test_get_history_raises_without_data(self, history_service: PriceHistoryService):
+        """Test a failed first refresh is reported to the caller."""
+        history_service.api_client.error = ExternalServiceError("Alpha Vantage", "down", "TIMEOUT")
+        with pytest.raises(ExternalServiceError):
+            history_service.get_history("AAPL")
+
+    def test_previous_trading_day_skips_weekend(self):
+        """Test Monday's previous trading day is Friday."""
+        assert previous_trading_day(date(2024, 1, 8)) == date(2024, 1, 5)
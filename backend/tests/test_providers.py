@@ -0,0 +1,121 @@
+"""Tests for the market data providers."""
+import asyncio
+import json
+from datetime import date
+from pathlib import Path
+
+import pytest  # type: ignore
+
+from app.api_client.api_client import StockAPIClient
+from app.api_client.providers import ReplayProvider, create_provider
+from app.api_client.rate_scheduler import Priority, QuotaScheduler
+from app.exceptions import ExternalServiceError
+from tests.conftest import daily_payload
+
+NO_WAIT = {priority: 0.0 for priority in Priority}
+DAILY = {"function": "TIME_SERIES_DAILY", "symbol": "AAPL", "outputsize": "compact"}
+
+
+@pytest.fixture
+def replay_dir(tmp_path: Path) -> Path:
+    """Data directory with one recorded JSON series, one CSV series and a symbols list."""
+    (tmp_path / "AAPL.json").write_text(json.dumps(daily_payload("AAPL", "190.5")))
+    (tmp_path / "MSFT.csv").write_text(
+        "timestamp,open,high,low,close,volume\n"
+        "2024-01-03,370,372,368,371.5,900\n"
+        "2024-01-02,368,371,366,370.0,800\n"
+    )
+    (tmp_path / "symbols.json").write_text(json.dumps([
+        {"1. symbol": "AAPL", "2. name": "Apple Inc"},
+        {"1. symbol": "MSFT", "2. name": "Microsoft Corporation"},
+    ]))
+    return tmp_path
+
+
+class TestReplayProvider:
+    """Test cases for recorded and synthetic replay data."""
+
+    def test_serves_recorded_json_and_csv(self, replay_dir: Path):
+        """Test recorded files are served as Alpha Vantage daily payloads."""
+        provider = ReplayProvider(data_dir=str(replay_dir), synthetic=False)
+        aapl = provider.request(DAILY)
+        assert aapl["Time Series (Daily)"]["2024-01-05"]["4. close"] == "190.5"
+
+        msft = provider.request({**DAILY, "symbol": "msft"})
+        assert msft["Meta Data"]["3. Last Refreshed"] == "2024-01-03"
+        assert msft["Time Series (Daily)"]["2024-01-03"]["4. close"] == "371.5"
+
+    def test_unknown_ticker_without_synthetic(self, replay_dir: Path):
+        """Test a ticker with no data behaves like an Alpha Vantage error message."""
+        provider = ReplayProvider(data_dir=str(replay_dir), synthetic=False)
+        with pytest.raises(ExternalServiceError) as exc_info:
+            provider.request({**DAILY, "symbol": "ZZZZ"})
+        assert exc_info.value.error_code == "API_ERROR"
+
+    def test_synthetic_series_deterministic(self):
+        """Test synthetic series are repeatable per ticker and honour outputsize."""
+        today = lambda: date(2024, 1, 10)
+        first = ReplayProvider(data_dir=None, today=today).request(DAILY)
+        second = ReplayProvider(data_dir=None, today=today).request(DAILY)
+        assert first == second
+        assert len(first["Time Series (Daily)"]) == 100
+        assert first["Meta Data"]["3. Last Refreshed"] == "2024-01-10"
+
+        full = ReplayProvider(data_dir=None, today=today).request({**DAILY, "outputsize": "full"})
+        assert len(full["Time Series (Daily)"]) == ReplayProvider.SYNTHETIC_BARS
+
+    def test_error_injection(self):
+        """Test the configured error rate raises the configured error codes."""
+        provider = ReplayProvider(data_dir=None, error_rate=1.0, error_codes=("CONNECTION_ERROR",))
+        with pytest.raises(ExternalServiceError) as exc_info:
+            provider.request(DAILY)
+        assert exc_info.value.error_code == "CONNECTION_ERROR"
+        assert provider.stats()["injected_errors"] == 1
+
+    def test_latency_async(self):
+        """Test the async path applies the configured latency."""
+        provider = ReplayProvider(data_dir=None, latency_seconds=0.05)
+
+        async def timed() -> float:
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            await provider.request_async(DAILY)
+            return loop.time() - started
+
+        assert asyncio.run(timed()) >= 0.05
+
+    def test_step_replay_advances(self, replay_dir: Path):
+        """Test step replay reveals one more bar per step."""
+        now = [0.0]
+        provider = ReplayProvider(data_dir=str(replay_dir), step_seconds=10, clock=lambda: now[0])
+        msft = {**DAILY, "symbol": "MSFT"}
+        assert provider.request(msft)["Meta Data"]["3. Last Refreshed"] == "2024-01-02"
+        now[0] = 10.0
+        assert provider.request(msft)["Meta Data"]["3. Last Refreshed"] == "2024-01-03"
+
+    def test_symbol_search(self, replay_dir: Path):
+        """Test searches are answered from symbols.json."""
+        provider = ReplayProvider(data_dir=str(replay_dir))
+        matches = provider.request({"function": "SYMBOL_SEARCH", "keywords": "micro"})["bestMatches"]
+        assert [match["1. symbol"] for match in matches] == ["MSFT"]
+
+
+class TestProviderSelection:
+    """Test cases for wiring providers into StockAPIClient."""
+
+    def test_create_provider(self):
+        """Test the provider is chosen by name."""
+        assert isinstance(create_provider("replay"), ReplayProvider)
+        with pytest.raises(RuntimeError):
+            create_provider("carrier-pigeon")
+
+    def test_replay_provider_skips_quota(self):
+        """Test an unmetered provider does not spend the quota budget."""
+        client = StockAPIClient(
+            provider=ReplayProvider(data_dir=None, today=lambda: date(2024, 1, 10)),
+            scheduler=QuotaScheduler(per_minute=0, per_day=0, daily_reserve=0, max_wait_seconds=NO_WAIT),
+        )
+        assert client.get_current_price("AAPL") > 0
+        assert client.get_current_price("MSFT") > 0
+        assert client.stats()["provider"]["requests"] == 2
+        assert client.stats()["quota"]["granted"] == 0
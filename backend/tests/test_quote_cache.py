@@ -0,0 +1,129 @@
+"""Tests for the quote cache and its use by StockAPIClient."""
+import asyncio
+
+import httpx
+
+from app.api_client.api_client import StockAPIClient
+from app.api_client.quote_cache import QuoteCache, FRESH, STALE, MISS
+from tests.conftest import quote_payload
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingHandler:
+    """Mock transport handler that counts upstream calls."""
+
+    def __init__(self, close: str = "100.00") -> None:
+        self.calls = 0
+        self.close = close
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        return httpx.Response(200, json=quote_payload(request.url.params["symbol"], self.close))
+
+
+def make_cached_client(handler, cache: QuoteCache) -> StockAPIClient:
+    return StockAPIClient(
+        http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+        async_http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+        quote_cache=cache,
+    )
+
+
+class TestQuoteCache:
+    """Test cases for QuoteCache freshness and eviction."""
+
+    def test_fresh_stale_and_expired(self):
+        """Test entries move from fresh to stale to miss as they age."""
+        clock = FakeClock()
+        cache = QuoteCache(max_entries=10, ttl_seconds=60, stale_ttl_seconds=120, clock=clock)
+        assert cache.lookup("AAPL") == (MISS, None)
+
+        cache.set("aapl", 150.0)
+        assert cache.lookup("AAPL") == (FRESH, 150.0)
+
+        clock.now = 100
+        assert cache.lookup("AAPL") == (STALE, 150.0)
+
+        clock.now = 200
+        assert cache.lookup("AAPL") == (MISS, None)
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["stale_hits"] == 1
+        assert stats["misses"] == 2
+
+    def test_lru_eviction(self):
+        """Test the least recently used ticker is evicted first."""
+        cache = QuoteCache(max_entries=2, ttl_seconds=60, stale_ttl_seconds=60)
+        cache.set("AAPL", 1.0)
+        cache.set("MSFT", 2.0)
+        cache.lookup("AAPL")
+        cache.set("GOOG", 3.0)
+
+        assert cache.peek("MSFT") is None
+        assert cache.peek("AAPL") == 1.0
+        assert cache.stats()["evictions"] == 1
+
+    def test_single_refresh_claim(self):
+        """Test only one background refresh can be claimed per ticker."""
+        cache = QuoteCache(max_entries=2, ttl_seconds=60, stale_ttl_seconds=60)
+        assert cache.begin_refresh("AAPL") is True
+        assert cache.begin_refresh("aapl") is False
+        cache.end_refresh("AAPL")
+        assert cache.begin_refresh("AAPL") is True
+
+
+class TestCachedPrices:
+    """Test cases for StockAPIClient serving prices through the cache."""
+
+    def test_fresh_price_skips_upstream(self):
+        """Test a second lookup within the TTL does not call upstream."""
+        handler = CountingHandler()
+        client = make_cached_client(handler, QuoteCache(ttl_seconds=60, stale_ttl_seconds=60))
+
+        assert client.get_current_price("AAPL") == 100.0
+        assert asyncio.run(client.get_current_price_async("AAPL")) == 100.0
+        assert handler.calls == 1
+
+    def test_stale_price_served_while_refreshing(self):
+        """Test a stale entry is returned at once and refreshed in the background."""
+        clock = FakeClock()
+        handler = CountingHandler()
+        cache = QuoteCache(ttl_seconds=60, stale_ttl_seconds=600, clock=clock)
+        client = make_cached_client(handler, cache)
+
+        client.get_current_price("AAPL")
+        handler.close = "120.00"
+        clock.now = 120
+
+        assert client.get_current_price("AAPL") == 100.0
+        client._refresh_executor.shutdown(wait=True)
+        assert handler.calls == 2
+        assert cache.peek("AAPL") == 120.0
+
+    def test_stale_price_async_refresh(self):
+        """Test the async path schedules one refresh task for a stale entry."""
+        clock = FakeClock()
+        handler = CountingHandler()
+        cache = QuoteCache(ttl_seconds=60, stale_ttl_seconds=600, clock=clock)
+        client = make_cached_client(handler, cache)
+        cache.set("AAPL", 90.0)
+        clock.now = 120
+
+        async def scenario():
+            prices = [await client.get_current_price_async("AAPL") for _ in range(3)]
+            await asyncio.gather(*client._refresh_tasks)
+            return prices
+
+        assert asyncio.run(scenario()) == [90.0, 90.0, 90.0]
+        assert handler.calls == 1
+        assert cache.peek("AAPL") == 100.0
@@ -0,0 +1,131 @@
+"""Tests for the upstream quota scheduler."""
+import asyncio
+from datetime import datetime, timezone
+
+import httpx
+import pytest  # type: ignore
+
+from app.api_client.api_client import StockAPIClient
+from app.api_client.quote_cache import QuoteCache
+from app.api_client.rate_scheduler import Priority, QuotaScheduler
+from app.exceptions import ExternalServiceError
+from tests.conftest import quote_payload
+
+NO_WAIT = {priority: 0.0 for priority in Priority}
+
+
+class TestQuotaScheduler:
+    """Test cases for QuotaScheduler budgets and ordering."""
+
+    def test_minute_budget_rejects_without_waiting(self):
+        """Test requests beyond the minute bucket are rejected up front."""
+        scheduler = QuotaScheduler(per_minute=2, per_day=100, daily_reserve=0, max_wait_seconds=NO_WAIT)
+        scheduler.acquire()
+        scheduler.acquire()
+        with pytest.raises(ExternalServiceError) as exc_info:
+            scheduler.acquire()
+        assert exc_info.value.error_code == "RATE_LIMIT"
+        assert scheduler.stats()["granted"] == 2
+        assert scheduler.stats()["rejected"] == 1
+
+    def test_daily_reserve_kept_for_interactive(self):
+        """Test background requests cannot spend the interactive reserve."""
+        scheduler = QuotaScheduler(per_minute=10, per_day=3, daily_reserve=1, max_wait_seconds=NO_WAIT)
+        scheduler.acquire(Priority.BACKGROUND)
+        scheduler.acquire(Priority.VALUATION)
+        with pytest.raises(ExternalServiceError):
+            scheduler.acquire(Priority.BACKGROUND)
+        scheduler.acquire(Priority.INTERACTIVE)
+        with pytest.raises(ExternalServiceError):
+            scheduler.acquire(Priority.INTERACTIVE)
+
+    def test_daily_budget_resets(self):
+        """Test the daily counter rolls over on a new day."""
+        day = [datetime(2024, 1, 1, 12, tzinfo=timezone.utc)]
+        scheduler = QuotaScheduler(
+            per_minute=10, per_day=1, daily_reserve=0, max_wait_seconds=NO_WAIT, now=lambda: day[0]
+        )
+        scheduler.acquire()
+        with pytest.raises(ExternalServiceError):
+            scheduler.acquire()
+        day[0] = datetime(2024, 1, 2, tzinfo=timezone.utc)
+        scheduler.acquire()
+
+    def test_sustainable_rate_uses_injected_time(self):
+        """Test the rate spreads the remaining daily budget over the injected time left until midnight."""
+        scheduler = QuotaScheduler(
+            per_minute=600, per_day=46, daily_reserve=10, max_wait_seconds=NO_WAIT, provider_name="Replay",
+            now=lambda: datetime(2024, 1, 1, 23, tzinfo=timezone.utc),
+        )
+        assert scheduler.sustainable_rate(Priority.BACKGROUND) == pytest.approx(36 / 3600)
+        assert scheduler.sustainable_rate(Priority.INTERACTIVE) == pytest.approx(46 / 3600)
+
+        for _ in range(46):
+            scheduler.acquire()
+        with pytest.raises(ExternalServiceError) as exc_info:
+            scheduler.acquire()
+        assert exc_info.value.detail.startswith("Replay error")
+
+    def test_waiters_served_by_priority(self):
+        """Test queued interactive requests are granted before background ones."""
+        # 600/minute refills one token every 0.1s
+        scheduler = QuotaScheduler(
+            per_minute=600, per_day=10_000, daily_reserve=0,
+            max_wait_seconds={priority: 5.0 for priority in Priority},
+        )
+        for _ in range(600):
+            scheduler.acquire()
+        order = []
+
+        async def request(priority: Priority, label: str):
+            await scheduler.acquire_async(priority)
+            order.append(label)
+
+        async def scenario():
+            background = [asyncio.create_task(request(Priority.BACKGROUND, f"bg{i}")) for i in range(2)]
+            await asyncio.sleep(0)
+            interactive = asyncio.create_task(request(Priority.INTERACTIVE, "ui"))
+            valuation = asyncio.create_task(request(Priority.VALUATION, "val"))
+            await asyncio.gather(*background, interactive, valuation)
+
+        asyncio.run(scenario())
+        assert order == ["ui", "val", "bg0", "bg1"]
+
+
+class TestClientQuota:
+    """Test cases for StockAPIClient honouring the scheduler."""
+
+    def test_over_budget_serves_last_known_price(self):
+        """Test an expired cached price is served instead of spending quota."""
+        calls = 0
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            return httpx.Response(200, json=quote_payload("AAPL"))
+
+        cache = QuoteCache(ttl_seconds=0, stale_ttl_seconds=0)
+        cache.set("AAPL", 99.0)
+        client = StockAPIClient(
+            http_client=httpx.Client(transport=httpx.MockTransport(handler)),
+            quote_cache=cache,
+            scheduler=QuotaScheduler(per_minute=0, per_day=100, daily_reserve=0, max_wait_seconds=NO_WAIT),
+        )
+
+        assert client.get_current_price("AAPL") == 99.0
+        assert calls == 0
+        with pytest.raises(ExternalServiceError) as exc_info:
+            client.get_current_price("MSFT")
+        assert exc_info.value.error_code == "RATE_LIMIT"
+
+    def test_upstream_note_drains_bucket(self):
+        """Test an upstream rate limit note empties the minute bucket."""
+        client = StockAPIClient(
+            http_client=httpx.Client(transport=httpx.MockTransport(
+                lambda request: httpx.Response(200, json={"Note": "slow down"})
+            )),
+            scheduler=QuotaScheduler(per_minute=5, per_day=100, daily_reserve=0, max_wait_seconds=NO_WAIT),
+        )
+        with pytest.raises(ExternalServiceError):
+            client.fetch_stock_data("AAPL")
+        assert client.scheduler.stats()["tokens_available"] < 1
@@ -0,0 +1,135 @@
+"""Tests for adaptive per-ticker refresh scheduling."""
+import asyncio
+from datetime import datetime, timezone
+
+import pytest  # type: ignore
+from fastapi.testclient import TestClient
+
+from app.refresh_schedule import RefreshSchedule, us_market_open
+from app.websocket_manager import ConnectionManager
+from tests.conftest import FakePriceClient, connect
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_schedule(clock: FakeClock, market_open: bool = True, **kwargs) -> RefreshSchedule:
+    options = dict(base_interval=8, min_interval=1, max_interval=60, closed_interval=300, cache_ttl=0)
+    options.update(kwargs)
+    return RefreshSchedule(market_open=lambda: market_open, clock=clock, **options)
+
+
+def interval_of(schedule: RefreshSchedule, ticker: str) -> float:
+    return next(entry["interval"] for entry in schedule.snapshot()["tickers"] if entry["ticker"] == ticker)
+
+
+class TestRefreshSchedule:
+    """Test cases for RefreshSchedule intervals and due-time ordering."""
+
+    def test_popular_tickers_refresh_faster(self):
+        """Test the interval shrinks with the subscriber count down to the minimum."""
+        schedule = make_schedule(FakeClock())
+        schedule.sync({"ONE": 1, "FOUR": 4, "MANY": 100_000})
+        assert interval_of(schedule, "ONE") == 8
+        assert interval_of(schedule, "FOUR") == pytest.approx(8 / 3, abs=1e-3)
+        assert interval_of(schedule, "MANY") == 1
+
+    def test_quiet_tickers_back_off_until_they_change(self):
+        """Test each unchanged refresh doubles the interval and a change resets it."""
+        clock = FakeClock()
+        schedule = make_schedule(clock)
+        schedule.sync({"AAPL": 1})
+        assert schedule.pop_due() == ["AAPL"]
+        intervals = []
+        for _ in range(4):
+            schedule.record("AAPL", changed=False)
+            intervals.append(interval_of(schedule, "AAPL"))
+        schedule.record("AAPL", changed=True)
+        assert intervals == [16, 32, 60, 60]
+        assert interval_of(schedule, "AAPL") == 8
+        schedule.record("AAPL", changed=None)
+        assert interval_of(schedule, "AAPL") == 8
+
+    def test_closed_market_uses_closed_interval(self):
+        """Test tickers are refreshed rarely outside market hours."""
+        schedule = make_schedule(FakeClock(), market_open=False)
+        schedule.sync({"AAPL": 50})
+        assert interval_of(schedule, "AAPL") == 300
+        assert us_market_open(datetime(2024, 7, 1, 15, 0, tzinfo=timezone.utc))  # Monday 11:00 New York
+        assert not us_market_open(datetime(2024, 7, 1, 21, 0, tzinfo=timezone.utc))  # Monday 17:00
+        assert not us_market_open(datetime(2024, 6, 29, 15, 0, tzinfo=timezone.utc))  # Saturday
+
+    def test_low_quota_stretches_intervals(self):
+        """Test intervals grow so the scheduled rate fits the upstream capacity."""
+        schedule = make_schedule(FakeClock(), cache_ttl=10)
+        schedule.sync({"A": 1, "B": 1})
+        schedule.set_capacity(None)
+        assert schedule.quota_factor == 1.0
+        # Two tickers, at most one upstream request per 10s each: 0.2 req/s wanted, 0.05 available
+        schedule.set_capacity(0.05)
+        assert schedule.quota_factor == 4.0
+        schedule.pop_due()
+        schedule.record("A", changed=True)
+        assert interval_of(schedule, "A") == 40
+
+    def test_due_order_and_unsubscribed_tickers_dropped(self):
+        """Test tickers come due in time order and unsubscribed ones are forgotten."""
+        clock = FakeClock()
+        schedule = make_schedule(clock)
+        schedule.sync({"SLOW": 1, "FAST": 8, "GONE": 1})
+        assert sorted(schedule.pop_due()) == ["FAST", "GONE", "SLOW"]
+        for ticker in ("SLOW", "FAST", "GONE"):
+            schedule.record(ticker, changed=True)
+        schedule.sync({"SLOW": 1, "FAST": 8})
+        assert schedule.seconds_until_due() == 2
+        clock.now = 2
+        assert schedule.pop_due() == ["FAST"]
+        clock.now = 8
+        assert schedule.pop_due() == ["SLOW"]
+        assert schedule.pop_due() == []
+
+
+class TestScheduledPolling:
+    """Test cases for the leader's schedule-driven poll loop."""
+
+    def test_loop_refreshes_hot_tickers_more_often(self, price_client: FakePriceClient):
+        """Test a heavily watched ticker is fetched more often than a lone one."""
+        fetches = {"T1": 0, "T2": 0}
+        original = price_client.get_current_price_async
+
+        async def counting_price(ticker, priority=None):
+            fetches[ticker] += 1
+            price_client.prices[ticker] += 1  # always changes, so no quiet backoff
+            return await original(ticker, priority)
+
+        price_client.get_current_price_async = counting_price
+        schedule = RefreshSchedule(base_interval=0.2, min_interval=0.02, max_interval=1,
+                                   cache_ttl=0, market_open=lambda: True)
+        manager = ConnectionManager(schedule=schedule)
+
+        async def scenario():
+            await connect(manager, "T2")
+            for _ in range(16):
+                await connect(manager, "T1")
+            task = asyncio.get_running_loop().create_task(manager.fetch_and_broadcast_prices())
+            await asyncio.sleep(0.5)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        asyncio.run(scenario())
+        assert fetches["T2"] >= 2
+        assert fetches["T1"] >= 2 * fetches["T2"]
+
+    def test_schedule_endpoint(self, client: TestClient, auth_headers: dict):
+        """Test the schedule is exposed for inspection to authenticated users."""
+        assert client.get("/api/stocks/refresh-schedule").status_code == 401
+        response = client.get("/api/stocks/refresh-schedule", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["leader"] is True
+        assert {"market_open", "quota_factor", "tickers"} <= set(data)
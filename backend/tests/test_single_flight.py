@@ -0,0 +1,126 @@
+"""Tests for single-flight request coalescing."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from app.api_client.api_client import StockAPIClient
+from app.api_client.single_flight import SingleFlight
+from app.exceptions import ExternalServiceError
+from tests.conftest import daily_payload
+
+
+class TestSingleFlight:
+    """Test cases for SingleFlight."""
+
+    def test_async_callers_share_one_call(self):
+        """Test concurrent async callers with the same key run the function once."""
+        flight = SingleFlight()
+        calls = 0
+
+        async def fetch():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return 42
+
+        async def scenario():
+            return await asyncio.gather(*(flight.do_async("AAPL", fetch) for _ in range(50)))
+
+        assert asyncio.run(scenario()) == [42] * 50
+        assert calls == 1
+        assert flight.stats() == {"calls": 1, "coalesced": 49, "in_flight": 0}
+
+    def test_async_error_is_shared(self):
+        """Test every waiter re-raises the error of the shared call."""
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream down")
+
+        async def scenario():
+            return await asyncio.gather(
+                *(flight.do_async("AAPL", fail) for _ in range(3)), return_exceptions=True
+            )
+
+        results = asyncio.run(scenario())
+        assert all(isinstance(result, ValueError) for result in results)
+        assert flight.stats()["calls"] == 1
+
+    def test_sync_callers_share_one_call(self):
+        """Test concurrent threads with the same key run the function once."""
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = 0
+
+        def fetch():
+            nonlocal calls
+            calls += 1
+            release.wait(timeout=5)
+            return "result"
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(flight.do, "AAPL", fetch) for _ in range(8)]
+            # Give every thread time to join the in-flight call before releasing it
+            deadline = time.monotonic() + 5
+            while flight.stats()["coalesced"] < 7 and time.monotonic() < deadline:
+                time.sleep(0.005)
+            release.set()
+            results = [future.result() for future in futures]
+
+        assert results == ["result"] * 8
+        assert calls == 1
+
+    def test_distinct_keys_not_coalesced(self):
+        """Test calls with different keys run independently."""
+        flight = SingleFlight()
+        assert flight.do("AAPL", lambda: 1) == 1
+        assert flight.do("MSFT", lambda: 2) == 2
+        assert flight.stats()["coalesced"] == 0
+
+
+class TestClientCoalescing:
+    """Test cases for StockAPIClient coalescing identical upstream requests."""
+
+    def test_concurrent_fetch_stock_data_async(self):
+        """Test concurrent fetches of one symbol make one upstream request."""
+        calls = 0
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json=daily_payload("AAPL"))
+
+        client = StockAPIClient(async_http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+        async def scenario():
+            return await asyncio.gather(
+                *(client.fetch_stock_data_async("AAPL") for _ in range(20)),
+                client.fetch_stock_data_async("MSFT"),
+            )
+
+        asyncio.run(scenario())
+        assert calls == 2
+        assert client.stats()["single_flight"]["coalesced"] == 19
+
+    def test_concurrent_error_shared_async(self):
+        """Test coalesced callers all receive the upstream error."""
+        async def handler(request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(0.01)
+            return httpx.Response(200, json={"Note": "rate limited"})
+
+        client = StockAPIClient(async_http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+        async def scenario():
+            return await asyncio.gather(
+                *(client.search_stocks_async("apple") for _ in range(5)), return_exceptions=True
+            )
+
+        results = asyncio.run(scenario())
+        assert all(isinstance(result, ExternalServiceError) for result in results)
+        assert {result.error_code for result in results} == {"RATE_LIMIT"}
+        assert client.stats()["single_flight"]["calls"] == 1
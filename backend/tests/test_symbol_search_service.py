@@ -0,0 +1,116 @@
+"""Tests for the local symbol search index."""
+import asyncio
+from typing import List
+
+import pytest  # type: ignore
+
+from app.exceptions import ExternalServiceError
+from app.models.model import Stock
+from app.services import symbol_search_service
+from app.services.symbol_search_service import SymbolIndex, SymbolSearchService
+
+
+def match(symbol: str, name: str) -> dict:
+    return {"1. symbol": symbol, "2. name": name, "3. type": "Equity", "4. region": "United States"}
+
+
+class FakeSearchClient:
+    """Stands in for StockAPIClient.search_stocks_async."""
+
+    def __init__(self, results: List[dict]) -> None:
+        self.results = results
+        self.queries: List[str] = []
+        self.error: Exception | None = None
+
+    async def search_stocks_async(self, query: str) -> List[dict]:
+        self.queries.append(query)
+        if self.error is not None:
+            raise self.error
+        return self.results
+
+
+@pytest.fixture
+def upstream_search(monkeypatch) -> FakeSearchClient:
+    fake = FakeSearchClient([match("TSLA", "Tesla Inc")])
+    monkeypatch.setattr(symbol_search_service, "get_stock_api_client", lambda: fake)
+    return fake
+
+
+@pytest.fixture
+def search_service() -> SymbolSearchService:
+    index = SymbolIndex()
+    index.add_many([
+        match("AAPL", "Apple Inc"),
+        match("AMZN", "Amazon.com Inc"),
+        match("MSFT", "Microsoft Corporation"),
+        match("AMD", "Advanced Micro Devices Inc"),
+    ])
+    return SymbolSearchService(index, min_local_matches=2, max_results=5)
+
+
+class TestSymbolIndex:
+    """Test cases for SymbolIndex prefix and fuzzy matching."""
+
+    def test_exact_ticker_ranks_first(self, search_service: SymbolSearchService):
+        """Test an exact ticker match scores highest."""
+        results = search_service.index.search("amd")
+        assert results[0][1]["1. symbol"] == "AMD"
+        assert results[0][0] == 1.0
+
+    def test_prefix_on_ticker_and_name(self, search_service: SymbolSearchService):
+        """Test prefixes match tickers, names and later name words."""
+        symbols = [entry["1. symbol"] for _, entry in search_service.index.search("am")]
+        assert symbols[:2] == ["AMD", "AMZN"]
+        assert {entry["1. symbol"] for _, entry in search_service.index.search("micro")} == {"AMD", "MSFT"}
+
+    def test_fuzzy_match(self, search_service: SymbolSearchService):
+        """Test a misspelled company name still finds the entry."""
+        symbols = [entry["1. symbol"] for _, entry in search_service.index.search("microsfot")]
+        assert "MSFT" in symbols
+
+    def test_replacing_entry(self):
+        """Test re-adding a symbol replaces its name keys."""
+        index = SymbolIndex()
+        index.add(match("FB", "Facebook Inc"))
+        index.add(match("FB", "Meta Platforms Inc"))
+        assert len(index) == 1
+        assert index.search("face") == []
+        assert index.search("meta")[0][1]["2. name"] == "Meta Platforms Inc"
+
+
+class TestSymbolSearchService:
+    """Test cases for local answers and upstream fallback."""
+
+    def test_local_answer_skips_upstream(self, search_service: SymbolSearchService, upstream_search: FakeSearchClient):
+        """Test enough good local matches avoid an upstream search."""
+        results = asyncio.run(search_service.search_async("A"))
+        assert len(results) >= 2
+        assert upstream_search.queries == []
+
+    def test_fallback_learns_results(self, search_service: SymbolSearchService, upstream_search: FakeSearchClient):
+        """Test a sparse local result falls back once and learns the matches."""
+        results = asyncio.run(search_service.search_async("tes"))
+        assert results[0]["1. symbol"] == "TSLA"
+        assert upstream_search.queries == ["tes"]
+
+        asyncio.run(search_service.search_async("tes"))
+        asyncio.run(search_service.search_async("TSLA"))
+        assert upstream_search.queries == ["tes"]
+        assert search_service.stats()["upstream_searches"] == 1
+
+    def test_upstream_failure_serves_local(self, search_service: SymbolSearchService, upstream_search: FakeSearchClient):
+        """Test local matches are served when the upstream search fails."""
+        upstream_search.error = ExternalServiceError("Alpha Vantage", "limit", "RATE_LIMIT")
+        results = asyncio.run(search_service.search_async("apple"))
+        assert [entry["1. symbol"] for entry in results] == ["AAPL"]
+
+    def test_upstream_failure_without_local_raises(self, search_service: SymbolSearchService, upstream_search: FakeSearchClient):
+        """Test the upstream error surfaces when nothing matches locally."""
+        upstream_search.error = ExternalServiceError("Alpha Vantage", "limit", "RATE_LIMIT")
+        with pytest.raises(ExternalServiceError):
+            asyncio.run(search_service.search_async("zzzz"))
+
+    def test_load_stocks(self, search_service: SymbolSearchService):
+        """Test stocks from the database are indexed."""
+        search_service.load_stocks([Stock(ticker_symbol="nvda", company_name="NVIDIA Corp")])
+        assert search_service.index.search("nvidia")[0][1]["1. symbol"] == "NVDA"
@@ -4,6 +4,14 @@ from sqlalchemy.orm import Session
 
 from app.services.transaction_service import get_current_position
 from app.models.model import Transaction, Portfolio, Stock, User
+from app.services.position_service import rebuild_positions
+
+
+def commit(db: Session) -> None:
+    """Commit raw transactions along with the positions rows the service reads."""
+    db.commit()
+    rebuild_positions(db)
+    db.commit()
 
 
 class TestGetCurrentPosition:
@@ -28,7 +36,7 @@ class TestGetCurrentPosition:
             price=150.0,
         )
         db_session.add(transaction)
-        db_session.commit()
+        commit(db_session)
         
         position = get_current_position(
             portfolio_id=test_portfolio.id,
@@ -49,7 +57,7 @@ class TestGetCurrentPosition:
                 price=150.0,
             )
             db_session.add(transaction)
-        db_session.commit()
+        commit(db_session)
         
         position = get_current_position(
             portfolio_id=test_portfolio.id,
@@ -84,7 +92,7 @@ class TestGetCurrentPosition:
             price=170.0,
         )
         db_session.add_all([buy1, buy2, sell1])
-        db_session.commit()
+        commit(db_session)
         
         position = get_current_position(
             portfolio_id=test_portfolio.id,
@@ -112,7 +120,7 @@ class TestGetCurrentPosition:
             price=170.0,
         )
         db_session.add_all([buy, sell])
-        db_session.commit()
+        commit(db_session)
         
         position = get_current_position(
             portfolio_id=test_portfolio.id,
@@ -131,7 +139,7 @@ class TestGetCurrentPosition:
             price=150.0,
         )
         db_session.add(transaction)
-        db_session.commit()
+        commit(db_session)
         
         # Query with lowercase
         position = get_current_position(
@@ -149,7 +157,7 @@ class TestGetCurrentPosition:
         portfolio1 = Portfolio(name="Portfolio 1", user_id=test_user.id)
         portfolio2 = Portfolio(name="Portfolio 2", user_id=test_user.id)
         db_session.add_all([portfolio1, portfolio2])
-        db_session.commit()
+        commit(db_session)
         
         # Add transactions to portfolio1
         transaction1 = Transaction(
@@ -168,7 +176,7 @@ class TestGetCurrentPosition:
             price=150.0,
         )
         db_session.add_all([transaction1, transaction2])
-        db_session.commit()
+        commit(db_session)
         
         # Check positions are isolated
         position1 = get_current_position(
@@ -193,7 +201,7 @@ class TestGetCurrentPosition:
         stock1 = Stock(ticker_symbol="AAPL", company_name="Apple Inc.", sector="Technology")
         stock2 = Stock(ticker_symbol="MSFT", company_name="Microsoft Corp.", sector="Technology")
         db_session.add_all([stock1, stock2])
-        db_session.commit()
+        commit(db_session)
         
         # Add transactions for different tickers
         transaction1 = Transaction(
@@ -211,7 +219,7 @@ class TestGetCurrentPosition:
             price=300.0,
         )
         db_session.add_all([transaction1, transaction2])
-        db_session.commit()
+        commit(db_session)
         
         # Check positions are isolated
         position_aapl = get_current_position(
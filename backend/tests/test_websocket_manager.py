@@ -0,0 +1,458 @@
+"""Tests for the WebSocket connection manager: refresh cycle, send queues and heartbeats."""
+import asyncio
+import json
+import time
+
+from app import wire_format
+from app.websocket_manager import ConnectionManager
+from tests.conftest import FakePriceClient, FakeWebSocket, connect
+
+
+class TestRefreshCycle:
+    """Test cases for ConnectionManager.refresh_cycle."""
+
+    def test_fetches_concurrently_within_limit(self, price_client: FakePriceClient):
+        """Test tickers are fetched concurrently but never above the limit."""
+        manager = ConnectionManager(concurrency=3, cycle_budget=5)
+
+        async def scenario():
+            websocket = await connect(manager, *[f"T{i}" for i in range(10)])
+            stats = await manager.refresh_cycle()
+            await asyncio.sleep(0.01)  # let the writer tasks drain
+            return websocket, stats
+
+        websocket, stats = asyncio.run(scenario())
+        assert price_client.max_in_flight == 3
+        assert stats.updated == 10
+        # 10 lookups of 10ms, 3 at a time: well under a sequential 100ms
+        assert stats.duration < 0.09
+        assert {frame["ticker"] for frame in websocket.sent} == {f"T{i}" for i in range(10)}
+        assert manager.price_cache["T7"] == 7.0
+
+    def test_cycle_budget_abandons_slow_tickers(self, price_client: FakePriceClient):
+        """Test a slow ticker does not hold the cycle past its budget."""
+        price_client.delays["T1"] = 2.0
+        manager = ConnectionManager(concurrency=4, cycle_budget=0.1)
+
+        async def scenario():
+            websocket = await connect(manager, "T0", "T1", "T2")
+            stats = await manager.refresh_cycle()
+            await asyncio.sleep(0.01)  # let the writer tasks drain
+            return websocket, stats
+
+        websocket, stats = asyncio.run(scenario())
+        assert stats.over_budget == 1
+        assert stats.updated == 2
+        assert stats.duration < 0.5
+        assert "T1" not in {frame["ticker"] for frame in websocket.sent}
+
+    def test_failures_sent_to_subscribers(self, price_client: FakePriceClient):
+        """Test a failed lookup is reported to the ticker's subscribers."""
+        manager = ConnectionManager()
+
+        async def scenario():
+            websocket = await connect(manager, "NOPE", "T2")
+            stats = await manager.refresh_cycle()
+            await asyncio.sleep(0.01)  # let the writer tasks drain
+            return websocket, stats
+
+        websocket, stats = asyncio.run(scenario())
+        assert stats.failed == 1
+        errors = [frame for frame in websocket.sent if frame["type"] == "error"]
+        assert [frame["ticker"] for frame in errors] == ["NOPE"]
+
+    def test_loop_blocked_time_measured(self, price_client: FakePriceClient):
+        """Test blocking the event loop during a cycle is reported."""
+        manager = ConnectionManager()
+
+        async def blocking_price(ticker, priority=None):
+            time.sleep(0.1)
+            return 1.0
+
+        price_client.get_current_price_async = blocking_price
+
+        async def scenario():
+            manager._lag_monitor.start()
+            await asyncio.sleep(0.06)
+            await connect(manager, "T1")
+            stats = await manager.refresh_cycle()
+            manager._lag_monitor.stop()
+            return stats
+
+        stats = asyncio.run(scenario())
+        assert 0.03 < stats.loop_blocked <= 0.11
+        assert manager.last_cycle is stats
+
+
+class TestSendQueues:
+    """Test cases for per-connection send queues and slow-consumer eviction."""
+
+    def test_slow_client_does_not_delay_others(self, price_client: FakePriceClient):
+        """Test broadcasting returns immediately and fast clients are served while one is stuck."""
+        manager = ConnectionManager()
+
+        async def scenario():
+            slow = await connect(manager, "T1")
+            fast = await connect(manager, "T1")
+            slow.blocked.clear()
+            manager.broadcast_price_update("T1", 10.0)
+            await asyncio.sleep(0.01)
+            return slow, fast
+
+        slow, fast = asyncio.run(scenario())
+        assert [frame["price"] for frame in fast.sent] == [10.0]
+        assert slow.sent == []
+
+    def test_backlog_keeps_latest_price_per_ticker(self, price_client: FakePriceClient):
+        """Test queued updates for one ticker collapse to the latest price."""
+        manager = ConnectionManager()
+
+        async def scenario():
+            websocket = await connect(manager, "T1", "T2")
+            websocket.blocked.clear()
+            manager.broadcast_price_update("T1", 1.0)
+            await asyncio.sleep(0)  # writer takes the first frame and blocks on it
+            for price in (2.0, 3.0, 4.0):
+                manager.broadcast_price_update("T1", price)
+                manager.broadcast_price_update("T2", price * 10)
+            websocket.blocked.set()
+            await asyncio.sleep(0.01)
+            return websocket
+
+        websocket = asyncio.run(scenario())
+        assert [(frame["ticker"], frame["price"]) for frame in websocket.sent] == [
+            ("T1", 1.0), ("T1", 4.0), ("T2", 40.0),
+        ]
+        assert manager.connections[websocket].coalesced == 4
+
+    def test_stalled_client_evicted(self, price_client: FakePriceClient):
+        """Test a client whose sends hang past the threshold is disconnected."""
+        manager = ConnectionManager()
+
+        async def scenario():
+            websocket = FakeWebSocket()
+            await manager.connect(websocket)
+            manager.connections[websocket].slow_consumer_seconds = 0.05
+            manager.subscribe(websocket, "T1")
+            websocket.blocked.clear()
+            manager.broadcast_price_update("T1", 1.0)
+            await asyncio.sleep(0.1)
+            return websocket
+
+        websocket = asyncio.run(scenario())
+        assert websocket not in manager.connections
+        assert "T1" not in manager.active_connections
+        assert websocket.closed_with == 1013
+
+    def test_full_queue_coalesces_prices_and_evicts_on_other_frames(self):
+        """Test a full queue still takes newer prices for queued tickers, and any other frame evicts the client."""
+        manager = ConnectionManager()
+
+        async def scenario():
+            websocket = await connect(manager, "T1", "T2")
+            connection = manager.connections[websocket]
+            connection.max_queue = 2
+            websocket.blocked.clear()
+            manager.send_personal_message(json.dumps({"type": "pong"}), websocket)
+            await asyncio.sleep(0)
+            manager.broadcast_price_update("T1", 1.0)
+            manager.send_snapshot(websocket)
+            manager.broadcast_price_update("T1", 2.0)
+            queued = connection.queue_depth
+            manager.broadcast_price_update("T2", 3.0)
+            await asyncio.sleep(0.01)
+            return websocket, connection, queued
+
+        websocket, connection, queued = asyncio.run(scenario())
+        assert queued == 2
+        assert connection.coalesced == 1
+        assert connection.closed
+        assert websocket not in manager.connections
+        assert websocket.closed_with == 1013
+
+
+class TestBatchFrames:
+    """Test cases for opt-in price_batch frames."""
+
+    def test_batch_connection_gets_one_frame_per_cycle(self, price_client: FakePriceClient):
+        """Test a batch-mode client receives all its tickers in a single frame."""
+        manager = ConnectionManager()
+
+        async def scenario():
+            batch = await connect(manager, "T1", "T2", "T3")
+            manager.set_batch_mode(batch, True)
+            single = await connect(manager, "T1", "T2")
+            await manager.refresh_cycle()
+            await asyncio.sleep(0.01)
+            return batch, single
+
+        batch, single = asyncio.run(scenario())
+        assert len(batch.sent) == 1
+        assert batch.sent[0]["type"] == "price_batch"
+        assert batch.sent[0]["prices"] == [
+            {"ticker": "T1", "price": 1.0, "seq": 1},
+            {"ticker": "T2", "price": 2.0, "seq": 1},
+            {"ticker": "T3", "price": 3.0, "seq": 1},
+        ]
+        assert sorted(frame["ticker"] for frame in single.sent) == ["T1", "T2"]
+
+    def test_frames_shared_between_identical_subscriptions(self, price_client: FakePriceClient):
+        """Test connections with the same changed tickers share one serialized frame."""
+        manager = ConnectionManager()
+
+        async def scenario():
+            sockets = [await connect(manager, "T1", "T2") for _ in range(3)]
+            other = await connect(manager, "T2")
+            for websocket in sockets + [other]:
+                manager.set_batch_mode(websocket, True)
+                websocket.blocked.clear()
+            assert manager.broadcast_price_batch({"T1": 1.0, "T2": 2.0, "T9": 9.0}) == 4
+            queued = {
+                websocket: list(manager.connections[websocket]._pending.values())
+                for websocket in sockets + [other]
+            }
+            return sockets, other, queued
+
+        sockets, other, queued = asyncio.run(scenario())
+        frames = [queued[websocket][0] for websocket in sockets]
+        assert frames[0] is frames[1] is frames[2]
+        assert json.loads(queued[other][0])["prices"] == [{"ticker": "T2", "price": 2.0, "seq": 0}]
+
+
+class TestChangeOnlyBroadcast:
+    """Test cases for change-only updates, sequence numbers and resync."""
+
+    def test_unchanged_prices_not_resent(self, price_client: FakePriceClient):
+        """Test a second cycle with the same prices sends nothing and changes bump seq."""
+        manager = ConnectionManager()
+
+        async def scenario():
+            websocket = await connect(manager, "T1", "T2")
+            await manager.refresh_cycle()
+            second = await manager.refresh_cycle()
+            price_client.prices["T1"] = 1.5
+            third = await manager.refresh_cycle()
+            await asyncio.sleep(0.01)
+            return websocket, second, third
+
+        websocket, second, third = asyncio.run(scenario())
+        assert (second.updated, second.unchanged) == (0, 2)
+        assert (third.updated, third.unchanged) == (1, 1)
+        t1 = [(frame["price"], frame["seq"]) for frame in websocket.sent if frame["ticker"] == "T1"]
+        assert t1 == [(1.0, 1), (1.5, 2)]
+        assert len(websocket.sent) == 3
+
+    def test_resync_returns_current_state(self, price_client: FakePriceClient):
+        """Test resync answers with the cached price and seq of each subscription."""
+        manager = ConnectionManager()
+
+        async def scenario():
+            websocket = await connect(manager, "T1", "T2", "NEW")
+            manager.record_price("T1", 1.0)
+            manager.record_price("T1", 1.1)
+            manager.record_price("T2", 2.0)
+            manager.send_snapshot(websocket)
+            manager.send_snapshot(websocket, ["t2", "T9"])
+            await asyncio.sleep(0.01)
+            return websocket
+
+        websocket = asyncio.run(scenario())
+        assert websocket.sent == [
+            {"type": "snapshot", "prices": [
+                {"ticker": "T1", "price": 1.1, "seq": 2}, {"ticker": "T2", "price": 2.0, "seq": 1},
+            ]},
+            {"type": "snapshot", "prices": [{"ticker": "T2", "price": 2.0, "seq": 1}]},
+        ]
+
+
+class TestBinaryEncoding:
+    """Test cases for sessions negotiated with the binary wire format."""
+
+    def test_ids_announced_then_prices_by_id(self, price_client: FakePriceClient):
+        """Test a binary session gets ticker IDs on subscribe and ID-keyed price frames."""
+        manager = ConnectionManager()
+
+        async def scenario():
+            websocket = await connect(manager, "T1", "T2", encoding=wire_format.BINARY)
+            text = await connect(manager, "T2")
+            await manager.refresh_cycle()
+            await asyncio.sleep(0.01)
+            return websocket, text
+
+        websocket, text = asyncio.run(scenario())
+        assert websocket.sent[:2] == [
+            {"type": "ticker_ids", "tickers": {1: "T1"}},
+            {"type": "ticker_ids", "tickers": {2: "T2"}},
+        ]
+        prices = sorted(entry for frame in websocket.sent[2:] for entry in frame["prices"])
+        assert prices == [(1, 1, 1.0), (2, 1, 2.0)]
+        assert text.sent[0]["type"] == "price_update"
+
+    def test_binary_frames_shared_and_batched(self, price_client: FakePriceClient):
+        """Test sessions with the same IDs share a frame and batch mode packs one frame."""
+        manager = ConnectionManager()
+
+        async def scenario():
+            sockets = [await connect(manager, "T1", "T2", encoding=wire_format.BINARY) for _ in range(2)]
+            batch = await connect(manager, "T2", "T1", encoding=wire_format.BINARY)
+            manager.set_batch_mode(batch, True)
+            for websocket in sockets + [batch]:
+                websocket.blocked.clear()
+            manager.record_price("T1", 1.0)
+            manager.broadcast_price_update("T1", 1.0)
+            manager.broadcast_price_batch({"T1": 1.0, "T2": 2.0})
+            queued = [list(manager.connections[websocket]._pending.values()) for websocket in sockets + [batch]]
+            return queued
+
+        first, second, batch = asyncio.run(scenario())
+        assert first[-1] is second[-1]
+        assert len(first[-1]) == 25  # 11-byte header + one 14-byte entry
+        assert wire_format.decode_frame(batch[-1])["prices"] == [(1, 0, 2.0), (2, 1, 1.0)]
+
+
+def position(quantity: float, average_cost: float) -> dict:
+    return {"quantity": quantity, "total_cost": quantity * average_cost, "average_cost": average_cost}
+
+
+class TestPortfolioSubscriptions:
+    """Test cases for bulk and portfolio-scoped subscriptions."""
+
+    def test_subscribe_many_announces_ids_once(self, price_client: FakePriceClient):
+        """Test subscribe_many normalizes tickers and sends binary sessions one ID frame."""
+        manager = ConnectionManager()
+
+        async def scenario():
+            websocket = await connect(manager, encoding=wire_format.BINARY)
+            tickers = manager.subscribe_many(websocket, ["t1", "T2", "T1", ""])
+            await asyncio.sleep(0.01)
+            return websocket, tickers
+
+        websocket, tickers = asyncio.run(scenario())
+        assert tickers == ["T1", "T2"]
+        assert websocket.sent == [{"type": "ticker_ids", "tickers": {1: "T1", 2: "T2"}}]
+        assert set(manager.active_connections) == {"T1", "T2"}
+
+    def test_invalid_tickers_rejected_before_subscribing(self, price_client: FakePriceClient):
+        """Test non-ASCII, over-long and non-string tickers get error frames and leave no subscription."""
+        manager = ConnectionManager()
+        too_long = "X" * (wire_format.MAX_TICKER_LENGTH + 1)
+
+        async def scenario():
+            websocket = await connect(manager, "ÄPFEL", encoding=wire_format.BINARY)
+            tickers = manager.subscribe_many(websocket, ["t1", too_long, 42])
+            manager.follow_portfolio(websocket, 7, {"é": position(1, 1)})
+            await asyncio.sleep(0.01)
+            return websocket, tickers
+
+        websocket, tickers = asyncio.run(scenario())
+        assert tickers == ["T1"]
+        assert [frame.get("ticker") for frame in websocket.sent if frame["type"] == "error"] == ["ÄPFEL", too_long, 42, "É"]
+        assert [frame for frame in websocket.sent if frame["type"] == "ticker_ids"] == [
+            {"type": "ticker_ids", "tickers": {1: "T1"}},
+        ]
+        assert set(manager.active_connections) == {"T1"}
+        assert manager.connection_subscriptions[websocket] == {"T1"}
+
+    def test_followers_track_holdings(self, price_client: FakePriceClient):
+        """Test holdings changes add and drop subscriptions but keep explicitly requested tickers."""
+        manager = ConnectionManager()
+
+        async def scenario():
+            websocket = await connect(manager, "T1")
+            assert manager.follow_portfolio(websocket, 7, {"t1": position(1, 1), "t2": position(1, 1)}) == ["T1", "T2"]
+            manager.record_price("T3", 3.0)
+            manager.update_portfolio_holdings(7, {"T3": position(2, 2.5)})
+            await asyncio.sleep(0.01)
+            subscribed = set(manager.active_connections)
+            manager.disconnect(websocket)
+            return websocket, subscribed
+
+        websocket, subscribed = asyncio.run(scenario())
+        assert subscribed == {"T1", "T3"}
+        assert websocket.sent[-1] == {
+            "type": "portfolio_holdings", "portfolio_id": 7, "tickers": ["T3"],
+            "prices": [{"ticker": "T3", "price": 3.0, "seq": 1}],
+            "value": {"total_value": 6.0, "total_cost": 5.0, "total_gain_loss": 1.0, "gain_loss_percentage": 20.0},
+        }
+        assert not manager.follows_portfolio(7)
+        assert manager.active_connections == {}
+
+    def test_price_ticks_revalue_holding_portfolios(self, price_client: FakePriceClient):
+        """Test a tick pushes portfolio_value to followers of portfolios holding the ticker only."""
+        manager = ConnectionManager()
+
+        async def scenario():
+            holder, other, batch = [await connect(manager) for _ in range(3)]
+            manager.follow_portfolio(holder, 1, {"T1": position(10, 1.0), "T2": position(1, 5.0)})
+            manager.follow_portfolio(other, 2, {"T2": position(1, 5.0)})
+            manager.follow_portfolio(batch, 1, {"T1": position(10, 1.0), "T2": position(1, 5.0)})
+            manager.set_batch_mode(batch, True)
+            await asyncio.sleep(0.01)
+            for frame in ({"type": "price", "ticker": "T1", "price": 1.5, "seq": 1},
+                          {"type": "price", "ticker": "T1", "price": 2.0, "seq": 2}):
+                manager.handle_bus_message(frame)
+                await asyncio.sleep(0.01)
+            batch_before_cycle_end = [frame["type"] for frame in batch.sent]
+            manager.handle_bus_message({"type": "cycle_end"})
+            await asyncio.sleep(0.01)
+            return holder, other, batch, batch_before_cycle_end
+
+        holder, other, batch, batch_before_cycle_end = asyncio.run(scenario())
+        values = [frame for frame in holder.sent if frame["type"] == "portfolio_value"]
+        assert [frame["total_value"] for frame in values] == [20.0, 25.0]
+        assert values[-1]["total_gain_loss"] == 10.0 and values[-1]["portfolio_id"] == 1
+        assert not any(frame["type"] == "portfolio_value" for frame in other.sent)
+        assert "portfolio_value" not in batch_before_cycle_end
+        assert [frame["total_value"] for frame in batch.sent if frame["type"] == "portfolio_value"] == [25.0]
+        assert manager.valuations.value(2)["total_value"] == 5.0
+
+
+class TestHeartbeats:
+    """Test cases for heartbeats, idle reaping and connection accounting."""
+
+    def test_silent_client_reaped(self, price_client: FakePriceClient):
+        """Test a client silent past the timeout is disconnected and its tickers dropped."""
+        manager = ConnectionManager(heartbeat_timeout=30)
+
+        async def scenario():
+            silent = await connect(manager, "T1", "T2")
+            alive = await connect(manager, "T2")
+            manager.connections[silent].last_activity -= 60
+            manager.connections[alive].last_activity -= 60
+            manager.record_received(alive, '{"type": "heartbeat"}')
+            reaped = manager.send_heartbeats()
+            await asyncio.sleep(0.01)
+            return silent, alive, reaped
+
+        silent, alive, reaped = asyncio.run(scenario())
+        assert reaped == 1
+        assert silent.closed_with == 1001
+        assert silent not in manager.connections
+        assert set(manager.active_connections) == {"T2"}
+        assert [frame["type"] for frame in alive.sent] == ["heartbeat"]
+        assert manager.stats()["heartbeat"]["reaped"] == 1
+
+    def test_stats_rank_tickers_and_connections(self, price_client: FakePriceClient):
+        """Test stats count traffic per connection and list the heaviest tickers and connections."""
+        manager = ConnectionManager()
+
+        async def scenario():
+            light = await connect(manager, "T1")
+            heavy = await connect(manager, "T1", "T2")
+            manager.record_received(heavy, '{"type": "ping"}')
+            manager.record_price("T1", 1.0)
+            manager.record_price("T2", 2.0)
+            manager.broadcast_price_update("T1", 1.0)
+            manager.broadcast_price_update("T2", 2.0)
+            await asyncio.sleep(0.01)
+            return light, heavy
+
+        light, heavy = asyncio.run(scenario())
+        stats = manager.stats(limit=1)
+        assert stats["connections"] == 2 and stats["tickers"] == 2
+        assert stats["heaviest_tickers"] == [{"ticker": "T1", "subscribers": 2}]
+        [top] = stats["heaviest_connections"]
+        assert top["id"] == manager.connections[heavy].id
+        assert top["messages_in"] == 1 and top["bytes_in"] == 16
+        assert top["messages_out"] == 2 and top["bytes_out"] > 0
+        assert top["subscriptions"] == 2 and top["queue_depth"] == 0
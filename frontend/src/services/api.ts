@@ -95,6 +95,16 @@ export interface StockPrice {
   price: number;
 }
 
+export interface BatchPriceResult {
+  price: number | null;
+  error: string | null;
+  error_code: string | null;
+}
+
+export interface BatchPriceResponse {
+  prices: Record<string, BatchPriceResult>;
+}
+
 export interface StockSearchResult {
   query: string;
   results: Array<{
@@ -159,6 +169,7 @@ export const apiService = {
     update: (id: number, data: Partial<StockBase>) => api.put<Stock>(`/stocks/${id}`, data),
     delete: (id: number) => api.delete<Stock>(`/stocks/${id}`),
     getPrice: (ticker: string) => api.get<StockPrice>(`/api/stocks/${ticker}/price`),
+    getPrices: (tickers: string[]) => api.post<BatchPriceResponse>('/api/stocks/prices', { tickers }),
     search: (query: string) => api.get<StockSearchResult>('/api/stocks/search', { params: { query } }),
   },
 
@@ -38,11 +38,17 @@ class StockPriceWebSocket {
         console.log('WebSocket connected');
         this.isConnecting = false;
         this.reconnectAttempts = 0;
+
+        // One price_batch frame per refresh cycle instead of one frame per ticker
+        this.ws?.send(JSON.stringify({ type: 'configure', batch: true }));
         
-        // Resubscribe to all previously subscribed tickers
-        this.subscribedTickers.forEach(ticker => {
-          this.subscribe(ticker);
-        });
+        // Resubscribe to all previously subscribed tickers in one message
+        if (this.subscribedTickers.size > 0) {
+          this.ws?.send(JSON.stringify({
+            type: 'subscribe_many',
+            tickers: Array.from(this.subscribedTickers),
+          }));
+        }
       };
 
       this.ws.onmessage = (event) => {
@@ -52,8 +58,21 @@ class StockPriceWebSocket {
           if (data.type === 'price_update') {
             const { ticker, price } = data;
             this.notifyPriceUpdate(ticker, price);
+          } else if (
+            data.type === 'price_batch' ||
+            data.type === 'snapshot' ||
+            data.type === 'subscribed' ||
+            data.type === 'portfolio_subscribed' ||
+            data.type === 'portfolio_holdings'
+          ) {
+            data.prices.forEach(({ ticker, price }: { ticker: string; price: number }) => {
+              this.notifyPriceUpdate(ticker, price);
+            });
           } else if (data.type === 'error') {
             this.notifyError(data.message || 'Unknown error');
+          } else if (data.type === 'heartbeat') {
+            // Answer so the server does not close the connection as idle
+            this.ws?.send(JSON.stringify({ type: 'heartbeat' }));
           } else if (data.type === 'pong') {
             // Heartbeat response
           }